@@ -0,0 +1,131 @@
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+from cache_store import store, CacheStore
+from metrics import metrics
+from taxonomy import clean_spam_text
+
+logger = logging.getLogger("mcp_vision_server.analysis_cache")
+
+
+class ResultCache:
+    """
+    LLM 분석 결과 캐시. (key, version)으로 조회하며 version에는 모델명과 프롬프트 버전 등
+    결과에 영향을 주는 값을 넣습니다. 버전이 바뀌면 해당 항목만 miss가 되고 purge_stale()로 정리됩니다.
+    항목 수가 max_entries를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다 (LRU).
+    """
+
+    def __init__(self, name: str, max_entries: int, cache_store: CacheStore = store):
+        self.name = name
+        self.max_entries = max_entries
+        self.store = cache_store
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+        with self.store.transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "cache TEXT NOT NULL, key TEXT NOT NULL, version TEXT NOT NULL, value TEXT, "
+                "created REAL, last_access REAL, PRIMARY KEY (cache, key, version)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS result_cache_lru ON result_cache (cache, last_access)")
+            self._entries = conn.execute("SELECT COUNT(*) FROM result_cache WHERE cache=?", (name,)).fetchone()[0]
+
+    def get(self, key: str, version: str) -> Optional[Any]:
+        with self.store.transaction(commit=False) as conn:
+            row = conn.execute(
+                "SELECT value FROM result_cache WHERE cache=? AND key=? AND version=?",
+                (self.name, key, version)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE result_cache SET last_access=? WHERE cache=? AND key=? AND version=?",
+                    (time.time(), self.name, key, version)
+                )
+        with self._counter_lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, version: str, value: Any):
+        now = time.time()
+        with self.store.transaction(commit=False) as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO result_cache (cache, key, version, value, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, key, version, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if cur.rowcount:
+                self._entries += 1
+            else:
+                conn.execute(
+                    "UPDATE result_cache SET value=?, last_access=? WHERE cache=? AND key=? AND version=?",
+                    (json.dumps(value, ensure_ascii=False), now, self.name, key, version)
+                )
+            if self._entries > self.max_entries:
+                # 매번 한 건씩 지우지 않도록 한도의 5%를 여유로 함께 제거
+                evict = self._entries - self.max_entries + max(1, self.max_entries // 20)
+                conn.execute(
+                    "DELETE FROM result_cache WHERE (cache, key, version) IN ("
+                    "SELECT cache, key, version FROM result_cache WHERE cache=? ORDER BY last_access LIMIT ?)",
+                    (self.name, evict)
+                )
+                self._entries = conn.execute("SELECT COUNT(*) FROM result_cache WHERE cache=?", (self.name,)).fetchone()[0]
+                logger.info(f"Result cache '{self.name}' evicted {evict} least recently used entries")
+
+    def purge_stale(self, current_version: str) -> int:
+        """현재 버전이 아닌 항목(이전 모델/프롬프트의 결과)을 삭제합니다."""
+        with self.store.transaction() as conn:
+            cur = conn.execute("DELETE FROM result_cache WHERE cache=? AND version<>?", (self.name, current_version))
+            self._entries = conn.execute("SELECT COUNT(*) FROM result_cache WHERE cache=?", (self.name,)).fetchone()[0]
+        if cur.rowcount:
+            logger.info(f"Result cache '{self.name}' purged {cur.rowcount} stale entries")
+        return cur.rowcount
+
+    def stats(self) -> Dict:
+        with self._counter_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": self._entries,
+                "max_entries": self.max_entries
+            }
+
+
+# 이미지 내용 해시 -> 비전 분석 결과 (description, tags)
+VISION_CACHE_MAX_ENTRIES = 200_000
+vision_cache = ResultCache("vision", VISION_CACHE_MAX_ENTRIES)
+
+
+def text_cache_key(text: str) -> str:
+    """스팸/멘션 제거 및 공백 정규화 후의 본문 해시 (분류 결과 메모 키)."""
+    normalized = re.sub(r'\s+', ' ', clean_spam_text(text)).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# 정규화된 본문 해시 -> 분류 태그 목록
+CLASSIFICATION_CACHE_MAX_ENTRIES = 200_000
+classification_cache = ResultCache("text_classification", CLASSIFICATION_CACHE_MAX_ENTRIES)
+
+
+# 이미지 내용 해시 -> OCR 텍스트 (글자가 없다고 판정된 이미지는 빈 문자열)
+OCR_CACHE_MAX_ENTRIES = 200_000
+ocr_cache = ResultCache("ocr", OCR_CACHE_MAX_ENTRIES)
+
+
+def _cache_metric(field: str):
+    caches = (vision_cache, classification_cache, ocr_cache)
+    return lambda: {(("cache", c.name),): c.stats()[field] for c in caches}
+
+
+metrics.callback("analysis_cache_hits_total", "LLM/OCR result cache hits", _cache_metric("hits"), metric_type="counter")
+metrics.callback("analysis_cache_misses_total", "LLM/OCR result cache misses", _cache_metric("misses"), metric_type="counter")
+metrics.callback("analysis_cache_hit_ratio", "LLM/OCR result cache hit ratio since start", _cache_metric("hit_rate"))
+metrics.callback("analysis_cache_entries", "Entries stored in each result cache", _cache_metric("entries"))
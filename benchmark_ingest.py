@@ -0,0 +1,423 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import string
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional
+from PIL import Image, ImageDraw, ImageFont
+import fitz  # PyMuPDF
+from ollama_stub import OllamaStub, parse_model_latency
+
+logger = logging.getLogger("mcp_vision_server.benchmark_ingest")
+
+# 수집 파이프라인 벤치마크: 합성 watched_files 트리 + 로컬 Ollama 스텁으로 GPU 없이 재현 가능한 수치를 냅니다.
+#   python benchmark_ingest.py --posts 50 --pdfs 5 --out bench_output.txt
+# 결과 JSON(파일/초, 파일별 지연 p50/p95, LLM 호출 수, 최대 RSS)은 커밋 해시와 함께 기록되어 커밋 간 비교에 씁니다.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MAX_SLIDES = 5
+# 글자가 들어간 슬라이드 비율 (OCR 경로와 텍스트 검출기 건너뛰기 경로를 모두 거치도록)
+TEXT_SLIDE_RATIO = 0.3
+PDF_PAGES = (4, 40)
+IMAGE_SIZE = (640, 800)
+WATCH_TIMEOUT = 600
+
+_POST_WORDS = ["건축", "인테리어", "가구", "조명", "주거", "전시", "콘크리트", "목재", "미니멀", "평면도",
+               "architecture", "interior", "chair", "lighting", "residence", "gallery", "concrete", "timber", "plan", "studio"]
+_SLIDE_LINES = ["FLOOR PLAN 1:100", "Studio Visit 2024", "Lounge Chair / Oak", "Section A-A", "건축가 인터뷰", "MATERIAL BOARD"]
+
+
+def _shortcode(rng: random.Random) -> str:
+    # 실제 shortcode에는 '_'가 들어갈 수 있지만 parse_shortcode가 '_'로 나누므로 합성 데이터에서는 제외
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(11))
+
+
+def _timestamp(rng: random.Random) -> str:
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime(1_600_000_000 + rng.randrange(100_000_000)))
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def _draw_slide(rng: random.Random, with_text: bool) -> Image.Image:
+    base = tuple(rng.randrange(256) for _ in range(3))
+    image = Image.new("RGB", IMAGE_SIZE, base)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randrange(3, 9)):
+        x0, y0 = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+        x1, y1 = x0 + rng.randrange(40, 300), y0 + rng.randrange(40, 300)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+    if with_text:
+        draw.rectangle((0, 40, IMAGE_SIZE[0], 200), fill=(255, 255, 255))
+        font = _font(36)
+        for i in range(3):
+            draw.text((30, 50 + i * 48), rng.choice(_SLIDE_LINES), fill=(0, 0, 0), font=font)
+    return image
+
+
+def _write_pdf(path: str, rng: random.Random):
+    doc = fitz.open()
+    for n in range(rng.randrange(*PDF_PAGES)):
+        page = doc.new_page()
+        body = " ".join(rng.choice(_POST_WORDS[10:]) for _ in range(220))
+        page.insert_textbox(fitz.Rect(50, 50, 545, 790), f"Chapter {n + 1}\n\n{body}", fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def generate_corpus(root: str, posts: int, pdfs: int, duplicates: int, seed: int) -> Dict:
+    """
+    watched_files와 같은 모양의 합성 트리를 만듭니다.
+    instagram/ig_<shortcode>_<ts>.txt 본문 + ig_<shortcode>_<ts>_<i>.png 슬라이드(캐러셀), references/*.pdf,
+    그리고 기존 슬라이드의 완전 중복(바이트 동일)과 근접 중복(재인코딩/축소) 게시물.
+    """
+    rng = random.Random(seed)
+    insta_dir = os.path.join(root, "instagram")
+    ref_dir = os.path.join(root, "references")
+    os.makedirs(insta_dir, exist_ok=True)
+    os.makedirs(ref_dir, exist_ok=True)
+    counts = {"posts": posts, "texts": 0, "slides": 0, "text_slides": 0, "pdfs": 0, "exact_duplicates": 0, "near_duplicates": 0}
+    slides: List[str] = []
+
+    for _ in range(posts):
+        shortcode, ts = _shortcode(rng), _timestamp(rng)
+        with open(os.path.join(insta_dir, f"ig_{shortcode}_{ts}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(rng.choice(_POST_WORDS) for _ in range(rng.randrange(20, 120))))
+            f.write("\n#" + " #".join(rng.sample(_POST_WORDS, 4)))
+        counts["texts"] += 1
+        for i in range(rng.randrange(1, MAX_SLIDES + 1)):
+            with_text = rng.random() < TEXT_SLIDE_RATIO
+            path = os.path.join(insta_dir, f"ig_{shortcode}_{ts}_{i}.png")
+            _draw_slide(rng, with_text).save(path)
+            slides.append(path)
+            counts["slides"] += 1
+            counts["text_slides"] += with_text
+
+    for n in range(pdfs):
+        _write_pdf(os.path.join(ref_dir, f"reference_{seed}_{n:03d}.pdf"), rng)
+        counts["pdfs"] += 1
+
+    for n in range(min(duplicates, len(slides))):
+        source = rng.choice(slides)
+        shortcode, ts = _shortcode(rng), _timestamp(rng)
+        if n % 2 == 0:
+            shutil.copyfile(source, os.path.join(insta_dir, f"ig_{shortcode}_{ts}_0.png"))
+            counts["exact_duplicates"] += 1
+        else:
+            with Image.open(source) as image:
+                near = image.convert("RGB").resize((IMAGE_SIZE[0] * 9 // 10, IMAGE_SIZE[1] * 9 // 10), Image.BILINEAR)
+            near.save(os.path.join(insta_dir, f"ig_{shortcode}_{ts}_0.jpg"), quality=85)
+            counts["near_duplicates"] += 1
+
+    counts["files"] = counts["texts"] + counts["slides"] + counts["pdfs"] + counts["exact_duplicates"] + counts["near_duplicates"]
+    return counts
+
+
+class LatencyRecorder:
+    """
+    파이프라인 투입 함수를 감싸 파일별 투입/완료 시각을 기록합니다.
+    store_file은 DB 쓰기 버퍼에 넣은 뒤 바로 반환하므로, 저장된 파일의 완료 시각과 결과는
+    버퍼가 실제로 upsert한 뒤 부르는 on_stored/on_failed 콜백(track_completion)에서 기록합니다.
+    """
+
+    def __init__(self, submit):
+        self._submit = submit
+        self._lock = threading.Lock()
+        self._all_done = threading.Condition(self._lock)
+        self.started: Dict[str, float] = {}
+        self.finished: Dict[str, float] = {}
+        self.outcomes: Dict[str, str] = {}
+        # store_file이 반환했지만 아직 DB 콜백이 오지 않은 경로
+        self._awaiting_db = set()
+        # 파일 이름 -> 투입 경로. store_file은 이미지를 태그 폴더로 옮기지만 파일 이름은 그대로 둠
+        self._by_name: Dict[str, str] = {}
+
+    def submit(self, filepath: str):
+        with self._lock:
+            self.started.setdefault(filepath, time.monotonic())
+            self._by_name[os.path.basename(filepath)] = filepath
+        future = self._submit(filepath)
+        future.add_done_callback(lambda f, path=filepath: self._done(path, f))
+        return future
+
+    def mark_arrival(self, filepath: str):
+        """감시 경로용: 파일이 폴더에 나타난 시각을 시작 시각으로 사용 (쓰기 안정화 대기 포함)."""
+        with self._lock:
+            self.started[filepath] = time.monotonic()
+
+    def track_completion(self, completion_callbacks):
+        """file_manager._completion_callbacks를 감싸 DB 기록 성공/포기 시점을 해당 파일의 완료로 기록합니다."""
+        def wrapped(filepath: str, content_hash: str) -> dict:
+            callbacks = completion_callbacks(filepath, content_hash)
+            with self._lock:
+                path = self._by_name.get(os.path.basename(filepath), filepath)
+
+            def on_stored():
+                try:
+                    callbacks["on_stored"]()
+                finally:
+                    self._finish(path, "stored")
+
+            def on_failed(error: str):
+                try:
+                    callbacks["on_failed"](error)
+                finally:
+                    self._finish(path, "db_failed")
+
+            return {"on_stored": on_stored, "on_failed": on_failed}
+        return wrapped
+
+    def _done(self, filepath: str, future):
+        if future.cancelled():
+            outcome = "cancelled"
+        elif future.exception() is not None:
+            outcome = "error"
+        elif future.result():
+            # DB 콜백이 먼저 왔을 수도 있음 (버퍼가 가득 차 store_file 안에서 flush된 경우)
+            with self._lock:
+                if filepath not in self.outcomes:
+                    self._awaiting_db.add(filepath)
+            return
+        else:
+            outcome = "skipped"
+        self._finish(filepath, outcome)
+
+    def _finish(self, filepath: str, outcome: str):
+        with self._lock:
+            self._awaiting_db.discard(filepath)
+            if filepath in self.outcomes:
+                return
+            self.finished[filepath] = time.monotonic()
+            self.outcomes[filepath] = outcome
+            self._all_done.notify_all()
+
+    def wait_for(self, paths: List[str], timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while not all(p in self.finished for p in paths):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._all_done.wait(remaining)
+        return True
+
+    def summary(self, paths: List[str]) -> Dict:
+        with self._lock:
+            latencies = sorted(self.finished[p] - self.started[p] for p in paths if p in self.finished and p in self.started)
+            outcomes: Dict[str, int] = {}
+            for p in paths:
+                key = self.outcomes.get(p, "awaiting_db" if p in self._awaiting_db else "unfinished")
+                outcomes[key] = outcomes.get(key, 0) + 1
+        return {"outcomes": outcomes, "latency_seconds": _percentiles(latencies)}
+
+
+def _percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+
+    def rank(q: float) -> float:
+        # nearest-rank
+        return round(values[max(0, math.ceil(q * len(values)) - 1)], 4)
+
+    return {"count": len(values), "mean": round(sum(values) / len(values), 4), "p50": rank(0.5), "p95": rank(0.95), "max": round(values[-1], 4)}
+
+
+def _diff_calls(before: Dict, after: Dict) -> Dict:
+    by_kind = {k: v - before["by_kind"].get(k, 0) for k, v in after["by_kind"].items()}
+    return {"total": after["total"] - before["total"], "by_kind": {k: v for k, v in by_kind.items() if v}}
+
+
+def _peak_rss_mb() -> Optional[Dict]:
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    # Linux는 KB, macOS는 byte 단위
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return {"self": round(own / 2 ** 20, 1), "children": round(children / 2 ** 20, 1)}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _list_files(root: str, extensions) -> List[str]:
+    found = []
+    for dirpath, _, files in os.walk(root):
+        found.extend(os.path.join(dirpath, f) for f in files if os.path.splitext(f)[1].lower() in extensions)
+    return sorted(found)
+
+
+def run_scan(fm, recorder: LatencyRecorder, stub: OllamaStub, args) -> Dict:
+    watch_dir = "./watched_files"
+    paths = _list_files(watch_dir, fm.SUPPORTED_EXTENSIONS)
+    calls_before = stub.stats()
+    started = time.monotonic()
+    results = fm.scan_directory_once(watch_dir)
+    submitted = [p for p in paths if p in recorder.started]
+    # 스캔 끝의 flush가 실패하면 재시도 중인 문서가 남으므로 DB 콜백까지 기다림
+    completed = recorder.wait_for(submitted, args.watch_timeout)
+    elapsed = time.monotonic() - started
+    return {
+        "files": len(paths),
+        "completed": completed,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(paths) / elapsed, 3) if elapsed else None,
+        # 파이프라인 투입 -> DB 기록 완료 (캐러셀 슬라이드가 대표 슬라이드를 기다린 시간은 제외)
+        **recorder.summary(submitted),
+        "scan_results": results,
+        "llm_calls": _diff_calls(calls_before, stub.stats()),
+    }
+
+
+def run_watch(fm, recorder: LatencyRecorder, stub: OllamaStub, args) -> Dict:
+    """두 번째 합성 코퍼스를 감시 폴더로 옮겨 넣고, 이벤트 -> 안정화 대기 -> 파이프라인 완료까지의 지연을 잽니다."""
+    staging = os.path.abspath("incoming")
+    counts = generate_corpus(staging, args.posts, args.pdfs, args.duplicates, args.seed + 1)
+    staged = _list_files(staging, fm.SUPPORTED_EXTENSIONS)
+
+    monitor = fm.DirectoryMonitor("./watched_files")
+    monitor.start()
+    calls_before = stub.stats()
+    started = time.monotonic()
+    targets = []
+    try:
+        for src in staged:
+            # file_intake는 절대 경로로 투입하므로 같은 키로 기록
+            dest = os.path.abspath(os.path.join("watched_files", os.path.relpath(src, staging)))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            recorder.mark_arrival(dest)
+            # 스크래퍼처럼 완성된 파일을 같은 파일시스템에서 rename으로 넣음
+            os.replace(src, dest)
+            targets.append(dest)
+        completed = recorder.wait_for(targets, args.watch_timeout)
+        elapsed = time.monotonic() - started
+    finally:
+        monitor.stop()
+    return {
+        "files": len(targets),
+        "corpus": counts,
+        "completed": completed,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(targets) / elapsed, 3) if elapsed else None,
+        # 파일 도착 -> DB 기록 완료 (file_intake의 쓰기 안정화 대기, 쓰기 버퍼 flush 대기 포함)
+        **recorder.summary(targets),
+        "intake": fm.file_intake.stats(),
+        "llm_calls": _diff_calls(calls_before, stub.stats()),
+    }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Reproducible ingestion benchmark (synthetic corpus + stub Ollama)")
+    parser.add_argument("--posts", type=int, default=40)
+    parser.add_argument("--pdfs", type=int, default=4)
+    parser.add_argument("--duplicates", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mode", choices=("scan", "watch", "both"), default="both")
+    parser.add_argument("--text-latency", type=float, default=0.3, help="stub seconds per text-only /api/generate call")
+    parser.add_argument("--vision-latency", type=float, default=1.5, help="stub seconds per image /api/generate call")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--cold-load", type=float, default=0.0, help="stub seconds added to the first call per model")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="stub base latency for one model (repeatable), e.g. moondream=0.4")
+    parser.add_argument("--watch-timeout", type=float, default=WATCH_TIMEOUT)
+    parser.add_argument("--workdir", help="empty directory for the corpus, ChromaDB and caches (default: new temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the work directory afterwards")
+    parser.add_argument("--out", help="also write the JSON result to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s - %(name)s - %(message)s')
+    out_path = os.path.abspath(args.out) if args.out else None
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="vision_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    if os.listdir(workdir):
+        parser.error(f"--workdir must be empty: {workdir}")
+
+    # 무거운 모듈을 올리기 전에 호출 (fork된 자식의 RSS가 RUSAGE_CHILDREN에 잡히지 않도록)
+    commit = _git_commit()
+    stub = OllamaStub(text_latency=args.text_latency, vision_latency=args.vision_latency,
+                      jitter=args.jitter, cold_load=args.cold_load,
+                      model_latency=parse_model_latency(args.model_latency)).start()
+    # 모든 모듈이 상대 경로(./chroma_db, ingest_cache.db, llm_ledger.jsonl)와 import 시점의 OLLAMA_HOST를 쓰므로
+    # 작업 디렉터리와 환경 변수를 먼저 바꾼 뒤 file_manager를 import
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ["OLLAMA_HOST"] = stub.url
+    os.environ["LLM_LEDGER_FILE"] = os.path.join(workdir, "llm_ledger.jsonl")
+    try:
+        corpus = generate_corpus("watched_files", args.posts, args.pdfs, args.duplicates, args.seed)
+
+        import_started = time.monotonic()
+        import file_manager as fm
+        from post_scheduler import PostScheduler
+        from file_intake import FileIntake
+        import llm_ledger
+        import_seconds = time.monotonic() - import_started
+
+        recorder = LatencyRecorder(fm.ingest_pipeline.submit)
+        fm._completion_callbacks = recorder.track_completion(fm._completion_callbacks)
+        fm.post_scheduler = PostScheduler(recorder.submit, fm.carousel_resolved)
+        fm.file_intake = FileIntake(fm.post_scheduler.submit)
+
+        result = {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "workdir", "keep", "verbose")},
+            "corpus": corpus,
+            "import_seconds": round(import_seconds, 3),
+        }
+        if args.mode in ("scan", "both"):
+            result["scan"] = run_scan(fm, recorder, stub, args)
+        if args.mode in ("watch", "both"):
+            result["watch"] = run_watch(fm, recorder, stub, args)
+
+        fm.ingest_pipeline.shutdown()
+        result["llm"] = {"stub_calls": stub.stats(), "models": llm_ledger.report(path=os.environ["LLM_LEDGER_FILE"])["models"]}
+        result["ocr"] = fm.ocr_engine.stats()
+        result["vision_cascade"] = fm.vision_cascade.stats()
+        result["peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        os.chdir(cwd)
+        stub.stop()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    print(output)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    main()
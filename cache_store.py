@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("mcp_vision_server.cache_store")
+
+CACHE_DB_FILE = "ingest_cache.db"
+# 이 횟수만큼 쓰기가 쌓이거나 일정 시간이 지나면 커밋 (파일마다 fsync 하지 않음)
+COMMIT_EVERY = 64
+COMMIT_INTERVAL = 2.0
+
+
+class CacheStore:
+    """
+    수집 캐시(게시물 태그, 본문, 이미지 해시 등)를 위한 SQLite 기반 key-value 저장소.
+    (namespace, key) 기본키 인덱스로 단건 조회하며, 쓰기는 모아서 커밋합니다.
+    하나의 연결을 잠금으로 보호하므로 여러 스레드에서 안전하게 사용할 수 있습니다.
+    """
+
+    def __init__(self, path: str = CACHE_DB_FILE, commit_every: int = COMMIT_EVERY, commit_interval: float = COMMIT_INTERVAL):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        # 열려 있는 transaction() 블록 수 (SAVEPOINT 이름 구분용)
+        self._depth = 0
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT, "
+            "PRIMARY KEY (ns, key)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+        logger.info(f"캐시 저장소 초기화 완료: {path}")
+
+    def _wrote(self, count: int = 1):
+        self._pending += count
+        # transaction() 블록 안에서는 커밋하면 열린 SAVEPOINT까지 끝나므로 블록이 끝날 때까지 미룸
+        if self._depth:
+            return
+        if self._pending >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval:
+            self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        """아직 커밋되지 않은 쓰기를 디스크에 반영합니다."""
+        with self._lock:
+            if self._pending:
+                self._commit()
+
+    @contextmanager
+    def transaction(self, commit: bool = True):
+        """
+        잠금을 잡은 채로 연결을 넘겨줍니다. 전용 테이블을 쓰는 모듈에서 사용합니다.
+        블록은 SAVEPOINT로 감싸므로 예외가 나면 그 블록의 쓰기만 되돌리고, 아직 커밋되지 않은
+        다른 모듈의 쓰기(put 등)는 그대로 남습니다.
+        commit=False이면 블록의 쓰기를 다른 쓰기와 함께 묶어서 커밋합니다.
+        """
+        with self._lock:
+            if not self.conn.in_transaction:
+                # 바깥 트랜잭션 없이 RELEASE하면 곧바로 커밋되므로 묶음 커밋을 위해 먼저 열어 둠
+                self.conn.execute("BEGIN")
+            self._depth += 1
+            savepoint = f"tx{self._depth}"
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute(f"ROLLBACK TO {savepoint}")
+                self.conn.execute(f"RELEASE {savepoint}")
+                raise
+            else:
+                self.conn.execute(f"RELEASE {savepoint}")
+            finally:
+                self._depth -= 1
+            # 중첩된 블록에서 커밋하면 바깥 SAVEPOINT까지 끝나 버리므로 가장 바깥에서만 커밋
+            if commit and not self._depth:
+                self._commit()
+            else:
+                self._wrote()
+
+    def get(self, ns: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def contains(self, ns: str, key: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone() is not None
+
+    def put(self, ns: str, key: str, value: Any):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+                (ns, key, json.dumps(value, ensure_ascii=False))
+            )
+            self._wrote()
+
+    def put_if_absent(self, ns: str, key: str, value: Any) -> bool:
+        """키가 없을 때만 기록합니다. 새로 기록했으면 True (중복 검사와 등록을 원자적으로 수행)."""
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+                (ns, key, json.dumps(value, ensure_ascii=False))
+            )
+            inserted = cur.rowcount > 0
+            if inserted:
+                self._wrote()
+            return inserted
+
+    def put_many(self, ns: str, items: Dict[str, Any]):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+                [(ns, k, json.dumps(v, ensure_ascii=False)) for k, v in items.items()]
+            )
+            self._wrote(len(items))
+
+    def delete(self, ns: str, key: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, key))
+            self._wrote()
+
+    def keys(self, ns: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute("SELECT key FROM kv WHERE ns=?", (ns,))]
+
+    def items(self, ns: str) -> Iterable[Tuple[str, Any]]:
+        with self._lock:
+            rows = self.conn.execute("SELECT key, value FROM kv WHERE ns=?", (ns,)).fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def count(self, ns: str) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM kv WHERE ns=?", (ns,)).fetchone()[0]
+
+    def migrate_json(self, ns: str, json_path: str) -> int:
+        """
+        기존 JSON 캐시 파일을 한 번만 namespace로 옮겨옵니다. (원본 파일은 백업으로 그대로 둠)
+        dict는 그대로, list는 각 원소를 키로 저장합니다.
+        """
+        marker = f"migrated:{ns}"
+        if self.contains("_meta", marker):
+            return 0
+        data: Optional[Any] = None
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.warning(f"JSON 캐시 마이그레이션 실패 {json_path}: {e}")
+                return 0
+        if isinstance(data, list):
+            data = {str(k): True for k in data}
+        migrated = len(data) if isinstance(data, dict) else 0
+        with self.transaction() as conn:
+            if migrated:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+                    [(ns, str(k), json.dumps(v, ensure_ascii=False)) for k, v in data.items()]
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (ns, key, value) VALUES ('_meta', ?, ?)",
+                (marker, json.dumps({"source": json_path, "entries": migrated}))
+            )
+        if migrated:
+            logger.info(f"JSON 캐시 마이그레이션 완료: {json_path} -> {ns} ({migrated}건)")
+        return migrated
+
+
+# 싱글톤 인스턴스 생성
+store = CacheStore()
@@ -1,70 +1,381 @@
 import os
+import sys
+import time
 import logging
+import argparse
+import threading
 import chromadb
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
+from metrics import metrics
+from cache_store import CacheStore
+from neighbour_index import NeighbourIndex
+from tag_index import TagIndex
+from lexical_index import LexicalIndex, rrf
+
+# 쓰기 버퍼: 이 개수가 쌓이거나 일정 시간이 지나면 한 번에 upsert (임베딩도 배치로 계산)
+WRITE_BUFFER_SIZE = 64
+WRITE_FLUSH_INTERVAL = 5.0
+# 한 번의 upsert 호출에 넣을 최대 문서 수
+MAX_UPSERT_BATCH = 256
+# upsert에 실패한 문서는 버퍼로 되돌려 다음 flush에서 다시 시도 (이 횟수까지)
+MAX_UPSERT_ATTEMPTS = 3
+# 검색 시 청크 컬렉션에서 결과 수의 몇 배를 가져와 부모 문서 단위로 합칠지
+CHUNK_OVERFETCH = 4
+# 검색 방식: hybrid = 벡터 + 어휘(BM25 n-gram)를 RRF로 결합, vector / lexical = 한쪽만
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "hybrid")
+# hybrid 검색에서 각 순위 목록을 결과 수의 몇 배까지 가져와 합칠지
+HYBRID_OVERFETCH = 2
+# 컬렉션 옆에 두는 보조 인덱스(이웃 표 등) SQLite 파일
+INDEX_DB_FILE = "vector_index.db"
 
 logger = logging.getLogger("mcp_vision_server.db_manager")
 
+UPSERT_SECONDS = metrics.histogram("vector_db_upsert_seconds", "Time per ChromaDB batch upsert (includes embedding)")
+UPSERT_DOCS = metrics.counter("vector_db_upserted_documents_total", "Documents written to ChromaDB, by outcome")
+
 class VectorDBManager:
-    def __init__(self, db_path: str = "./chroma_db"):
+    def __init__(self, db_path: str = "./chroma_db", buffer_size: int = WRITE_BUFFER_SIZE, flush_interval: float = WRITE_FLUSH_INTERVAL,
+                 embedding_function=None):
         self.db_path = db_path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
         # PersistentClient를 사용하여 로컬에 데이터 저장
         self.client = chromadb.PersistentClient(path=db_path)
         
+        # 임베딩 함수를 주지 않으면 Chroma 기본 임베딩 함수 사용 (벤치마크 등에서만 교체)
+        collection_options = {"embedding_function": embedding_function} if embedding_function is not None else {}
         # 레퍼런스(텍스트/태그 결합) 저장을 위한 컬렉션 생성 (존재하면 가져오기)
         self.collection = self.client.get_or_create_collection(
             name="references",
-            metadata={"hnsw:space": "cosine"}
+            metadata={"hnsw:space": "cosine"},
+            **collection_options
+        )
+        # 긴 PDF의 페이지/구간 청크 (metadata.parent로 부모 레퍼런스에 연결, 검색 결과는 부모 단위로 합쳐짐)
+        self.chunks = self.client.get_or_create_collection(
+            name="reference_chunks",
+            metadata={"hnsw:space": "cosine"},
+            **collection_options
         )
         logger.info(f"ChromaDB 초기화 완료: {db_path}")
+        # 문서별 top-K 이웃 표 (upsert/태그 수정 시 해당 행만 갱신)
+        self.index_store = CacheStore(os.path.join(db_path, INDEX_DB_FILE))
+        self.neighbours = NeighbourIndex(self.collection, self.index_store)
+        # 태그 역색인 (태그 필터/개수/페이지네이션을 저장소 안에서 처리)
+        self.tags = TagIndex(self.collection, self.index_store)
+        # 어휘 색인 (한국어 태그, OCR 문자열 정확 일치용 BM25)
+        self.lexical = LexicalIndex(self.collection, self.index_store)
+        # 여기서 다시 만들지 않음: query_api 등은 요청마다 새 프로세스에서 열리므로 쓰기 프로세스만 ensure_indexes() 호출
+        stale = [name for name, index in self._rebuildable_indexes() if not index.is_current()]
+        if stale:
+            logger.warning(f"보조 색인이 현재 버전이 아닙니다: {', '.join(stale)} "
+                           "(서버 시작 시 또는 'python db_manager.py rebuild'로 다시 만들어집니다)")
 
-    def add_reference(self, file_id: str, text: str, tags: List[str], metadata: Dict = None):
-        """파일의 텍스트와 태그를 벡터 DB에 추가합니다."""
-        if metadata is None:
-            metadata = {}
-        
-        metadata["tags"] = ",".join(tags)
-        metadata["filepath"] = file_id
-        
-        # 검색용 코퍼스는 텍스트와 태그의 결합
-        document = f"Tags: {', '.join(tags)}\nContent: {text}"
-        
+        # id -> (document, metadata). 같은 id가 다시 들어오면 마지막 값만 남습니다.
+        self._buffer: Dict[str, Tuple[str, Dict]] = {}
+        self._buffer_since = 0.0
+        # id -> [(on_stored, on_failed)]. 해당 문서의 upsert가 성공하거나 재시도를 포기했을 때 호출
+        self._callbacks: Dict[str, List[Tuple[Optional[Callable], Optional[Callable]]]] = {}
+        # id -> 실패한 upsert 시도 횟수
+        self._attempts: Dict[str, int] = {}
+        # Chroma에는 기록되었지만 보조 인덱스(태그/어휘) 갱신에 실패한 문서. 다음 flush에서 다시 색인
+        self._index_pending: Dict[str, Tuple[str, Dict]] = {}
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_stop = threading.Event()
+
+    def add_reference(self, file_id: str, text: str, tags: List[str], metadata: Dict = None,
+                      on_stored: Callable[[], None] = None, on_failed: Callable[[str], None] = None):
+        """
+        파일의 텍스트와 태그를 쓰기 버퍼에 넣습니다. 버퍼가 차거나 flush_interval이 지나면 DB에 upsert 됩니다.
+        on_stored는 이 문서가 실제로 DB에 기록된 뒤, on_failed(오류)는 재시도 끝에 기록을 포기했을 때 호출됩니다.
+        """
+        self.add_references([(file_id, text, tags, metadata)], on_stored, on_failed)
+
+    def add_references(self, references: List[Tuple[str, str, List[str], Dict]],
+                       on_stored: Callable[[], None] = None, on_failed: Callable[[str], None] = None):
+        """(file_id, text, tags, metadata) 목록을 한 번에 버퍼링합니다. 이미 존재하는 id는 덮어씁니다(upsert)."""
+        with self._buffer_lock:
+            for file_id, text, tags, metadata in references:
+                metadata = dict(metadata or {})
+                metadata["tags"] = ",".join(tags)
+                metadata["filepath"] = file_id
+                
+                # 검색용 코퍼스는 텍스트와 태그의 결합
+                document = f"Tags: {', '.join(tags)}\nContent: {text}"
+                if not self._buffer:
+                    self._buffer_since = time.monotonic()
+                self._buffer[file_id] = (document, metadata)
+                if on_stored or on_failed:
+                    self._callbacks.setdefault(file_id, []).append((on_stored, on_failed))
+            should_flush = len(self._buffer) >= self.buffer_size
+        self._ensure_flusher()
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """버퍼에 쌓인 레퍼런스를 배치 upsert 합니다. 기록된 문서 수를 반환합니다."""
+        with self._flush_lock:
+            with self._buffer_lock:
+                if not self._buffer and not self._index_pending:
+                    return 0
+                pending = self._buffer
+                self._buffer = {}
+                # 이번에 기록할 값에 걸린 콜백만 가져감 (flush 도중 같은 id가 다시 들어오면 그 콜백은 다음 flush 몫)
+                callbacks = {i: self._callbacks.pop(i) for i in pending if i in self._callbacks}
+            
+            ids = list(pending.keys())
+            written = 0
+            written_ids = []
+            for start in range(0, len(ids), MAX_UPSERT_BATCH):
+                batch_ids = ids[start:start + MAX_UPSERT_BATCH]
+                try:
+                    with UPSERT_SECONDS.time(collection="references"):
+                        self.collection.upsert(
+                            ids=batch_ids,
+                            documents=[pending[i][0] for i in batch_ids],
+                            metadatas=[pending[i][1] for i in batch_ids]
+                        )
+                except Exception as e:
+                    UPSERT_DOCS.inc(len(batch_ids), collection="references", outcome="error")
+                    logger.error(f"DB 배치 upsert 중 오류 발생 ({len(batch_ids)}건, 첫 id {batch_ids[0]}): {e}")
+                    self._retry_later(batch_ids, pending, callbacks, str(e))
+                    continue
+                written += len(batch_ids)
+                written_ids.extend(batch_ids)
+                UPSERT_DOCS.inc(len(batch_ids), collection="references", outcome="ok")
+                for i in batch_ids:
+                    self._attempts.pop(i, None)
+                    self._index_pending[i] = pending[i]
+                    for on_stored, _ in callbacks.get(i, []):
+                        self._run_callback(on_stored, i)
+            self._update_indexes()
+            if written:
+                logger.info(f"DB에 레퍼런스 {written}건 upsert 완료")
+                self._refresh_neighbours(written_ids)
+            return written
+
+    def _retry_later(self, batch_ids: List[str], pending: Dict[str, Tuple[str, Dict]],
+                     callbacks: Dict[str, List[Tuple[Optional[Callable], Optional[Callable]]]], error: str):
+        """
+        실패한 배치를 버퍼로 되돌립니다 (그 사이 같은 id가 새로 들어왔으면 새 값을 유지).
+        시도 횟수를 넘으면 버리고 on_failed 콜백으로 알립니다.
+        """
+        with self._buffer_lock:
+            given_up = []
+            for i in batch_ids:
+                attempts = self._attempts.get(i, 0) + 1
+                if attempts >= MAX_UPSERT_ATTEMPTS:
+                    self._attempts.pop(i, None)
+                    logger.error(f"DB upsert {attempts}회 실패, 기록을 포기합니다: {i}")
+                    given_up.append(i)
+                    continue
+                self._attempts[i] = attempts
+                if i not in self._buffer:
+                    if not self._buffer:
+                        self._buffer_since = time.monotonic()
+                    self._buffer[i] = pending[i]
+                if i in callbacks:
+                    self._callbacks.setdefault(i, [])[:0] = callbacks[i]
+        for i in given_up:
+            for _, on_failed in callbacks.get(i, []):
+                self._run_callback(on_failed, i, error)
+
+    @staticmethod
+    def _run_callback(callback: Optional[Callable], file_id: str, *args):
+        if callback is None:
+            return
         try:
-            self.collection.add(
-                documents=[document],
-                metadatas=[metadata],
-                ids=[file_id]
-            )
-            logger.info(f"DB에 레퍼런스 추가 완료: {file_id}")
+            callback(*args)
         except Exception as e:
-            logger.error(f"DB 추가 중 오류 발생 {file_id}: {e}")
+            logger.error(f"DB 기록 콜백 오류 {file_id}: {e}")
 
-    def search_similar(self, query: str, n_results: int = 5) -> List[Dict]:
-        """쿼리와 가장 유사한 레퍼런스를 검색합니다."""
+    def _update_indexes(self):
+        """Chroma에 기록된 문서를 태그/어휘 색인에 반영합니다. 실패하면 남겨 두었다가 다음 flush에서 다시 시도."""
+        if not self._index_pending:
+            return
+        items = self._index_pending
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
-            
-            # ChromaDB 결과 포맷 변환
-            matched_items = []
-            if results["ids"] and len(results["ids"]) > 0:
-                for idx in range(len(results["ids"][0])):
-                    item = {
-                        "id": results["ids"][0][idx],
-                        "document": results["documents"][0][idx],
-                        "metadata": results["metadatas"][0][idx],
-                        "distance": results["distances"][0][idx]
-                    }
-                    matched_items.append(item)
-            return matched_items
+            self.tags.add([(i, meta) for i, (_, meta) in items.items()])
+            self.lexical.add([(i, doc, meta) for i, (doc, meta) in items.items()])
+        except Exception as e:
+            UPSERT_DOCS.inc(len(items), collection="vector_index", outcome="error")
+            logger.error(f"보조 인덱스 갱신 중 오류 발생 ({len(items)}건), 다음 flush에서 다시 시도: {e}")
+            return
+        self._index_pending = {}
+
+    def _refresh_neighbours(self, ids: List[str]):
+        # 이웃 표 갱신 실패는 쓰기 실패가 아님 (조회 시 비어 있는 행은 다시 계산됨)
+        try:
+            self.neighbours.refresh(ids)
+        except Exception as e:
+            logger.error(f"이웃 표 갱신 중 오류 발생 ({len(ids)}건): {e}")
+
+    def add_chunks(self, parent_id: str, chunks: List[Dict], tags: List[str], metadata: Dict = None) -> int:
+        """
+        부모 레퍼런스의 청크 문서를 기록합니다. 같은 부모의 이전 청크는 먼저 삭제합니다 (재수집 시 페이지 수가 달라질 수 있음).
+        chunks는 {"text", "page_start", "page_end"} 목록이며 기록된 청크 수를 반환합니다.
+        """
+        try:
+            self.chunks.delete(where={"parent": parent_id})
+        except Exception as e:
+            logger.error(f"이전 청크 삭제 중 오류 발생 {parent_id}: {e}")
+        ids, documents, metadatas = [], [], []
+        for index, chunk in enumerate(chunks):
+            chunk_meta = dict(metadata or {})
+            chunk_meta.update({
+                "parent": parent_id,
+                "filepath": parent_id,
+                "tags": ",".join(tags),
+                "chunk": index,
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"]
+            })
+            ids.append(f"{parent_id}#chunk-{index:04d}")
+            documents.append(f"{os.path.basename(parent_id)} (p.{chunk['page_start']}-{chunk['page_end']})\n{chunk['text']}")
+            metadatas.append(chunk_meta)
+        written = 0
+        for start in range(0, len(ids), MAX_UPSERT_BATCH):
+            end = start + MAX_UPSERT_BATCH
+            try:
+                with UPSERT_SECONDS.time(collection="reference_chunks"):
+                    self.chunks.upsert(ids=ids[start:end], documents=documents[start:end], metadatas=metadatas[start:end])
+                written += len(ids[start:end])
+                UPSERT_DOCS.inc(len(ids[start:end]), collection="reference_chunks", outcome="ok")
+            except Exception as e:
+                UPSERT_DOCS.inc(len(ids[start:end]), collection="reference_chunks", outcome="error")
+                logger.error(f"청크 upsert 중 오류 발생 {parent_id} ({start}~): {e}")
+        if written:
+            logger.info(f"DB에 청크 {written}건 기록 완료: {parent_id}")
+        return written
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._buffer_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="db-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._flusher_stop.wait(self.flush_interval / 2):
+            with self._buffer_lock:
+                due = (bool(self._buffer) and time.monotonic() - self._buffer_since >= self.flush_interval) or bool(self._index_pending)
+            if due:
+                self.flush()
+
+    def search_similar(self, query: str, n_results: int = 5, mode: str = None, doc_type: str = None) -> List[Dict]:
+        """
+        쿼리와 가장 유사한 레퍼런스를 검색합니다. PDF 청크 결과는 부모 파일 단위로 합쳐집니다.
+        hybrid(기본)는 벡터 순위와 어휘(BM25) 순위를 RRF로 합치며, 결과에 score(RRF)와 있으면 distance(벡터)를 담습니다.
+        doc_type을 주면 그 종류의 레퍼런스만 검색합니다.
+        """
+        mode = mode or SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {SEARCH_MODES}")
+        self.flush()
+        try:
+            if mode == "vector":
+                return self._vector_search(query, n_results, doc_type)
+            depth = n_results * HYBRID_OVERFETCH
+            vector_items = self._vector_search(query, depth, doc_type) if mode == "hybrid" else []
+            lexical_hits = self.lexical.search(query, depth, doc_type)
+            return self._fuse(vector_items, lexical_hits, n_results)
         except Exception as e:
             logger.error(f"DB 검색 중 오류 발생 '{query}': {e}")
             return []
 
+    def _vector_search(self, query: str, n_results: int, doc_type: str = None) -> List[Dict]:
+        results = self.collection.query(
+            query_texts=[query],
+            n_results=n_results,
+            where={"type": doc_type} if doc_type else None
+        )
+        
+        # ChromaDB 결과 포맷 변환
+        matched_items = []
+        if results["ids"] and len(results["ids"]) > 0:
+            for idx in range(len(results["ids"][0])):
+                item = {
+                    "id": results["ids"][0][idx],
+                    "document": results["documents"][0][idx],
+                    "metadata": results["metadatas"][0][idx],
+                    "distance": results["distances"][0][idx]
+                }
+                matched_items.append(item)
+        # 청크는 PDF 부모에만 있으므로 종류를 지정한 검색에서는 합치지 않음
+        if doc_type:
+            return matched_items
+        return self._merge_chunk_hits(query, matched_items, n_results)
+
+    def _fuse(self, vector_items: List[Dict], lexical_hits: List[Tuple[str, float]], n_results: int) -> List[Dict]:
+        """벡터 결과와 어휘 결과를 RRF로 합칩니다. 어휘 검색에서만 나온 문서는 컬렉션에서 읽어 채웁니다."""
+        by_id = {item["id"]: item for item in vector_items}
+        lexical_scores = dict(lexical_hits)
+        fused = rrf([[item["id"] for item in vector_items], [doc_id for doc_id, _ in lexical_hits]])[:n_results]
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            found = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            for idx, doc_id in enumerate(found["ids"]):
+                by_id[doc_id] = {
+                    "id": doc_id,
+                    "document": found["documents"][idx],
+                    "metadata": found["metadatas"][idx],
+                    "distance": None
+                }
+        output = []
+        for doc_id, score in fused:
+            if doc_id not in by_id:
+                continue
+            item = by_id[doc_id]
+            item["score"] = round(score, 5)
+            if doc_id in lexical_scores:
+                item["lexical_score"] = round(lexical_scores[doc_id], 3)
+            output.append(item)
+        return output
+
+    def _merge_chunk_hits(self, query: str, matched_items: List[Dict], n_results: int) -> List[Dict]:
+        """청크 검색 결과를 부모 레퍼런스로 모아, 부모 거리와 가장 가까운 청크 거리 중 작은 값으로 순위를 매깁니다."""
+        if self.chunks.count() == 0:
+            return matched_items
+        results = self.chunks.query(query_texts=[query], n_results=n_results * CHUNK_OVERFETCH)
+        hits: Dict[str, List[Dict]] = {}
+        for idx in range(len(results["ids"][0]) if results["ids"] else 0):
+            meta = results["metadatas"][0][idx]
+            hits.setdefault(meta["parent"], []).append({
+                "id": results["ids"][0][idx],
+                "page_start": meta.get("page_start"),
+                "page_end": meta.get("page_end"),
+                "distance": results["distances"][0][idx],
+                "snippet": results["documents"][0][idx][:300]
+            })
+        if not hits:
+            return matched_items
+
+        by_id = {item["id"]: item for item in matched_items}
+        missing = [parent for parent in hits if parent not in by_id]
+        if missing:
+            parents = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            for idx, parent in enumerate(parents["ids"]):
+                by_id[parent] = {
+                    "id": parent,
+                    "document": parents["documents"][idx],
+                    "metadata": parents["metadatas"][idx],
+                    "distance": float("inf")
+                }
+        for parent, chunk_hits in hits.items():
+            if parent not in by_id:
+                continue
+            item = by_id[parent]
+            item["chunks"] = chunk_hits
+            item["distance"] = min(item["distance"], chunk_hits[0]["distance"])
+        return sorted(by_id.values(), key=lambda item: item["distance"])[:n_results]
+
     def update_tags(self, file_id: str, new_tags: str) -> bool:
         """기존 문서의 태그를 변경하고 DB를 업데이트합니다. 양방향 수정을 지원합니다."""
+        self.flush()
         try:
             result = self.collection.get(ids=[file_id], include=["documents", "metadatas"])
             if not result or not result["ids"]:
@@ -89,32 +400,103 @@ class VectorDBManager:
                 documents=[new_doc],
                 metadatas=[meta]
             )
+            chunk_result = self.chunks.get(where={"parent": file_id}, include=["metadatas"])
+            if chunk_result["ids"]:
+                for chunk_meta in chunk_result["metadatas"]:
+                    chunk_meta["tags"] = new_tags
+                self.chunks.update(ids=chunk_result["ids"], metadatas=chunk_result["metadatas"])
+            self.tags.set_tags(file_id, new_tags)
+            self.lexical.add([(file_id, new_doc, meta)])
+            # 문서 본문(Tags 헤더)이 바뀌어 다시 임베딩되었으므로 이웃도 갱신
+            self._refresh_neighbours([file_id])
             logger.info(f"DB 태그 수정(Write-back) 완료: {file_id} -> {new_tags}")
             return True
         except Exception as e:
             logger.error(f"DB 태그 수정 오류 {file_id}: {e}")
             return False
 
+    def delete_references(self, file_ids: List[str]) -> int:
+        """레퍼런스와 그 청크를 삭제하고 보조 인덱스(태그, 이웃 표)도 함께 정리합니다. 삭제한 id 수를 반환합니다."""
+        self.flush()
+        try:
+            existing = self.collection.get(ids=file_ids, include=[])["ids"]
+            if not existing:
+                return 0
+            self.collection.delete(ids=existing)
+            for file_id in existing:
+                self.chunks.delete(where={"parent": file_id})
+            self.tags.delete(existing)
+            self.lexical.delete(existing)
+            self.neighbours.delete(existing)
+            logger.info(f"DB에서 레퍼런스 {len(existing)}건 삭제 완료")
+            return len(existing)
+        except Exception as e:
+            logger.error(f"DB 삭제 중 오류 발생 ({len(file_ids)}건): {e}")
+            return 0
+
+    def _rebuildable_indexes(self):
+        return [("tags", self.tags), ("lexical", self.lexical)]
+
+    def ensure_indexes(self):
+        """
+        쓰기 프로세스(서버)가 시작할 때 호출합니다. 버전이 다르거나, 이전 실행이 색인 반영 전에 끝나
+        문서 수가 컬렉션과 어긋난 보조 색인만 다시 만듭니다.
+        """
+        self.flush()
+        total = self.collection.count()
+        for name, index in self._rebuildable_indexes():
+            if not index.is_current() or index.count() != total:
+                logger.info(f"보조 색인 재구성: {name}")
+                index.rebuild()
+
+    def rebuild_indexes(self):
+        """모든 보조 색인(태그, 어휘, 이웃 표)을 다시 만듭니다."""
+        self.flush()
+        for _, index in self._rebuildable_indexes():
+            index.rebuild()
+        self.neighbours.rebuild()
+
+    def get_facets(self, doc_type: str = None, names: List[str] = None, limit: int = None) -> Dict[str, Dict[str, int]]:
+        """태그/대표 태그/종류/월별 문서 수 (태그 색인에서 증감으로 유지되므로 컬렉션을 읽지 않음)."""
+        self.flush()
+        return self.tags.facets(doc_type, names, limit)
+
     def get_file_network(self, file_id: str, max_siblings: int = 5) -> List[Dict]:
-        """특정 파일과 유사한(공유된 속성/태그를 가진) 파일 네트워크를 반환합니다."""
+        """특정 파일과 유사한(공유된 속성/태그를 가진) 파일 네트워크를 반환합니다. 이웃 표에서 읽으므로 임베딩 계산이 없습니다."""
+        self.flush()
         try:
-            # 먼저 대상 파일의 정보를 가져옵니다.
-            result = self.collection.get(ids=[file_id], include=["documents", "metadatas"])
-            if not result["ids"]:
+            neighbours = self.neighbours.neighbours(file_id, max_siblings)
+            if not neighbours:
                 return []
-                
-            document = result["documents"][0]
-            
-            # 해당 문서 내용으로 유사도 검색을 수행 (자기 자신 제외하기 위해 n_results + 1)
-            similar_results = self.search_similar(query=document, n_results=max_siblings + 1)
-            
-            # 본인 제외
-            network = [res for res in similar_results if res["id"] != file_id]
-            return network[:max_siblings]
-            
+            result = self.collection.get(ids=[n for n, _ in neighbours], include=["documents", "metadatas"])
+            found = {doc_id: (result["documents"][idx], result["metadatas"][idx]) for idx, doc_id in enumerate(result["ids"])}
+
+            network = []
+            for neighbour_id, similarity in neighbours:
+                if neighbour_id not in found:
+                    continue
+                document, metadata = found[neighbour_id]
+                network.append({
+                    "id": neighbour_id,
+                    "document": document,
+                    "metadata": metadata,
+                    "distance": 1.0 - similarity
+                })
+            return network
+
         except Exception as e:
             logger.error(f"네트워크 검색 중 오류 발생 '{file_id}': {e}")
             return []
 
 # 싱글톤 인스턴스 생성
 db = VectorDBManager()
+
+metrics.callback("vector_db_write_buffer", "References buffered and not yet upserted", lambda: len(db._buffer))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector DB sidecar index maintenance")
+    parser.add_argument("command", choices=("rebuild",), help="rebuild = recreate the tag, lexical and neighbour indexes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', stream=sys.stderr)
+    db.rebuild_indexes()
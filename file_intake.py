@@ -0,0 +1,198 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from scan_manifest import manifest, UNCHANGED
+
+logger = logging.getLogger("mcp_vision_server.file_intake")
+
+# 크기/mtime이 이 시간 동안 변하지 않으면 쓰기가 끝난 것으로 판단
+SETTLE_SECONDS = 1.0
+POLL_INTERVAL = 0.25
+# 이 시간이 지나도 안정되지 않는 파일은 포기 (다음 전체 스캔에서 다시 수집됨)
+MAX_SETTLE_WAIT = 300.0
+# 파이프라인이 직접 태그 폴더로 옮긴 파일의 도착 이벤트를 무시하는 시간
+# (매니페스트는 DB flush 후에야 기록되므로 안정화 시점에는 아직 UNCHANGED가 아님)
+MOVE_IGNORE_SECONDS = 30.0
+
+# 값이 작을수록 먼저 투입. 본문(.txt)을 먼저 처리해야 이미지 분석 때 태그/본문 캐시를 활용할 수 있음
+EXTENSION_PRIORITY = {".txt": 0, ".pdf": 1}
+DEFAULT_PRIORITY = 2
+
+
+def intake_priority(filepath: str) -> int:
+    return EXTENSION_PRIORITY.get(os.path.splitext(filepath)[1].lower(), DEFAULT_PRIORITY)
+
+
+class _Pending:
+    def __init__(self, now: float):
+        self.first_seen = now
+        self.changed_at = now
+        self.signature: Optional[Tuple[int, float]] = None
+
+
+class FileIntake:
+    """
+    파일 시스템 이벤트와 수집 파이프라인 사이의 투입 계층.
+    같은 경로의 이벤트는 하나로 합치고, 크기/mtime이 SETTLE_SECONDS 동안 그대로일 때(쓰기 완료)만 투입합니다.
+    안정된 파일은 우선순위 큐(.txt -> .pdf -> 이미지)에 들어가며, 투입이 Backpressure로 막혀 있는 동안
+    새로 도착한 본문이 대기 중인 이미지보다 먼저 나갑니다.
+    """
+
+    def __init__(self, dispatch: Callable[[str], Future], settle_seconds: float = SETTLE_SECONDS,
+                 poll_interval: float = POLL_INTERVAL, max_settle_wait: float = MAX_SETTLE_WAIT):
+        self._dispatch = dispatch
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_settle_wait = max_settle_wait
+        self._pending: Dict[str, _Pending] = {}
+        self._ready: List[Tuple[int, int, str]] = []
+        self._queued = set()
+        self._in_flight = set()
+        # 경로 -> 무시 만료 시각 (monotonic)
+        self._ignored: Dict[str, float] = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self._counters = {"events": 0, "coalesced": 0, "dispatched": 0, "unchanged": 0, "vanished": 0, "timed_out": 0,
+                          "ignored": 0}
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [
+            threading.Thread(target=self._settle_loop, name="file-intake-settle", daemon=True),
+            threading.Thread(target=self._dispatch_loop, name="file-intake-dispatch", daemon=True)
+        ]
+        for t in self._threads:
+            t.start()
+        logger.info(f"File intake started (settle {self.settle_seconds}s)")
+
+    def stop(self):
+        """대기 중인 파일은 버립니다. (매니페스트에 없으므로 다음 전체 스캔에서 수집됨)"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    def _key(self, filepath: str) -> str:
+        return os.path.abspath(filepath)
+
+    def ignore(self, filepath: str, seconds: float = MOVE_IGNORE_SECONDS):
+        """파이프라인이 곧 이 경로로 파일을 옮깁니다. 그동안 도착하는 이벤트는 투입하지 않습니다."""
+        now = time.monotonic()
+        with self._cond:
+            self._ignored = {p: until for p, until in self._ignored.items() if until > now}
+            self._ignored[self._key(filepath)] = now + seconds
+
+    def notify(self, filepath: str):
+        """생성/수정/이동(도착) 이벤트. 이미 대기 중이거나 처리 중인 경로면 합쳐집니다."""
+        path = self._key(filepath)
+        now = time.monotonic()
+        with self._cond:
+            self._counters["events"] += 1
+            until = self._ignored.get(path)
+            if until is not None:
+                if until > now:
+                    self._counters["ignored"] += 1
+                    return
+                del self._ignored[path]
+            if path in self._in_flight or path in self._queued:
+                self._counters["coalesced"] += 1
+                return
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = _Pending(now)
+            else:
+                self._counters["coalesced"] += 1
+                entry.changed_at = now
+
+    def discard(self, filepath: str):
+        """이동(출발)/삭제 이벤트. 아직 투입되지 않은 경로라면 대기 목록에서 뺍니다."""
+        with self._cond:
+            self._pending.pop(self._key(filepath), None)
+
+    def _settle_loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                self._cond.wait(self.poll_interval)
+                if not self._running:
+                    return
+                paths = list(self._pending.items())
+            now = time.monotonic()
+            settled, dropped = [], []
+            for path, entry in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    dropped.append((path, "vanished"))
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                if signature != entry.signature or stat.st_size == 0:
+                    entry.signature = signature
+                    entry.changed_at = now
+                elif now - entry.changed_at >= self.settle_seconds:
+                    settled.append(path)
+                    continue
+                if now - entry.first_seen >= self.max_settle_wait:
+                    dropped.append((path, "timed_out"))
+            # 이미 수집된 파일(이전 실행에서 옮겨진 파일, touch 등)은 투입하지 않음
+            unchanged = [p for p in settled if manifest.check(p) == UNCHANGED]
+            dropped += [(p, "unchanged") for p in unchanged]
+            settled = [p for p in settled if p not in unchanged]
+            with self._cond:
+                for path, reason in dropped:
+                    if self._pending.pop(path, None) is not None:
+                        self._counters[reason] += 1
+                        if reason == "timed_out":
+                            logger.warning(f"File never settled, skipping: {path}")
+                for path in settled:
+                    if self._pending.pop(path, None) is None:
+                        continue
+                    self._seq += 1
+                    heapq.heappush(self._ready, (intake_priority(path), self._seq, path))
+                    self._queued.add(path)
+                if settled:
+                    self._cond.notify_all()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or not self._running)
+                if not self._running:
+                    return
+                _, _, path = heapq.heappop(self._ready)
+                self._queued.discard(path)
+                self._in_flight.add(path)
+                self._counters["dispatched"] += 1
+            logger.info(f"File write complete. Enqueuing: {path}")
+            try:
+                future = self._dispatch(path)
+            except Exception as e:
+                logger.error(f"File intake dispatch fault {path}: {e}")
+                self._done(path)
+                continue
+            future.add_done_callback(lambda f, p=path: self._done(p))
+
+    def _done(self, path: str):
+        with self._cond:
+            self._in_flight.discard(path)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "ready": len(self._ready),
+                "in_flight": len(self._in_flight),
+                **self._counters
+            }
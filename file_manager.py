@@ -1,105 +1,93 @@
 import os
-import io
+import time
 import logging
 import asyncio
-import base64
-import queue
-import threading
-import requests
-import fitz  # PyMuPDF
-import pytesseract
-import json
 import re
-import imagehash
-from PIL import Image, ImageEnhance
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from db_manager import db
+from ollama_client import ollama
+from cache_store import store
+from phash_index import PHashIndex
+from analysis_cache import vision_cache, classification_cache, ocr_cache, text_cache_key
+from local_classifier import classify_locally, record_outcome
+from taxonomy import VALID_CATEGORIES, apply_hierarchy, clean_spam_text, taxonomy_version
+from image_context import ImageContext
+from scan_manifest import manifest, file_content_hash, NEW, CHANGED
+from ingest_pipeline import Stage, StagedPipeline
+from post_scheduler import PostScheduler, parse_shortcode
+from file_intake import FileIntake
+from processing_ledger import ledger
+from pdf_ingest import extract_pdf_pages, chunk_pages, representative_sample
+from ocr_engine import ocr_engine, detect_text, OCR_LANG
+from vision_cascade import vision_cascade
+from prompt_builder import classify_prompt, classify_system, warm_up_async
+from metrics import metrics
 
 logger = logging.getLogger("mcp_vision_server.file_manager")
 
-file_queue = queue.Queue()
+# 파이프라인 스테이지별 워커 수 및 스테이지 간 큐 크기
+DECODE_WORKERS = 2
+OCR_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+VISION_WORKERS = 2  # Ollama 동시 요청 수 (OLLAMA_NUM_PARALLEL과 맞추는 것을 권장)
+STORE_WORKERS = 1   # ChromaDB는 단일 writer로 유지
+PIPELINE_QUEUE_SIZE = 16
 
-HASH_FILE = "image_hashes.json"
-seen_hashes = set()
-if os.path.exists(HASH_FILE):
-    try:
-        with open(HASH_FILE, "r", encoding="utf-8") as f:
-            seen_hashes = set(json.load(f))
-    except Exception:
-        pass
+SUPPORTED_EXTENSIONS = [".pdf", ".jpg", ".jpeg", ".png", ".txt"]
 
+# 기존 JSON 캐시 파일 (최초 1회 SQLite 캐시 저장소로 마이그레이션된 뒤에는 백업으로만 남음)
+HASH_FILE = "image_hashes.json"
 TAGS_CACHE_FILE = "post_tags.json"
-post_tags_cache = {}
-if os.path.exists(TAGS_CACHE_FILE):
-    try:
-        with open(TAGS_CACHE_FILE, "r", encoding="utf-8") as f:
-            post_tags_cache = json.load(f)
-    except Exception:
-        pass
-
 TEXT_CACHE_FILE = "post_text_cache.json"
-post_text_cache = {}
-if os.path.exists(TEXT_CACHE_FILE):
-    try:
-        with open(TEXT_CACHE_FILE, "r", encoding="utf-8") as f:
-            post_text_cache = json.load(f)
-    except Exception:
-        pass
-
-# 전략 4: 계층형 태깅 시스템 (Hierarchy Tagging)
-HIERARCHY_MAP = {
-    "의자": ["가구"],
-    "소파": ["가구"],
-    "테이블": ["가구"],
-    "책상": ["가구"],
-    "수납장": ["가구"],
-    "선반": ["가구"],
-    "침대": ["가구"],
-    "조명": ["소품"],
-    "평면도": ["도면"],
-    "투시도": ["도면", "표현"],
-    "조감도": ["도면", "표현"],
-    "건축모형": ["모형"],
-    "실내건축": ["공간디자인"],
-    "파사드": ["외부건축", "건축"],
-    "인물사진": ["사진", "포토그래피"]
-}
-
-VALID_CATEGORIES = [c.strip() for c in "건축, 공간디자인, 실내건축, 주거공간, 상업공간, 공공건축, 전시공간, 파사드, 외부건축, 도면, 평면도, 투시도, 조감도, 건축모형, 모형, 건축가, 가구, 의자, 소파, 테이블, 책상, 수납장, 선반, 조명, 침대, 소품, 오브제, 하드웨어, 부속품, 목공, 금속공예, 가구제작, 디자인, 시각디자인, 영상디자인, 제품디자인, 타이포그래피, 브랜딩, 로고, UX, UI, 패키지디자인, 패션, 드로잉, 사진, 포토그래피, 인물사진, 스튜디오, 영화, 영상, 음악, 전시, 미술품, 표현, 책, 매거진, 인터뷰, 에세이, 리뷰, 비평, 논설, 칼럼, 기획, 전략, 사업공고, 조언, 작업, 그리드, 색감, 다이어그램, 질감, 텍스처, 타이포배치, 미니멀리즘, 음식, 플레이팅, ai, 미분류, 복합".split(',')]
-
-def apply_hierarchy(tags: list[str]) -> list[str]:
-    extended = set(tags)
-    for t in tags:
-        if t in HIERARCHY_MAP:
-            extended.update(HIERARCHY_MAP[t])
-    return list(extended)
-
-def clean_spam_text(text: str) -> str:
-    lines = text.split('\n')
-    clean_lines = []
-    
-    for line in lines:
-        words = line.split()
-        if not words:
-            continue
-            
-        hashtags = [w for w in words if w.startswith('#')]
-        
-        if len(hashtags) > 3 and len(hashtags) > len(words) * 0.5:
-            continue
-            
-        cleaned_line = re.sub(r'@[a-zA-Z0-9_.]+', '', line).strip()
-        
-        if cleaned_line and not (len(cleaned_line) < 15 and "view" in cleaned_line.lower()):
-            clean_lines.append(cleaned_line)
-            
-    return '\n'.join(clean_lines)
-
-def process_and_store_file(filepath: str) -> bool:
+CAROUSEL_CACHE_FILE = "carousel_desc_cache.json"
+
+# 캐시 저장소 namespace
+HASH_NS = "image_hashes"
+TAGS_NS = "post_tags"
+TEXT_NS = "post_text"
+CAROUSEL_NS = "carousel_desc"
+
+store.migrate_json(HASH_NS, HASH_FILE)
+store.migrate_json(TAGS_NS, TAGS_CACHE_FILE)
+store.migrate_json(TEXT_NS, TEXT_CACHE_FILE)
+store.migrate_json(CAROUSEL_NS, CAROUSEL_CACHE_FILE)
+
+# 비전 분석 모델 단계(vision_cascade)와 프롬프트 버전 (프롬프트를 바꾸면 버전을 올려 해당 캐시 항목만 무효화)
+VISION_PROMPT_VERSION = "v2"
+VISION_CACHE_VERSION = f"{vision_cascade.version}:{VISION_PROMPT_VERSION}"
+vision_cache.purge_stale(VISION_CACHE_VERSION)
+
+# 텍스트 분류 메모 캐시 버전 (모델 + 분류 체계 + 프롬프트)
+CLASSIFY_MODEL = "llava:7b"
+CLASSIFY_PROMPT_VERSION = "v2"
+CLASSIFY_CACHE_VERSION = f"{CLASSIFY_MODEL}:{taxonomy_version(VALID_CATEGORIES)}:{CLASSIFY_PROMPT_VERSION}"
+
+# OCR 캐시 버전 (언어 + 전처리/텍스트 검출 방식)
+OCR_PREPROCESS_VERSION = "v1"
+OCR_CACHE_VERSION = f"{OCR_LANG}:{OCR_PREPROCESS_VERSION}"
+ocr_cache.purge_stale(OCR_CACHE_VERSION)
+
+# 근접 중복 이미지 판정 해밍 거리 (64비트 phash 기준)
+NEAR_DUP_RADIUS = 6
+# phash -> 해당 이미지의 비전 분석 결과 (근접 중복 이미지가 재사용)
+PHASH_ANALYSIS_NS = "phash_analysis"
+
+# 스테이지 내부 단계별 소요 시간/오류 수 (/metrics, get_ingest_metrics)
+STEP_SECONDS = metrics.histogram("ingest_step_seconds", "Time spent in each ingestion step (decode, phash, ocr, classify, vision, db_write)")
+STEP_ERRORS = metrics.counter("ingest_step_errors_total", "Failed ingestion steps")
+
+phash_index = PHashIndex()
+phash_index.add_many(store.keys(HASH_NS))
+logger.info(f"Perceptual hash index loaded: {len(phash_index)} images")
+
+def _same_path(a: str, b: str) -> bool:
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def prepare_file(filepath: str) -> dict | None:
+    """[decode/phash 스테이지] 파일 메타데이터를 수집하고 이미지의 경우 phash 중복 검사를 수행합니다."""
     ext = os.path.splitext(filepath)[1].lower()
-    if ext not in [".pdf", ".jpg", ".jpeg", ".png", ".txt"]:
-        return False
+    if ext not in SUPPORTED_EXTENSIONS:
+        return None
         
     try:
         stat = os.stat(filepath)
@@ -107,111 +95,190 @@ def process_and_store_file(filepath: str) -> bool:
             "size_bytes": int(stat.st_size),
             "timestamp": float(stat.st_mtime)
         }
+        content_hash = file_content_hash(filepath)
     except Exception as e:
         logger.error(f"Failed to extract file stats {filepath}: {e}")
-        return False
+        return None
 
-    if ext == ".pdf":
-        logger.info(f"Processing PDF: {filepath}")
-        metadata["type"] = "pdf"
-        text = extract_pdf_text(filepath)
-        arch_tags = classify_content_text(text)
-        arch_tags = apply_hierarchy(arch_tags)
-        tags = ["pdf", "document"] + arch_tags
-        
-        db.add_reference(filepath, text, tags, metadata)
-        return True
+    # 전체 스캔과 감시 폴더가 같은 파일을 동시에 넣어도 한 번만 분석 (내용 해시 단위 임대)
+    if not ledger.claim(content_hash, filepath):
+        return None
 
     filename = os.path.basename(filepath)
-    shortcode = None
-    if filename.startswith("ig_"):
-        parts = filename.split('_')
-        if len(parts) >= 2:
-            shortcode = parts[1]
-
-    tags = []
-    final_text = ""
-
-    # Carousel Context Cache
-    CAROUSEL_CACHE_FILE = "carousel_desc_cache.json"
-    carousel_desc_cache = {}
-    if os.path.exists(CAROUSEL_CACHE_FILE):
+    shortcode = parse_shortcode(filename)
+
+    job = {
+        "filepath": filepath,
+        "filename": filename,
+        "ext": ext,
+        "shortcode": shortcode,
+        "metadata": metadata,
+        "content_hash": content_hash,
+    }
+
+    if ext in [".jpg", ".jpeg", ".png"]:
+        logger.info(f"Processing image: {filepath}")
+        metadata["type"] = "image"
         try:
-            with open(CAROUSEL_CACHE_FILE, "r", encoding="utf-8") as f:
-                carousel_desc_cache = json.load(f)
+            # 한 번 디코딩한 이미지를 phash, OCR, 비전 인코딩 스테이지가 공유
+            with STEP_SECONDS.time(step="decode"):
+                image_ctx = ImageContext(filepath)
+            job["image_ctx"] = image_ctx
+            with STEP_SECONDS.time(step="phash"):
+                img_hash = image_ctx.phash()
+            job["phash"] = img_hash
+            if not store.put_if_absent(HASH_NS, img_hash, filepath):
+                original = store.get(HASH_NS, img_hash)
+                # 같은 파일을 다시 스캔한 경우는 중복이 아님 (원본 경로가 남아 있는 다른 파일일 때만 삭제)
+                if isinstance(original, str) and os.path.exists(original) and not _same_path(original, filepath):
+                    image_ctx.close()
+                    os.remove(filepath)
+                    ledger.release(content_hash, "exact duplicate removed")
+                    return None
+                store.put(HASH_NS, img_hash, filepath)
+                job["linked_phash"] = img_hash
+            else:
+                # 몇 비트만 다른 재캡처 이미지는 원본의 분석 결과에 연결
+                match = phash_index.nearest(img_hash, NEAR_DUP_RADIUS)
+                if match:
+                    distance, original_hash = match
+                    job["linked_phash"] = original_hash
+                    metadata["near_duplicate_of"] = str(store.get(HASH_NS, original_hash, ""))
+                    logger.info(f"Near-duplicate image (distance {distance}) of {metadata['near_duplicate_of']}: {filepath}")
+                phash_index.add(img_hash)
+            metadata["width"] = image_ctx.width
+            metadata["height"] = image_ctx.height
+            metadata["resolution"] = f"{image_ctx.width}x{image_ctx.height}"
         except:
             pass
 
-    if ext == ".txt":
+    return job
+
+def extract_file_content(job: dict) -> dict | None:
+    """[OCR 스테이지] PDF 텍스트, 게시물 본문, 이미지 OCR 등 CPU 위주의 추출 작업을 수행합니다."""
+    filepath = job["filepath"]
+    ext = job["ext"]
+
+    if ext == ".pdf":
+        logger.info(f"Processing PDF: {filepath}")
+        job["metadata"]["type"] = "pdf"
+        try:
+            pages = extract_pdf_pages(filepath)
+        except Exception as e:
+            logger.error(f"PDF 텍스트 추출 중 오류 발생 {filepath}: {e}")
+            pages = []
+        job["chunks"] = chunk_pages(pages)
+        # 분류와 부모 레퍼런스 문서에는 전체 본문 대신 크기가 제한된 대표 샘플을 사용
+        job["text"] = representative_sample(job["chunks"])
+        job["metadata"]["page_count"] = len(pages)
+        job["metadata"]["chunk_count"] = len(job["chunks"])
+        logger.info(f"PDF 텍스트 추출 완료: {filepath} ({len(pages)} pages, {len(job['chunks'])} chunks)")
+    elif ext == ".txt":
         logger.info(f"Processing Text file: {filepath}")
-        metadata["type"] = "text"
+        job["metadata"]["type"] = "text"
         try:
             with open(filepath, "r", encoding="utf-8") as f:
                 raw_text = f.read()
         except:
-            return False
-            
-        text = clean_spam_text(raw_text)
+            return None
+        job["text"] = clean_spam_text(raw_text)
+    else:
+        job["ocr_text"] = extract_image_ocr(filepath, job.get("image_ctx"), job["content_hash"])
+    return job
+
+def analyze_file(job: dict) -> dict:
+    """[vision/classification 스테이지] Ollama 호출로 태그와 시각 묘사를 생성합니다."""
+    filepath = job["filepath"]
+    ext = job["ext"]
+    shortcode = job["shortcode"]
+
+    if ext == ".pdf":
+        arch_tags = classify_content_text(job["text"])
+        arch_tags = apply_hierarchy(arch_tags)
+        job["tags"] = ["pdf", "document"] + arch_tags
+        job["final_text"] = job["text"]
+        return job
+
+    if ext == ".txt":
+        text = job["text"]
         class_tags = classify_content_text(text)
         class_tags = apply_hierarchy(class_tags)
-        tags = ["text", "instagram_post"] + class_tags
-        final_text = text
+        job["tags"] = ["text", "instagram_post"] + class_tags
+        job["final_text"] = text
         
         if shortcode:
             if class_tags:
-                post_tags_cache[shortcode] = class_tags
-                with open(TAGS_CACHE_FILE, "w", encoding="utf-8") as f:
-                    json.dump(post_tags_cache, f)
+                store.put(TAGS_NS, shortcode, class_tags)
             # 전략 1: 텍스트 캐시 저장 (이후 이미지 분석 시 Hybrid Reasoning에 사용)
-            post_text_cache[shortcode] = text
-            with open(TEXT_CACHE_FILE, "w", encoding="utf-8") as f:
-                json.dump(post_text_cache, f)
+            store.put(TEXT_NS, shortcode, text)
+        return job
 
+    ocr_text = job["ocr_text"]
+    cached_tags = store.get(TAGS_NS, shortcode) if shortcode else None
+    cached_text = store.get(TEXT_NS, shortcode, "") if shortcode else ""
+    # Carousel Context Cache
+    carousel_cached_desc = store.get(CAROUSEL_NS, shortcode, "[Linked Object] This is another slide from the same architectural post.") if shortcode else "Inner Carousel Slide"
+    
+    linked = store.get(PHASH_ANALYSIS_NS, job["linked_phash"]) if job.get("linked_phash") else None
+    
+    # 대표 슬라이드 분석이 끝난 게시물의 다른 슬라이드는 그 결과를 상속 (PostScheduler가 대표 슬라이드를 먼저 처리)
+    representative_done = shortcode is not None and store.contains(CAROUSEL_NS, shortcode)
+    if cached_tags and (representative_done or re.search(r'_[1-9]\d*\.(png|jpg|jpeg)$', filepath.lower())):
+        logger.info(f"경량화: Carousel 상속 적용 -> {filepath} : {cached_tags}")
+        description, image_tags = carousel_cached_desc, cached_tags
+    elif linked:
+        logger.info(f"경량화: 유사 이미지 분석 결과 재사용 -> {filepath} : {linked['tags']}")
+        description, image_tags = linked["description"], linked["tags"]
+        # 재사용한 결과도 비전 분석 결과이므로 같은 게시물의 다른 슬라이드가 상속할 수 있게 기록
+        if shortcode and not representative_done:
+            store.put(CAROUSEL_NS, shortcode, description)
     else:
-        logger.info(f"Processing image: {filepath}")
-        metadata["type"] = "image"
-        try:
-            with Image.open(filepath) as img:
-                img_hash = str(imagehash.phash(img))
-                if img_hash in seen_hashes:
-                    img.close()
-                    os.remove(filepath)
-                    return False
-                seen_hashes.add(img_hash)
-                with open(HASH_FILE, "w", encoding="utf-8") as f:
-                    json.dump(list(seen_hashes), f)
-                metadata["width"] = img.width
-                metadata["height"] = img.height
-                metadata["resolution"] = f"{img.width}x{img.height}"
-        except:
-            pass
-            
-        ocr_text = extract_image_ocr(filepath)
-        
-        cached_tags = post_tags_cache.get(shortcode) if shortcode else None
-        cached_text = post_text_cache.get(shortcode) if shortcode else ""
-        carousel_cached_desc = carousel_desc_cache.get(shortcode, "[Linked Object] This is another slide from the same architectural post.") if shortcode else "Inner Carousel Slide"
-        
-        if cached_tags and re.search(r'_[1-9]\d*\.(png|jpg|jpeg)$', filepath.lower()):
-            logger.info(f"경량화: Carousel 상속 적용 -> {filepath} : {cached_tags}")
-            description, image_tags = carousel_cached_desc, cached_tags
-        else:
-            # 전략 1 & 2: 이미지 분석 시 OCR 텍스트와 본문 텍스트를 함께 전달 (Hybrid + Deep Scan)
-            description, image_tags = extract_image_semantics(filepath, ocr_text, cached_text)
-            image_tags = apply_hierarchy(image_tags)
-            if shortcode and image_tags and "미분류" not in image_tags:
-                post_tags_cache[shortcode] = image_tags
-                # Cache the description for subsequent carousel slides
-                carousel_desc_cache[shortcode] = description
-                with open(TAGS_CACHE_FILE, "w", encoding="utf-8") as f:
-                    json.dump(post_tags_cache, f)
-                with open(CAROUSEL_CACHE_FILE, "w", encoding="utf-8") as f:
-                    json.dump(carousel_desc_cache, f)
-            
-        tags = ["image"] + image_tags
-        # 전략 5: 이 방대한 시각 묘사와 문맥 텍스트 자체가 Vector DB에 임베딩되어 시각적 특징 검색 퀄리티 극대화
-        final_text = f"Vision Description:\n{description}\n\nOCR Text:\n{ocr_text}\n\nRelated Post Text:\n{cached_text}"
+        # 전략 1 & 2: 이미지 분석 시 OCR 텍스트와 본문 텍스트를 함께 전달 (Hybrid + Deep Scan)
+        description, image_tags = extract_image_semantics(filepath, ocr_text, cached_text, image_ctx=job.get("image_ctx"), content_hash=job["content_hash"])
+        image_tags = apply_hierarchy(image_tags)
+        if shortcode and image_tags and "미분류" not in image_tags:
+            store.put(TAGS_NS, shortcode, image_tags)
+            # Cache the description for subsequent carousel slides
+            store.put(CAROUSEL_NS, shortcode, description)
+        if job.get("phash") and image_tags and "미분류" not in image_tags:
+            store.put(PHASH_ANALYSIS_NS, job["phash"], {"description": description, "tags": image_tags})
         
+    job["tags"] = ["image"] + image_tags
+    # 전략 5: 이 방대한 시각 묘사와 문맥 텍스트 자체가 Vector DB에 임베딩되어 시각적 특징 검색 퀄리티 극대화
+    job["final_text"] = f"Vision Description:\n{description}\n\nOCR Text:\n{ocr_text}\n\nRelated Post Text:\n{cached_text}"
+    return job
+
+def _completion_callbacks(filepath: str, content_hash: str) -> dict:
+    """
+    매니페스트/장부의 완료 기록은 DB 쓰기 버퍼가 실제로 upsert된 뒤에만 남깁니다.
+    그 전에 종료되거나 기록에 실패하면 임대가 반납되어(또는 recover()로) 다음 스캔에서 다시 처리됩니다.
+    """
+    def on_stored():
+        manifest.record(filepath, content_hash)
+        ledger.complete(content_hash, filepath)
+
+    def on_failed(error: str):
+        ledger.release(content_hash, f"db write failed: {error}")
+
+    return {"on_stored": on_stored, "on_failed": on_failed}
+
+def store_file(job: dict) -> bool:
+    """[DB write 스테이지] 태그 폴더로 파일을 이동하고 Vector DB에 기록합니다."""
+    filepath = job["filepath"]
+    filename = job["filename"]
+    shortcode = job["shortcode"]
+    tags = job["tags"]
+    metadata = job["metadata"]
+    # 파일 이동 전에 디코딩된 이미지를 해제
+    if job.get("image_ctx"):
+        job["image_ctx"].close()
+
+    if job["ext"] == ".pdf":
+        with STEP_SECONDS.time(step="db_write"):
+            db.add_reference(filepath, job["final_text"], tags, metadata, **_completion_callbacks(filepath, job["content_hash"]))
+            db.add_chunks(filepath, job["chunks"], tags, {"type": "pdf_chunk", "timestamp": metadata["timestamp"]})
+        return True
+
     primary_tag = tags[1] if len(tags) > 1 else (tags[0] if tags else "미분류")
     if "instagram_post" in primary_tag or primary_tag in ["text", "image"]:
         primary_tag = tags[2] if len(tags) > 2 else "미분류"
@@ -225,6 +292,9 @@ def process_and_store_file(filepath: str) -> bool:
     new_filepath = os.path.join(target_dir, filename)
     
     import shutil
+    # 이동으로 생기는 도착 이벤트가 같은 파일을 다시 투입하지 않도록 먼저 등록
+    if new_filepath != filepath:
+        file_intake.ignore(new_filepath)
     try:
         shutil.move(filepath, new_filepath)
     except:
@@ -237,30 +307,80 @@ def process_and_store_file(filepath: str) -> bool:
             with open(shortcut_path, "w", encoding="utf-8") as f:
                 f.write(f"[InternetShortcut]\nURL={url_str}\nIconIndex=0\n")
     
-    db.add_reference(new_filepath, final_text.strip(), tags, metadata)
+    if job.get("phash"):
+        store.put(HASH_NS, job["phash"], new_filepath)
+    with STEP_SECONDS.time(step="db_write"):
+        db.add_reference(new_filepath, job["final_text"].strip(), tags, metadata,
+                         **_completion_callbacks(new_filepath, job["content_hash"]))
     return True
 
-def process_queued_files():
-    while True:
-        filepath = file_queue.get()
-        if filepath is None:
-            break
-        try:
-            process_and_store_file(filepath)
-        except Exception as e:
-            logger.error(f"Queue execution fault {filepath}: {e}")
-        finally:
-            file_queue.task_done()
+def abort_job(job, error: Exception = None):
+    """파이프라인 중간에 실패한 job의 임대를 반납해 다음 스캔에서 다시 처리되도록 합니다."""
+    if not isinstance(job, dict):
+        return
+    if job.get("image_ctx"):
+        job["image_ctx"].close()
+    ledger.release(job["content_hash"], str(error) if error else "aborted")
 
-queue_worker = threading.Thread(target=process_queued_files, daemon=True)
-queue_worker.start()
+def process_and_store_file(filepath: str) -> bool:
+    """파이프라인 없이 한 파일을 모든 스테이지에 순서대로 통과시킵니다."""
+    prepared = prepare_file(filepath)
+    if prepared is None:
+        return False
+    try:
+        job = extract_file_content(prepared)
+        if job is None:
+            abort_job(prepared)
+            return False
+        job = analyze_file(job)
+        return store_file(job)
+    except Exception as e:
+        abort_job(prepared, e)
+        raise
+
+def build_ingest_pipeline() -> StagedPipeline:
+    """decode/phash -> OCR(CPU pool) -> vision(I/O) -> DB write 4단계 파이프라인을 구성합니다."""
+    return StagedPipeline([
+        Stage("decode", prepare_file, DECODE_WORKERS, PIPELINE_QUEUE_SIZE),
+        Stage("ocr", extract_file_content, OCR_WORKERS, PIPELINE_QUEUE_SIZE),
+        Stage("vision", analyze_file, VISION_WORKERS, PIPELINE_QUEUE_SIZE),
+        Stage("store", store_file, STORE_WORKERS, PIPELINE_QUEUE_SIZE),
+    ], name="ingest", on_abort=abort_job)
+
+# scan_directory_once, DirectoryMonitor, main.py 모두 이 파이프라인 하나로 파일을 투입합니다.
+ingest_pipeline = build_ingest_pipeline()
+
+def carousel_resolved(shortcode: str) -> bool:
+    """대표 슬라이드의 분석 결과가 캐러셀 캐시에 있어 나머지 슬라이드가 상속할 수 있는지."""
+    return store.contains(CAROUSEL_NS, shortcode)
+
+# 인스타그램 게시물 단위 스케줄링 (본문 -> 대표 슬라이드 -> 나머지 슬라이드)
+post_scheduler = PostScheduler(ingest_pipeline.submit, carousel_resolved)
+# 감시 폴더 이벤트 투입 계층 (쓰기 완료 대기, 중복 이벤트 병합, .txt 우선)
+file_intake = FileIntake(post_scheduler.submit)
+
+metrics.callback("ingest_intake_files", "Watched-folder intake state (pending = waiting for writes to settle, ready = queued by priority)",
+                 lambda: {(("state", k),): v for k, v in file_intake.stats().items() if k in ("pending", "ready", "in_flight")})
+metrics.callback("ingest_intake_events_total", "Watched-folder events by how they were handled",
+                 lambda: {(("result", k),): v for k, v in file_intake.stats().items() if k not in ("pending", "ready", "in_flight")},
+                 metric_type="counter")
+metrics.callback("ingest_active_posts", "Instagram posts with slides still in the pipeline", post_scheduler.active_posts)
+metrics.callback("ocr_files_total", "Images by OCR outcome",
+                 lambda: {(("outcome", k),): v for k, v in ocr_engine.stats().items() if k in ("ocr_runs", "skipped_no_text", "cache_hits", "downscaled")},
+                 metric_type="counter")
+metrics.callback("ocr_seconds_saved_total", "OCR time avoided by the text detector and OCR cache, from the measured OCR average",
+                 lambda: ocr_engine.stats()["seconds_saved"], metric_type="counter")
+metrics.callback("ocr_seconds_saved_estimated_total", "OCR skips before any OCR was timed, valued at the default estimate",
+                 lambda: ocr_engine.stats()["estimated_seconds_saved"], metric_type="counter")
+
+def warm_models():
+    """분류 모델과 비전 단계 모델을 백그라운드에서 미리 올려 두고 keep_alive를 설정합니다."""
+    return warm_up_async([(CLASSIFY_MODEL, classify_system())] + vision_cascade.warm_up_targets())
 
 def extract_pdf_text(filepath: str) -> str:
     text = ""
     try:
-        doc = fitz.open(filepath)
-        for page in doc:
-            text += page.get_text()
+        text = "\n".join(extract_pdf_pages(filepath))
         logger.info(f"PDF 텍스트 추출 완료: {filepath}")
     except Exception as e:
         logger.error(f"PDF 텍스트 추출 중 오류 발생 {filepath}: {e}")
@@ -270,141 +390,166 @@ def classify_content_text(text: str, max_retries: int = 2) -> list[str]:
     if not text or len(text.strip()) < 30:
         return []
 
-    for attempt in range(max_retries):
-        try:
-            url = "http://localhost:11434/api/generate"
-            payload = {
-                "model": "llava:7b",
-                "prompt": f"You are an architectural assistant. Read this text and categorize it into maximum 4 comma separated tags choosing ONLY from this list: [{', '.join(VALID_CATEGORIES)}]. Only output the tags, nothing else.\nText: {text}",
-                "stream": False
-            }
-            response = requests.post(url, json=payload, timeout=90)
-            response.raise_for_status()
-
-            result = response.json().get("response", "").strip()
-
-            if "NONE" in result.upper() or not result:
-                return []
-
-            tags = [tag.strip() for tag in result.split(',') if tag.strip() in VALID_CATEGORIES]
-            logger.info(f"Architectural text classified into taxonomy: {tags}")
-            return tags
-        except Exception as e:
-            logger.warning(f"Architectural text classification failed (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                return []
+    # 같은 본문(재스캔, 리포스트, fix_instagram_folders)은 LLM 호출 없이 캐시 조회로 끝냄
+    cache_key = text_cache_key(text)
+    cached = classification_cache.get(cache_key, CLASSIFY_CACHE_VERSION)
+    if cached is not None:
+        logger.info(f"Text classification cache hit: {cached}")
+        return cached
+
+    # 로컬 분류기가 충분히 확신하는 경우 LLM 호출 생략
+    local_tags = classify_locally(text)
+    if local_tags is not None:
+        return local_tags
+    record_outcome(local=False)
+
+    # 고정 지시문은 system으로 분리 (Ollama prefix 캐시 재사용), 본문은 토큰 예산에 맞춰 정리
+    prompt = classify_prompt(text)
+    try:
+        with STEP_SECONDS.time(step="classify"):
+            result = ollama.generate(CLASSIFY_MODEL, prompt.prompt, timeout=90, retries=max_retries, call_site="file_manager.classify_text", **prompt.options()).get("response", "").strip()
+    except Exception as e:
+        STEP_ERRORS.inc(step="classify")
+        logger.warning(f"Architectural text classification failed: {e}")
+        return []
 
-def extract_image_ocr(filepath: str) -> str:
+    if "NONE" in result.upper() or not result:
+        tags = []
+    else:
+        tags = [tag.strip() for tag in result.split(',') if tag.strip() in VALID_CATEGORIES]
+        logger.info(f"Architectural text classified into taxonomy: {tags}")
+    classification_cache.put(cache_key, CLASSIFY_CACHE_VERSION, tags)
+    return tags
+
+def _saved_note(saved) -> str:
+    return f"saved ~{saved:.1f}s" if saved is not None else "no OCR timed yet"
+
+def extract_image_ocr(filepath: str, image_ctx: ImageContext = None, content_hash: str = None) -> str:
+    started = time.monotonic()
     try:
-        image = Image.open(filepath)
+        if content_hash is None:
+            content_hash = file_content_hash(filepath)
+        cached = ocr_cache.get(content_hash, OCR_CACHE_VERSION)
+        if cached is not None:
+            saved = ocr_engine.record_saved("cache_hits", time.monotonic() - started)
+            logger.info(f"OCR cache hit ({_saved_note(saved)}): {os.path.basename(filepath)}")
+            return cached
+
+        if image_ctx is None:
+            image_ctx = ImageContext(filepath)
         
         # 전략 3: 도면 및 텍스트 레이아웃 특화 전처리 (고대비 및 흑백 변환)
-        image = image.convert('L') # Grayscale 변환
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(2.0) # 대비(Contrast) 200% 증가로 선명도 극대화
+        image = image_ctx.ocr_image()
+
+        # 글자가 없는 실내 사진 등은 Tesseract를 띄우지 않음
+        has_text, text_lines = detect_text(image)
+        if not has_text:
+            saved = ocr_engine.record_saved("skipped_no_text", time.monotonic() - started)
+            logger.info(f"OCR skipped, no text regions detected ({_saved_note(saved)}): {os.path.basename(filepath)}")
+            ocr_cache.put(content_hash, OCR_CACHE_VERSION, "")
+            return ""
         
-        text = pytesseract.image_to_string(image, lang='kor+eng')
-        logger.info(f"이미지 OCR 추출 완료 (High Contrast 프리필터 적용): {filepath}")
-        return text.strip()
+        with STEP_SECONDS.time(step="ocr"):
+            text = ocr_engine.recognize(image)
+        ocr_cache.put(content_hash, OCR_CACHE_VERSION, text)
+        logger.info(f"이미지 OCR 추출 완료 (High Contrast 프리필터 적용, {text_lines} text lines, {time.monotonic() - started:.1f}s): {filepath}")
+        return text
     except Exception as e:
+        STEP_ERRORS.inc(step="ocr")
         logger.error(f"이미지 OCR 처리 중 오류 발생 {filepath}: {e}")
         return ""
 
-def extract_image_semantics(filepath: str, ocr_text: str = "", post_text: str = "", max_retries: int = 2) -> tuple[str, list[str]]:
-    for attempt in range(max_retries):
-        try:
-            with Image.open(filepath) as img:
-                img.thumbnail((768, 768))
-                buffered = io.BytesIO()
-                if img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-                img.save(buffered, format="JPEG", quality=85)
-                encoded_string = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            
-            prompt = (
-                "### FORCE VISION PROTOCOL ###\n"
-                "You are an expert architectural vision-language AI. Your visual sensors ARE ACTIVE. "
-                "The image is PROVIDED in your CURRENT visual buffer. DO NOT claim you cannot see it. "
-                "DIRECTLY ANALYZE the image based on the following context and criteria.\n\n"
-                f"[Contextual Data]\nOCR Text: {ocr_text[:300]}\nInstagram Post Text: {post_text[:300]}\n\n"
-                "[Analysis Criteria]\n"
-                "1. Spatial DNA (Interior/Exterior/Plan, Commercial/Residential etc)\n"
-                "2. Object Spec (Furniture, Lighting, Built-in etc)\n"
-                "3. Materiality (Wood, Concrete, Metal, Texture)\n"
-                "4. Representation (Photo, Render, Model)\n\n"
-                f"Strictly select 1 to 5 TAGS from this list: [{', '.join(VALID_CATEGORIES)}]\n\n"
-                "OUTPUT FORMAT:\n"
-                "DESCRIPTION: [3-4 sentences of deep visual architecture analysis]\n"
-                "TAGS: [tag1, tag2, tag3]"
-            )
-            
-            url = "http://localhost:11434/api/generate"
-            payload = {
-                "model": "llava:7b",
-                "prompt": prompt,
-                "images": [encoded_string],
-                "stream": False
-            }
-            response = requests.post(url, json=payload, timeout=90)
-            response.raise_for_status()
-            result_text = response.json().get("response", "").strip()
-
-            description = "No description generated."
-            tags = []
-            if "TAGS:" in result_text.upper():
-                parts = re.split(r'TAGS:', result_text, flags=re.IGNORECASE)
-                description = parts[0].replace("DESCRIPTION:", "").strip()
-                tag_str = parts[1].strip()
-                tags = [t.strip() for t in tag_str.split(',') if t.strip() in VALID_CATEGORIES]
-            else:
-                description = result_text.replace("DESCRIPTION:", "").strip()
-                tags = [c for c in VALID_CATEGORIES if c in result_text]
-                
-            if not tags:
-                tags = ["미분류"]
-                
-            logger.info(f"Fast single-pass Vision processing complete ({tags}): {os.path.basename(filepath)}.")
-            import time
-            time.sleep(0.5)
-            return (f"Spatial DNA & Materiality:\n{description}", tags[:5])
-        except Exception as e:
-            logger.warning(f"Ollama vision analysis failed (attempt {attempt + 1}/{max_retries}) {filepath}: {e}")
-            import time
-            time.sleep(2)
-            if attempt == max_retries - 1:
-                return ("", [])
+def extract_image_semantics(filepath: str, ocr_text: str = "", post_text: str = "", max_retries: int = 2, image_ctx: ImageContext = None, content_hash: str = None) -> tuple[str, list[str]]:
+    # 같은 픽셀(파일 내용)은 이동/이름 변경/재스캔과 무관하게 캐시된 분석 결과를 재사용
+    try:
+        if content_hash is None:
+            content_hash = file_content_hash(filepath)
+        cached = vision_cache.get(content_hash, VISION_CACHE_VERSION)
+    except Exception as e:
+        logger.warning(f"Vision cache lookup failed {filepath}: {e}")
+        cached = None
+    if cached:
+        logger.info(f"Vision cache hit ({cached['tags']}): {os.path.basename(filepath)}")
+        return (cached["description"], cached["tags"])
 
-class VisionFileHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if event.is_directory:
-            return
+    # 저렴한 단계부터 시도하고 불확실한 결과만 LLaVA로 상향 (텍스트 단계가 채택되면 이미지 인코딩도 생략)
+    try:
+        if image_ctx is None:
+            image_ctx = ImageContext(filepath)
+        with STEP_SECONDS.time(step="vision"):
+            description, tags, tier = vision_cascade.analyze(image_ctx.vision_jpeg_b64, ocr_text, post_text, retries=max_retries)
+    except Exception as e:
+        STEP_ERRORS.inc(step="vision")
+        logger.warning(f"Ollama vision analysis failed {filepath}: {e}")
+        return ("", [])
+    if tier is None:
+        return ("", [])
+    if not description:
+        description = "No description generated."
+        
+    if not tags:
+        tags = ["미분류"]
         
-        filepath = event.src_path
+    logger.info(f"Vision processing complete via {tier} ({tags}): {os.path.basename(filepath)}.")
+    description, tags = f"Spatial DNA & Materiality:\n{description}", tags[:5]
+    if content_hash and tags != ["미분류"]:
+        vision_cache.put(content_hash, VISION_CACHE_VERSION, {"description": description, "tags": tags})
+    return (description, tags)
+
+class VisionFileHandler(FileSystemEventHandler):
+    """이벤트를 바로 처리하지 않고 file_intake에 넘겨, 쓰기가 끝난 파일만 우선순위 순서로 투입합니다."""
+
+    def __init__(self, intake: FileIntake):
+        super().__init__()
+        self.intake = intake
+
+    def _accepts(self, filepath: str) -> bool:
         filename = os.path.basename(filepath)
         
         # Skip temporary or hidden files
         if filename.startswith('.') or filename.startswith('~'):
-            return
+            return False
+        if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            return False
 
         # Check if the file is inside our watched root
         root_dir = os.path.abspath("./watched_files")
-        abs_filepath = os.path.abspath(filepath)
-        
-        if abs_filepath.startswith(root_dir):
-            logger.info(f"File creation detected inside watched root. Enqueuing: {filepath}")
-            file_queue.put(filepath)
+        return os.path.abspath(filepath).startswith(root_dir)
+
+    def on_created(self, event):
+        if not event.is_directory and self._accepts(event.src_path):
+            self.intake.notify(event.src_path)
+
+    def on_modified(self, event):
+        # 스크래퍼가 아직 쓰는 중인 파일 -> 안정화 대기 시간을 갱신
+        if not event.is_directory and self._accepts(event.src_path):
+            self.intake.notify(event.src_path)
+
+    def on_moved(self, event):
+        # 임시 파일로 쓴 뒤 이름을 바꾸는 스크래퍼, 폴더 간 이동 처리
+        # (파이프라인이 태그 폴더로 옮긴 파일은 store_file이 이동 전에 file_intake.ignore로 등록해 다시 투입되지 않음)
+        if event.is_directory:
+            return
+        self.intake.discard(event.src_path)
+        if self._accepts(event.dest_path):
+            self.intake.notify(event.dest_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.intake.discard(event.src_path)
 
 class DirectoryMonitor:
     def __init__(self, watch_dir: str):
         self.watch_dir = watch_dir
         self.observer = Observer()
-        self.handler = VisionFileHandler()
+        self.handler = VisionFileHandler(file_intake)
         
     def start(self):
         if not os.path.exists(self.watch_dir):
             os.makedirs(self.watch_dir)
             logger.info(f"모니터링 디렉토리 생성됨: {self.watch_dir}")
             
+        file_intake.start()
         self.observer.schedule(self.handler, self.watch_dir, recursive=True)
         self.observer.start()
         logger.info(f"백그라운드 파일 모니터링이 시작되었습니다: {self.watch_dir}")
@@ -412,22 +557,41 @@ class DirectoryMonitor:
     def stop(self):
         self.observer.stop()
         self.observer.join()
+        file_intake.stop()
+        # DB flush가 매니페스트/장부 완료 기록을 남기므로 캐시 저장소보다 먼저
+        db.flush()
+        store.flush()
         logger.info("파일 모니터링이 중지되었습니다.")
 
 def scan_directory_once(watch_dir: str) -> dict:
-    results = {"pdfs": 0, "images": 0, "texts": 0}
+    results = {"pdfs": 0, "images": 0, "texts": 0, "new": 0, "changed": 0, "skipped": 0}
     if not os.path.exists(watch_dir):
         return results
         
     all_files = []
     for root, _, files in os.walk(watch_dir):
         for filename in files:
-            all_files.append(os.path.join(root, filename))
+            filepath = os.path.join(root, filename)
+            if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            # 매니페스트에 기록된 크기/mtime과 같으면 stat 한 번으로 건너뜀
+            status = manifest.check(filepath)
+            if status == NEW:
+                results["new"] += 1
+            elif status == CHANGED:
+                results["changed"] += 1
+            else:
+                results["skipped"] += 1
+                continue
+            all_files.append(filepath)
             
-    all_files.sort(key=lambda x: 0 if x.endswith('.txt') else 1)
-    
-    for filepath in all_files:
-        success = process_and_store_file(filepath)
+    # 게시물별로 본문(.txt)을 먼저, 그다음 대표 슬라이드, 나머지 슬라이드 순으로 투입
+    for filepath, future in post_scheduler.submit_many(all_files):
+        try:
+            success = future.result()
+        except Exception as e:
+            logger.error(f"Scan execution fault {filepath}: {e}")
+            success = False
         if success:
             ext = os.path.splitext(filepath)[1].lower()
             if ext == ".pdf":
@@ -436,5 +600,10 @@ def scan_directory_once(watch_dir: str) -> dict:
                 results["images"] += 1
             elif ext == ".txt":
                 results["texts"] += 1
-                
+    
+    store.flush()
+    db.flush()
+    logger.info(f"Scan report {watch_dir}: new={results['new']}, changed={results['changed']}, skipped={results['skipped']}")
+    logger.info(f"OCR report: {ocr_engine.stats()}")
+    logger.info(f"Vision cascade report: {vision_cascade.stats()}")
     return results
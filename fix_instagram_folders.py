@@ -2,9 +2,11 @@ import os
 import glob
 import shutil
 import re
-import requests
-import time
 import logging
+from ollama_client import ollama
+from analysis_cache import classification_cache, text_cache_key
+from taxonomy import clean_spam_text, taxonomy_version
+from prompt_builder import classify_prompt
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger("fixer")
@@ -12,23 +14,26 @@ logger = logging.getLogger("fixer")
 TARGET_DIR = "./watched_files/instagram"
 CATEGORIES = "건축, 공간디자인, 실내건축, 주거공간, 상업공간, 공공건축, 전시공간, 파사드, 도면, 평면도, 투시도, 조감도, 건축모형, 모형, 건축가, 가구, 의자, 소파, 테이블, 책상, 수납장, 선반, 조명, 침대, 소품, 오브제, 하드웨어, 부속품, 목공, 금속공예, 가구제작, 디자인, 시각디자인, 영상디자인, 제품디자인, 타이포그래피, 브랜딩, 로고, UX, UI, 패키지디자인, 패션, 드로잉, 사진, 포토그래피, 인물사진, 스튜디오, 영화, 영상, 음악, 전시, 미술품, 표현, 책, 매거진, 인터뷰, 에세이, 리뷰, 비평, 논설, 칼럼, 기획, 전략, 사업공고, 조언, 작업, 그리드, 색감, 다이어그램, 질감, 텍스처, 타이포배치, 미니멀리즘, 음식, 플레이팅, ai, 미분류, 복합"
 VALID_CATEGORIES = [c.strip() for c in CATEGORIES.split(',')]
+CLASSIFY_MODEL = "gpt-oss:20b"
+CLASSIFY_CACHE_VERSION = f"{CLASSIFY_MODEL}:{taxonomy_version(VALID_CATEGORIES)}:v2"
 
 def classify_text(text: str) -> list:
     if not text or len(text.strip()) < 10:
         return ["미분류"]
         
+    text = clean_spam_text(text)
+    cache_key = text_cache_key(text)
+    cached = classification_cache.get(cache_key, CLASSIFY_CACHE_VERSION)
+    if cached is not None:
+        return cached
+        
     try:
-        url = "http://localhost:11434/api/generate"
-        payload = {
-            "model": "gpt-oss:20b",
-            "prompt": f"You are an architectural assistant. Read this text and categorize it into maximum 4 comma separated tags choosing ONLY from this list: [{CATEGORIES}]. Only output the tags, nothing else.\nText: {text}",
-            "stream": False
-        }
-        res = requests.post(url, json=payload, timeout=60)
-        res.raise_for_status()
-        result = res.json().get("response", "").strip()
+        prompt = classify_prompt(text, VALID_CATEGORIES)
+        result = ollama.generate(CLASSIFY_MODEL, prompt.prompt, timeout=60, call_site="fix_instagram_folders.classify_text", **prompt.options()).get("response", "").strip()
         tags = [tag.strip() for tag in result.split(',') if tag.strip() in VALID_CATEGORIES]
-        return tags if tags else ["미분류"]
+        tags = tags if tags else ["미분류"]
+        classification_cache.put(cache_key, CLASSIFY_CACHE_VERSION, tags)
+        return tags
     except Exception as e:
         logger.error(f"Classification failed: {e}")
         return ["미분류"]
@@ -0,0 +1,167 @@
+import sys
+import time
+import json
+import argparse
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mcp_vision_server.graph_builder")
+
+# 한 번에 계산하는 유사도 블록의 행 수. 메모리는 대략 BLOCK_ROWS x 문서 수 x 4바이트 (50k 문서면 약 100MB)
+BLOCK_ROWS = 512
+# Chroma에서 임베딩을 가져올 때의 배치 크기
+LOAD_BATCH = 2048
+
+
+def load_embeddings(collection, ids: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+    """저장된 임베딩을 (ids, 정규화된 float32 행렬)로 가져옵니다. ids가 없으면 컬렉션 전체."""
+    if ids is None:
+        ids = collection.get(include=[])["ids"]
+    loaded_ids: List[str] = []
+    rows = []
+    for start in range(0, len(ids), LOAD_BATCH):
+        got = collection.get(ids=ids[start:start + LOAD_BATCH], include=["embeddings"])
+        loaded_ids.extend(got["ids"])
+        if len(got["ids"]):
+            rows.append(np.asarray(got["embeddings"], dtype=np.float32))
+    if not rows:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return loaded_ids, normalize(np.vstack(rows))
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def topk_cosine(queries: np.ndarray, corpus: np.ndarray, k: int, self_index: Optional[np.ndarray] = None,
+                block_rows: int = BLOCK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    정규화된 queries x corpus의 행별 top-k (코퍼스 인덱스, 코사인 유사도)를 유사도 내림차순으로 반환합니다.
+    block_rows 행씩 계산하므로 전체 유사도 행렬을 만들지 않습니다.
+    self_index[i]가 주어지면 queries[i]의 코퍼스 내 위치로 보고 결과에서 제외합니다.
+    """
+    n, m = len(queries), len(corpus)
+    k = min(k, m - (1 if self_index is not None else 0))
+    if n == 0 or k <= 0:
+        return np.zeros((n, 0), dtype=np.int64), np.zeros((n, 0), dtype=np.float32)
+    indices = np.empty((n, k), dtype=np.int64)
+    sims = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, block_rows):
+        block = queries[start:start + block_rows] @ corpus.T
+        rows = np.arange(len(block))
+        if self_index is not None:
+            block[rows, self_index[start:start + block_rows]] = -np.inf
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_sims = block[rows[:, None], top]
+        order = np.argsort(-top_sims, axis=1)
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        sims[start:start + len(block)] = np.take_along_axis(top_sims, order, axis=1)
+    return indices, sims
+
+
+def all_pairs_topk(matrix: np.ndarray, k: int, block_rows: int = BLOCK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """행렬 안의 모든 행에 대해 자기 자신을 뺀 top-k."""
+    return topk_cosine(matrix, matrix, k, np.arange(len(matrix)), block_rows)
+
+
+def undirected_pairs(indices: np.ndarray, sims: np.ndarray, min_similarity: float) -> Tuple[np.ndarray, np.ndarray]:
+    """all_pairs_topk 결과를 (i < j) 쌍으로 합쳐 중복 없는 간선 배열 ([E, 2], [E])로 만듭니다."""
+    n, k = indices.shape
+    src = np.repeat(np.arange(n), k)
+    dst = indices.ravel()
+    weight = sims.ravel()
+    keep = weight > min_similarity
+    src, dst, weight = src[keep], dst[keep], weight[keep]
+    pairs = np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1)
+    pairs, first = np.unique(pairs, axis=0, return_index=True)
+    return pairs, weight[first]
+
+
+def similarity_edges(ids: List[str], neighbours: Dict[str, List[Tuple[str, float]]],
+                     distance_threshold: float) -> List[Dict]:
+    """
+    {id: [(이웃 id, 유사도), ...]}를 그래프 간선 목록으로 만듭니다. 양방향으로 나오는 간선은 한 번만 넣습니다.
+    generate_graph_html, query_graph가 같이 사용합니다.
+    """
+    edges = []
+    seen = set()
+    for query_id in ids:
+        for target_id, similarity in neighbours.get(query_id, []):
+            if 1.0 - similarity >= distance_threshold:
+                continue
+            pair = (query_id, target_id) if query_id < target_id else (target_id, query_id)
+            if pair in seen:
+                continue
+            seen.add(pair)
+            edges.append({"source": pair[0], "target": pair[1], "value": round(similarity, 3)})
+    return edges
+
+
+def _bench_list_dedupe(ids: List[str], indices: np.ndarray, sims: np.ndarray, distance_threshold: float) -> List[Dict]:
+    """기존 그래프 빌더의 간선 중복 제거 방식 (리스트 선형 탐색), 비교용."""
+    edges = []
+    for i, query_id in enumerate(ids):
+        for j, similarity in zip(indices[i], sims[i]):
+            target_id = ids[j]
+            if 1.0 - similarity < distance_threshold:
+                src, dst = (query_id, target_id) if query_id < target_id else (target_id, query_id)
+                edge = {"source": src, "target": dst, "value": round(float(similarity), 3)}
+                if edge not in edges:
+                    edges.append(edge)
+    return edges
+
+
+def benchmark(sizes: List[int], dim: int = 384, k: int = 10, distance_threshold: float = 0.5,
+              list_dedupe_limit: int = 1000, seed: int = 0) -> List[Dict]:
+    """무작위 군집 임베딩으로 top-k 계산과 간선 중복 제거 시간을 잽니다 (dim=384는 기본 임베딩 모델 크기)."""
+    rng = np.random.default_rng(seed)
+    report = []
+    for n in sizes:
+        centres = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+        matrix = centres[rng.integers(0, len(centres), n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+        matrix = normalize(matrix)
+        ids = [f"doc-{i:06d}" for i in range(n)]
+
+        started = time.perf_counter()
+        indices, sims = all_pairs_topk(matrix, k)
+        topk_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pairs, _ = undirected_pairs(indices, sims, 1.0 - distance_threshold)
+        array_seconds = time.perf_counter() - started
+
+        neighbours = {ids[i]: [(ids[j], float(s)) for j, s in zip(indices[i], sims[i])] for i in range(n)}
+        started = time.perf_counter()
+        edges = similarity_edges(ids, neighbours, distance_threshold)
+        set_seconds = time.perf_counter() - started
+
+        row = {
+            "nodes": n, "k": k, "edges": len(edges),
+            "topk_seconds": round(topk_seconds, 3),
+            "dedupe_array_seconds": round(array_seconds, 4),
+            "dedupe_set_seconds": round(set_seconds, 4),
+            "dedupe_list_seconds": None
+        }
+        assert len(pairs) == len(edges)
+        if n <= list_dedupe_limit:
+            started = time.perf_counter()
+            _bench_list_dedupe(ids, indices, sims, distance_threshold)
+            row["dedupe_list_seconds"] = round(time.perf_counter() - started, 3)
+        report.append(row)
+        logger.info(f"graph benchmark: {row}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blockwise cosine top-k graph builder benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--list-dedupe-limit", type=int, default=1000,
+                        help="largest size at which the old list-based edge dedupe is also timed")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', stream=sys.stderr)
+    print(json.dumps(benchmark(args.sizes, args.dim, args.k, list_dedupe_limit=args.list_dedupe_limit), indent=2))
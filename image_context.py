@@ -0,0 +1,65 @@
+import io
+import base64
+import logging
+import threading
+import imagehash
+from PIL import Image, ImageEnhance
+
+logger = logging.getLogger("mcp_vision_server.image_context")
+
+# 이 크기보다 큰 JPEG는 DCT 단계에서 축소 디코딩 (OCR 판독에 충분한 해상도)
+MAX_DECODE_SIDE = 2048
+# Ollama 비전 모델에 보내는 썸네일 크기
+VISION_SIDE = 768
+
+
+class ImageContext:
+    """
+    이미지를 한 번만 디코딩하고 phash, OCR용 흑백/고대비 변환, 비전 모델용 JPEG 썸네일 등
+    파생 이미지를 처음 요청될 때 한 번만 계산해 모든 스테이지에서 공유합니다.
+    """
+
+    def __init__(self, filepath: str, max_side: int = MAX_DECODE_SIDE):
+        self.filepath = filepath
+        img = Image.open(filepath)
+        # 원본 크기 (메타데이터용) - draft 축소 디코딩 이전 값
+        self.width, self.height = img.size
+        if img.format == "JPEG":
+            img.draft("RGB", (max_side, max_side))
+        img.load()
+        self.image = img
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, build):
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build()
+            return self._derived[name]
+
+    def phash(self) -> str:
+        return self._get("phash", lambda: str(imagehash.phash(self.image)))
+
+    def ocr_image(self) -> Image.Image:
+        """전략 3: 도면 및 텍스트 레이아웃 특화 전처리 (흑백 변환 + 대비 200%)."""
+        def build():
+            gray = self.image.convert('L')
+            return ImageEnhance.Contrast(gray).enhance(2.0)
+        return self._get("ocr", build)
+
+    def vision_jpeg_b64(self) -> str:
+        """비전 모델 입력용 768px JPEG(base64)."""
+        def build():
+            img = self.image.copy()
+            img.thumbnail((VISION_SIDE, VISION_SIDE))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            buffered = io.BytesIO()
+            img.save(buffered, format="JPEG", quality=85)
+            return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return self._get("vision_jpeg", build)
+
+    def close(self):
+        with self._lock:
+            self._derived.clear()
+        self.image.close()
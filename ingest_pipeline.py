@@ -0,0 +1,166 @@
+import time
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from metrics import metrics
+
+logger = logging.getLogger("mcp_vision_server.ingest_pipeline")
+
+# 각 스테이지 사이의 큐 크기 기본값 (가득 차면 앞 스테이지가 대기 -> Backpressure)
+DEFAULT_QUEUE_SIZE = 32
+
+_STOP = object()
+
+STAGE_SECONDS = metrics.histogram("ingest_stage_seconds", "Time spent in each pipeline stage function")
+STAGE_JOBS = metrics.counter("ingest_stage_jobs_total", "Jobs finished by each pipeline stage, by outcome (ok, dropped, error)")
+
+
+class Stage:
+    """파이프라인의 한 단계. fn(job)은 다음 단계로 넘길 job을 반환하고, None을 반환하면 해당 job은 종료됩니다."""
+
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.threads: List[threading.Thread] = []
+
+
+class StagedPipeline:
+    """
+    Bounded queue로 연결된 다단계 처리 파이프라인.
+    submit()은 첫 스테이지 큐가 가득 차면 블로킹되고, 각 job의 최종 결과는 Future로 돌려받습니다.
+    마지막 스테이지의 반환값이 Future의 결과가 되며, 중간 스테이지가 None을 반환하면 결과는 False입니다.
+    on_abort(job, error)는 스테이지가 예외를 던지거나 None을 반환해 job이 중단될 때 해당 스테이지의 입력으로 호출됩니다.
+    """
+
+    def __init__(self, stages: List[Stage], name: str = "pipeline", on_abort: Optional[Callable] = None):
+        if not stages:
+            raise ValueError("StagedPipeline requires at least one stage")
+        self.name = name
+        self.stages = stages
+        self.on_abort = on_abort
+        self._started = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        metrics.callback("ingest_queue_depth", "Jobs waiting in front of each pipeline stage",
+                         lambda: {(("pipeline", self.name), ("stage", n)): d for n, d in self.depths().items()})
+        metrics.callback("ingest_in_flight", "Jobs submitted to the pipeline and not yet finished",
+                         lambda: {(("pipeline", self.name),): self.in_flight()})
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._run_stage,
+                    args=(index,),
+                    name=f"{self.name}-{stage.name}-{n}",
+                    daemon=True
+                )
+                t.start()
+                stage.threads.append(t)
+        logger.info(
+            f"Ingestion pipeline started: "
+            + ", ".join(f"{s.name}x{s.workers}(q={s.queue.maxsize})" for s in self.stages)
+        )
+
+    def submit(self, item, timeout: Optional[float] = None) -> Future:
+        """job을 첫 스테이지에 넣습니다. 큐가 가득 차 있으면 자리가 날 때까지 대기합니다."""
+        if not self._started:
+            self.start()
+        future = Future()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            self.stages[0].queue.put((item, future), timeout=timeout)
+        except queue.Full:
+            self._finish()
+            raise
+        return future
+
+    def _finish(self):
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def _run_stage(self, index: int):
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        while True:
+            entry = stage.queue.get()
+            if entry is _STOP:
+                stage.queue.task_done()
+                break
+            job, future = entry
+            started = time.monotonic()
+            try:
+                result = stage.fn(job)
+            except Exception as e:
+                logger.error(f"Pipeline stage '{stage.name}' fault: {e}")
+                STAGE_JOBS.inc(stage=stage.name, outcome="error")
+                self._abort(job, e)
+                future.set_exception(e)
+                self._finish()
+            else:
+                STAGE_JOBS.inc(stage=stage.name, outcome="dropped" if result is None else "ok")
+                if is_last:
+                    future.set_result(result)
+                    self._finish()
+                elif result is None:
+                    self._abort(job, None)
+                    future.set_result(False)
+                    self._finish()
+                else:
+                    # 다음 스테이지 큐가 가득 차면 여기서 대기 (Backpressure 전파)
+                    self.stages[index + 1].queue.put((result, future))
+            finally:
+                STAGE_SECONDS.observe(time.monotonic() - started, stage=stage.name)
+                stage.queue.task_done()
+
+    def _abort(self, job, error: Optional[Exception]):
+        if self.on_abort is None:
+            return
+        try:
+            self.on_abort(job, error)
+        except Exception as e:
+            logger.error(f"Pipeline abort handler fault: {e}")
+
+    def depths(self) -> dict:
+        """스테이지별 현재 대기 중인 job 수."""
+        return {s.name: s.queue.qsize() for s in self.stages}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """제출된 모든 job이 끝날 때까지 대기합니다."""
+        with self._lock:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        """남은 job을 모두 처리한 뒤 워커 스레드를 종료합니다."""
+        if not self._started:
+            return
+        if wait:
+            self.wait_idle()
+        for stage in self.stages:
+            for _ in stage.threads:
+                stage.queue.put(_STOP)
+        if wait:
+            for stage in self.stages:
+                for t in stage.threads:
+                    t.join()
+        with self._lock:
+            self._started = False
+        for stage in self.stages:
+            stage.threads.clear()
+        logger.info("Ingestion pipeline stopped.")
@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import hashlib
+import argparse
+import tempfile
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from cache_store import CacheStore
+
+logger = logging.getLogger("mcp_vision_server.lexical_index")
+
+# 컬렉션 문서를 다시 읽어 색인을 재구성할 때의 배치 크기
+REBUILD_BATCH = 2000
+# 태그 열과 본문(OCR, 게시물 본문, 비전 묘사) 열의 BM25 가중치
+TAG_WEIGHT = 2.0
+BODY_WEIGHT = 1.0
+# 질의 토큰 상한 (긴 문장 질의에서 OR 항이 너무 많아지지 않도록)
+MAX_QUERY_TOKENS = 64
+# reciprocal rank fusion 상수 (score = sum 1 / (RRF_K + rank))
+RRF_K = 60
+# 색인 구조/토큰화 규칙 버전. 저장된 값과 다르면 쓰기 프로세스가 시작할 때(ensure_indexes) 한 번 다시 만듦
+INDEX_VERSION = 1
+VERSION_KEY = "index_version:lexical_index"
+# 벤치마크의 hash 임베딩 차원 (모델 없이 재현 가능한 비교용)
+HASH_EMBEDDING_DIM = 32
+BENCH_EMBEDDINGS = ("default", "hash")
+
+_HANGUL_CJK = r"\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_RUN_RE = re.compile(rf"[{_HANGUL_CJK}]+|[^\W{_HANGUL_CJK}_]+")
+_CJK_RE = re.compile(rf"[{_HANGUL_CJK}]")
+
+
+def ngrams(text: str) -> List[str]:
+    """
+    BM25용 문자 n-gram 토큰. 한글/한자/가나는 띄어쓰기와 조사에 상관없이 맞도록 2-gram (1글자면 그대로),
+    라틴 문자/숫자 단어는 정확히 일치하도록 단어 전체와, OCR 오탈자에도 맞도록 3-gram을 함께 씁니다.
+    """
+    tokens = []
+    for run in _RUN_RE.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if _CJK_RE.match(run):
+            tokens.extend([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+        else:
+            tokens.append(run)
+            if len(run) > 3:
+                tokens.extend(run[i:i + 3] for i in range(len(run) - 2))
+    return tokens
+
+
+def _fts_text(text: str) -> str:
+    return " ".join(ngrams(text))
+
+
+def _fts_query(query: str) -> Optional[str]:
+    tokens = list(dict.fromkeys(ngrams(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in tokens)
+
+
+def rrf(rankings: Iterable[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """여러 순위 목록을 reciprocal rank fusion으로 합칩니다. (id, 점수) 내림차순."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    레퍼런스 문서(태그 + OCR/게시물 본문/비전 묘사)의 문자 n-gram을 SQLite FTS5에 넣어 BM25로 검색합니다.
+    한국어 태그, 제품명/건축가명 같은 정확한 OCR 문자열을 임베딩 없이 찾는 용도이며,
+    VectorDBManager가 upsert, update_tags, 삭제 시 함께 갱신합니다.
+    """
+
+    def __init__(self, collection, index_store: CacheStore):
+        self.collection = collection
+        self.store = index_store
+        # 여기서는 다시 만들지 않음 (대시보드 요청마다 새 프로세스로 열리므로). ensure_indexes()/rebuild()에서만
+        with self.store.transaction() as conn:
+            self._create(conn)
+            # 새로 만든 빈 색인은 그대로 현재 버전
+            if self.store.get("_meta", VERSION_KEY) is None and self.collection.count() == 0:
+                self.store.put("_meta", VERSION_KEY, INDEX_VERSION)
+
+    @staticmethod
+    def _create(conn):
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS lexical USING fts5("
+            "id UNINDEXED, type UNINDEXED, tags, body, tokenize='unicode61 remove_diacritics 0')"
+        )
+        # FTS5의 UNINDEXED 열로 찾으면 전체를 훑으므로 id -> FTS rowid 표로 찾아서 rowid로 교체/삭제
+        conn.execute("CREATE TABLE IF NOT EXISTS lexical_ids (id TEXT PRIMARY KEY, doc INTEGER NOT NULL) WITHOUT ROWID")
+
+    def is_current(self) -> bool:
+        """현재 INDEX_VERSION으로 만들어진 색인인지."""
+        return self.store.get("_meta", VERSION_KEY) == INDEX_VERSION
+
+    def count(self) -> int:
+        with self.store.transaction(commit=False) as conn:
+            return conn.execute("SELECT COUNT(*) FROM lexical_ids").fetchone()[0]
+
+    @staticmethod
+    def _body(document: str) -> str:
+        # 문서 앞의 "Tags: ..." 헤더는 tags 열에 따로 들어가므로 본문에서 뺌
+        return document.split("\nContent: ", 1)[-1] if document.startswith("Tags: ") else document
+
+    def _write(self, conn, items: Iterable[Tuple[str, str, Dict]]):
+        for doc_id, document, metadata in items:
+            metadata = metadata or {}
+            row = conn.execute("SELECT doc FROM lexical_ids WHERE id=?", (doc_id,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM lexical WHERE rowid=?", (row[0],))
+            cur = conn.execute("INSERT INTO lexical (rowid, id, type, tags, body) VALUES (?, ?, ?, ?, ?)",
+                               (row[0] if row else None, doc_id, metadata.get("type"),
+                                _fts_text(metadata.get("tags", "")), _fts_text(self._body(document or ""))))
+            if row is None:
+                conn.execute("INSERT INTO lexical_ids (id, doc) VALUES (?, ?)", (doc_id, cur.lastrowid))
+
+    def add(self, items: List[Tuple[str, str, Dict]]):
+        """(id, 문서, 메타데이터) 목록을 색인합니다. 이미 있는 id는 교체합니다."""
+        with self.store.transaction() as conn:
+            self._write(conn, items)
+
+    def delete(self, ids: List[str]):
+        with self.store.transaction() as conn:
+            for doc_id in ids:
+                row = conn.execute("SELECT doc FROM lexical_ids WHERE id=?", (doc_id,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM lexical WHERE rowid=?", (row[0],))
+                    conn.execute("DELETE FROM lexical_ids WHERE id=?", (doc_id,))
+
+    def rebuild(self):
+        """
+        컬렉션 문서로 색인 전체를 다시 만듭니다. 비우기와 채우기를 한 트랜잭션에서 하므로
+        다른 프로세스는 끝날 때까지 이전 색인을 읽습니다.
+        """
+        total = self.collection.count()
+        with self.store.transaction() as conn:
+            conn.execute("DROP TABLE IF EXISTS lexical")
+            conn.execute("DROP TABLE IF EXISTS lexical_ids")
+            self._create(conn)
+            for offset in range(0, total, REBUILD_BATCH):
+                got = self.collection.get(include=["documents", "metadatas"], limit=REBUILD_BATCH, offset=offset)
+                self._write(conn, zip(got["ids"], got["documents"], got["metadatas"]))
+            self.store.put("_meta", VERSION_KEY, INDEX_VERSION)
+        logger.info(f"Lexical index rebuilt: {total} references")
+
+    def search(self, query: str, n_results: int = 10, doc_type: Optional[str] = None) -> List[Tuple[str, float]]:
+        """(id, BM25 점수) 목록, 점수가 높을수록 관련도가 높음."""
+        match = _fts_query(query)
+        if match is None:
+            return []
+        type_clause = " AND type = ?" if doc_type else ""
+        with self.store.transaction(commit=False) as conn:
+            rows = conn.execute(
+                f"SELECT id, bm25(lexical, 0, 0, ?, ?) AS score FROM lexical WHERE lexical MATCH ?{type_clause} "
+                "ORDER BY score LIMIT ?",
+                [TAG_WEIGHT, BODY_WEIGHT, match] + ([doc_type] if doc_type else []) + [n_results]
+            ).fetchall()
+        # SQLite의 bm25()는 관련도가 높을수록 더 작은(음수) 값
+        return [(doc_id, -score) for doc_id, score in rows]
+
+
+class HashEmbedding(EmbeddingFunction):
+    """
+    공백 단위 단어를 md5로 HASH_EMBEDDING_DIM개 버킷에 세는 bag-of-words 임베딩. 벤치마크 전용.
+    모델 파일을 내려받지 않아도 같은 결과가 나오므로 오프라인에서 수치를 재현할 때 사용합니다.
+    """
+
+    def __init__(self, dim: int = HASH_EMBEDDING_DIM):
+        self.dim = dim
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = []
+        for document in input:
+            vector = [0.0] * self.dim
+            for word in document.split():
+                vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+            vectors.append(vector)
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "lexical-bench-hash"
+
+    def get_config(self) -> Dict:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "HashEmbedding":
+        return HashEmbedding(config.get("dim", HASH_EMBEDDING_DIM))
+
+
+def benchmark(docs: int = 50000, queries: int = 200, n_results: int = 10, seed: int = 0,
+              embedding: str = "default") -> Dict:
+    """
+    임시 DB에 합성 레퍼런스를 넣고 벡터/어휘/하이브리드 검색 지연 시간과, 본문에만 있는 고유 문자열(제품명 등)을
+    찾는 정확 일치 적중률을 비교합니다. embedding="default"는 Chroma 기본 임베딩 함수(모델 다운로드 필요),
+    "hash"는 HashEmbedding을 사용하며 어느 쪽인지 결과에 함께 기록합니다.
+    """
+    from db_manager import VectorDBManager
+    from taxonomy import VALID_CATEGORIES
+
+    if embedding not in BENCH_EMBEDDINGS:
+        raise ValueError(f"embedding must be one of {BENCH_EMBEDDINGS}")
+    rng = random.Random(seed)
+    tags = [c for c in VALID_CATEGORIES if c != "미분류"]
+    syllables = "가나다라마바사아자차카타파하건축공간디자인조명가구벽돌콘크리트목재유리철골정원"
+    words = ["".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(3000)]
+    workdir = tempfile.mkdtemp(prefix="lexical-bench-")
+    db = VectorDBManager(os.path.join(workdir, "chroma_db"), buffer_size=1000,
+                         embedding_function=HashEmbedding() if embedding == "hash" else None)
+
+    planted = {}
+    started = time.perf_counter()
+    batch = []
+    for i in range(docs):
+        doc_tags = rng.sample(tags, rng.randint(1, 3))
+        text = " ".join(rng.choice(words) for _ in range(40))
+        if i % (docs // queries or 1) == 0 and len(planted) < queries:
+            # 본문 한가운데 고유 제품명/모델명 (예: OCR로 읽힌 "Lumina-K 4821")
+            name = f"Lumina{rng.choice('KXZQ')}{rng.randint(1000, 9999)}"
+            text = f"{text[:len(text) // 2]} {name} {text[len(text) // 2:]}"
+            planted[name] = f"bench-{i:06d}"
+        batch.append((f"bench-{i:06d}", f"OCR Text:\n{text}", doc_tags, {"type": "image", "timestamp": float(i)}))
+        if len(batch) >= 1000:
+            db.add_references(batch)
+            batch = []
+    db.add_references(batch)
+    db.flush()
+    ingest_seconds = time.perf_counter() - started
+
+    def measure(mode: str) -> Dict:
+        latencies, hits = [], 0
+        for name, expected in planted.items():
+            started = time.perf_counter()
+            results = db.search_similar(name, n_results=n_results, mode=mode)
+            latencies.append(time.perf_counter() - started)
+            hits += any(r["id"] == expected for r in results)
+        latencies.sort()
+        return {
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+            "exact_hit_rate": round(hits / len(planted), 3)
+        }
+
+    report = {"docs": docs, "queries": len(planted), "n_results": n_results, "embedding": embedding,
+              "ingest_seconds": round(ingest_seconds, 1),
+              "vector": measure("vector"), "lexical": measure("lexical"), "hybrid": measure("hybrid")}
+    logger.info(f"lexical benchmark: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lexical (BM25 n-gram) vs vector vs hybrid search benchmark")
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--embedding", choices=BENCH_EMBEDDINGS, default="default",
+                        help="default = configured Chroma embedding function, hash = offline bag-of-words hash embedding")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s', stream=sys.stderr)
+    print(json.dumps(benchmark(args.docs, args.queries, args.n_results, embedding=args.embedding),
+                     indent=2, ensure_ascii=False))
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger("mcp_vision_server.llm_ledger")
+
+LEDGER_FILE = os.environ.get("LLM_LEDGER_FILE", "llm_ledger.jsonl")
+# load_duration이 이보다 길면 모델을 새로 메모리에 올린 호출(cold load)로 간주
+COLD_LOAD_MS = 500
+TOP_SITES = 10
+
+_NS_PER_MS = 1_000_000
+
+
+class LLMLedger:
+    """
+    LLM 호출 기록 (JSON Lines, 추가 전용). Ollama 응답의 토큰 수/소요 시간 필드를 호출 위치와 함께 한 줄씩 남깁니다.
+    """
+
+    def __init__(self, path: str = LEDGER_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, site: str, model: str, response: Optional[Dict], latency: float,
+               images: int = 0, error: Optional[str] = None):
+        """response는 /api/generate 응답 JSON (스트리밍이면 done=True 마지막 청크)."""
+        response = response or {}
+        entry = {
+            "ts": round(time.time(), 3),
+            "site": site,
+            "model": model,
+            "ok": error is None,
+            "prompt_tokens": response.get("prompt_eval_count", 0),
+            "output_tokens": response.get("eval_count", 0),
+            "load_ms": round(response.get("load_duration", 0) / _NS_PER_MS, 1),
+            "prompt_ms": round(response.get("prompt_eval_duration", 0) / _NS_PER_MS, 1),
+            "eval_ms": round(response.get("eval_duration", 0) / _NS_PER_MS, 1),
+            "latency_ms": round(latency * 1000, 1),
+        }
+        if images:
+            entry["images"] = images
+        if error:
+            entry["error"] = error[:200]
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+        except OSError as e:
+            logger.warning(f"LLM ledger write failed {self.path}: {e}")
+
+    def entries(self, since: float = 0.0) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 비정상 종료로 잘린 마지막 줄
+                    continue
+                if entry.get("ts", 0) >= since:
+                    yield entry
+
+
+def _rate(tokens: float, ms: float) -> float:
+    return round(tokens / (ms / 1000.0), 1) if ms else 0.0
+
+
+def report(since_hours: Optional[float] = None, path: str = LEDGER_FILE) -> Dict:
+    """모델별 tokens/sec와 cold load 빈도, 누적 지연 시간 기준 상위 호출 위치."""
+    since = time.time() - since_hours * 3600 if since_hours else 0.0
+    models = defaultdict(lambda: defaultdict(float))
+    sites = defaultdict(lambda: defaultdict(float))
+    total = 0
+    for e in LLMLedger(path).entries(since):
+        total += 1
+        cold = e.get("load_ms", 0) >= COLD_LOAD_MS
+        for bucket in (models[e["model"]], sites[e["site"]]):
+            bucket["calls"] += 1
+            bucket["errors"] += not e.get("ok", True)
+            bucket["cold_loads"] += cold
+            bucket["load_ms"] += e.get("load_ms", 0)
+            bucket["prompt_tokens"] += e.get("prompt_tokens", 0)
+            bucket["output_tokens"] += e.get("output_tokens", 0)
+            bucket["prompt_ms"] += e.get("prompt_ms", 0)
+            bucket["eval_ms"] += e.get("eval_ms", 0)
+            bucket["latency_ms"] += e.get("latency_ms", 0)
+
+    model_report = {}
+    for model, m in sorted(models.items()):
+        model_report[model] = {
+            "calls": int(m["calls"]),
+            "errors": int(m["errors"]),
+            "prompt_tokens_per_sec": _rate(m["prompt_tokens"], m["prompt_ms"]),
+            "output_tokens_per_sec": _rate(m["output_tokens"], m["eval_ms"]),
+            "cold_loads": int(m["cold_loads"]),
+            "cold_load_ratio": round(m["cold_loads"] / m["calls"], 3),
+            "load_seconds_total": round(m["load_ms"] / 1000, 1)
+        }
+
+    ranked = sorted(sites.items(), key=lambda kv: kv[1]["latency_ms"], reverse=True)[:TOP_SITES]
+    site_report = [{
+        "site": site,
+        "calls": int(s["calls"]),
+        "latency_seconds_total": round(s["latency_ms"] / 1000, 1),
+        "avg_latency_seconds": round(s["latency_ms"] / s["calls"] / 1000, 2),
+        "avg_prompt_tokens": round(s["prompt_tokens"] / s["calls"]),
+        "avg_output_tokens": round(s["output_tokens"] / s["calls"]),
+        "cold_loads": int(s["cold_loads"]),
+        "errors": int(s["errors"])
+    } for site, s in ranked]
+
+    return {"calls": total, "since_hours": since_hours, "models": model_report, "top_call_sites": site_report}
+
+
+# 싱글톤 인스턴스 생성
+llm_ledger = LLMLedger()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "report":
+        hours = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(json.dumps(report(hours), ensure_ascii=False, indent=2))
+    else:
+        print("Usage: python llm_ledger.py report [since_hours]")
@@ -0,0 +1,268 @@
+import os
+import re
+import sys
+import json
+import math
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from cache_store import store
+from metrics import metrics
+from taxonomy import VALID_CATEGORIES, clean_spam_text
+
+logger = logging.getLogger("mcp_vision_server.local_classifier")
+
+MODEL_FILE = "local_classifier.json"
+STATS_NS = "local_classifier_stats"
+# 캐시 저장소의 LLM 라벨 (file_manager의 TAGS_NS / TEXT_NS)
+LABEL_NS = "post_tags"
+TEXT_NS = "post_text"
+
+# 이 신뢰도 이상이면 LLM 호출 없이 로컬 분류 결과를 사용
+CONFIDENCE_THRESHOLD = 0.8
+MIN_TEXT_LENGTH = 30
+NGRAM_SIZES = (2, 3)
+TOP_K = 10
+# 질의 문서에서 가중치가 큰 n-gram만 사용해 후보 탐색 비용을 제한
+MAX_QUERY_TERMS = 80
+# 가장 가까운 학습 문서의 유사도가 이보다 낮으면 판단하지 않음
+MIN_NEIGHBOUR_SIMILARITY = 0.25
+TAG_VOTE_THRESHOLD = 0.5
+MAX_TAGS = 4
+# 학습 데이터 중 평가용으로 떼어 두는 비율 (shortcode 해시 기준, 재학습해도 동일한 분할)
+HOLDOUT_RATIO = 0.1
+
+
+def normalize_text(text: str) -> str:
+    text = clean_spam_text(text).lower()
+    text = re.sub(r'https?://\S+', ' ', text)
+    text = re.sub(r'\d+', '0', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def extract_features(text: str) -> Counter:
+    """단어 내부의 문자 2/3-gram (한국어는 형태소 분석 없이도 잘 동작) + 영문 단어 토큰."""
+    features = Counter()
+    for word in normalize_text(text).split(' '):
+        if not word:
+            continue
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                features[padded[i:i + n]] += 1
+        if word.isascii() and len(word) > 2:
+            features[f"w:{word}"] += 1
+    return features
+
+
+def _is_holdout(shortcode: str) -> bool:
+    return int(hashlib.md5(shortcode.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF < HOLDOUT_RATIO
+
+
+class Prediction:
+    def __init__(self, tags: List[str], confidence: float, scores: Dict[str, float]):
+        self.tags = tags
+        self.confidence = confidence
+        self.scores = scores
+
+    def __repr__(self):
+        return f"Prediction(tags={self.tags}, confidence={self.confidence:.2f})"
+
+
+class LocalTextClassifier:
+    """
+    LLM이 붙인 태그를 학습 데이터로 사용하는 TF-IDF(문자 n-gram) k-최근접 이웃 분류기.
+    이웃 유사도 가중 투표로 태그별 점수를 계산하고, 선택된 태그 점수의 최솟값을 신뢰도로 사용합니다.
+    """
+
+    def __init__(self, texts: List[str], labels: List[List[str]]):
+        self.labels = labels
+        doc_features = [extract_features(t) for t in texts]
+        df = Counter()
+        for f in doc_features:
+            df.update(f.keys())
+        n = max(1, len(texts))
+        self.idf = {term: math.log((1 + n) / (1 + c)) + 1.0 for term, c in df.items()}
+        # 역색인: term -> [(문서 번호, 가중치)]
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for doc_id, f in enumerate(doc_features):
+            for term, weight in self._vectorize(f).items():
+                self.postings[term].append((doc_id, weight))
+
+    def _vectorize(self, features: Counter) -> Dict[str, float]:
+        vec = {t: (1.0 + math.log(c)) * self.idf[t] for t, c in features.items() if t in self.idf}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {t: w / norm for t, w in vec.items()}
+
+    def predict(self, text: str) -> Optional[Prediction]:
+        if not text or len(text.strip()) < MIN_TEXT_LENGTH or not self.labels:
+            return None
+        query = self._vectorize(extract_features(text))
+        if not query:
+            return None
+        terms = sorted(query.items(), key=lambda kv: kv[1], reverse=True)[:MAX_QUERY_TERMS]
+        sims = defaultdict(float)
+        for term, qw in terms:
+            for doc_id, dw in self.postings.get(term, ()):
+                sims[doc_id] += qw * dw
+        if not sims:
+            return None
+        neighbours = sorted(sims.items(), key=lambda kv: kv[1], reverse=True)[:TOP_K]
+        if neighbours[0][1] < MIN_NEIGHBOUR_SIMILARITY:
+            return Prediction([], 0.0, {})
+
+        total = sum(sim for _, sim in neighbours)
+        scores = defaultdict(float)
+        for doc_id, sim in neighbours:
+            for tag in self.labels[doc_id]:
+                scores[tag] += sim / total
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        tags = [t for t, s in ranked if s >= TAG_VOTE_THRESHOLD][:MAX_TAGS]
+        if not tags:
+            return Prediction([], ranked[0][1] if ranked else 0.0, dict(scores))
+        confidence = min(scores[t] for t in tags)
+        return Prediction(tags, confidence, dict(scores))
+
+    @classmethod
+    def load(cls, path: str = MODEL_FILE) -> Optional["LocalTextClassifier"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            model = cls(data["texts"], data["labels"])
+            logger.info(f"Local text classifier loaded: {len(data['labels'])} training posts")
+            return model
+        except Exception as e:
+            logger.warning(f"Local text classifier load failed {path}: {e}")
+            return None
+
+
+def load_training_data(include_holdout: bool = False) -> Tuple[List[str], List[List[str]], List[str]]:
+    """캐시 저장소의 (본문, LLM 태그) 쌍을 모읍니다. 미분류뿐인 라벨은 제외합니다."""
+    texts, labels, shortcodes = [], [], []
+    for shortcode, tags in store.items(LABEL_NS):
+        tags = [t for t in (tags or []) if t in VALID_CATEGORIES and t != "미분류"]
+        if not tags:
+            continue
+        if not include_holdout and _is_holdout(shortcode):
+            continue
+        text = store.get(TEXT_NS, shortcode, "")
+        if len(normalize_text(text)) < MIN_TEXT_LENGTH:
+            continue
+        texts.append(normalize_text(text))
+        labels.append(tags)
+        shortcodes.append(shortcode)
+    return texts, labels, shortcodes
+
+
+def train(path: str = MODEL_FILE) -> int:
+    """평가용 분할을 제외한 라벨로 모델 파일을 다시 만듭니다."""
+    texts, labels, _ = load_training_data()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"texts": texts, "labels": labels}, f, ensure_ascii=False)
+    global _model, _model_loaded
+    with _model_lock:
+        _model, _model_loaded = None, False
+    logger.info(f"Local text classifier trained on {len(texts)} posts -> {path}")
+    return len(texts)
+
+
+def evaluate(threshold: float = CONFIDENCE_THRESHOLD) -> Dict:
+    """평가용으로 떼어 둔 LLM 라벨과 비교한 일치도 리포트."""
+    texts, labels, shortcodes = load_training_data(include_holdout=True)
+    train_set = [(t, l) for t, l, s in zip(texts, labels, shortcodes) if not _is_holdout(s)]
+    test_set = [(t, l) for t, l, s in zip(texts, labels, shortcodes) if _is_holdout(s)]
+    model = LocalTextClassifier([t for t, _ in train_set], [l for _, l in train_set])
+
+    confident = primary_hits = exact = 0
+    jaccard_sum = 0.0
+    for text, truth in test_set:
+        pred = model.predict(text)
+        if not pred or not pred.tags or pred.confidence < threshold:
+            continue
+        confident += 1
+        predicted, expected = set(pred.tags), set(truth)
+        primary_hits += pred.tags[0] in expected
+        exact += predicted == expected
+        jaccard_sum += len(predicted & expected) / len(predicted | expected)
+    return {
+        "train_posts": len(train_set),
+        "holdout_posts": len(test_set),
+        "threshold": threshold,
+        "coverage": round(confident / len(test_set), 3) if test_set else 0.0,
+        "primary_tag_precision": round(primary_hits / confident, 3) if confident else 0.0,
+        "exact_set_agreement": round(exact / confident, 3) if confident else 0.0,
+        "mean_jaccard": round(jaccard_sum / confident, 3) if confident else 0.0
+    }
+
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+
+def get_model() -> Optional[LocalTextClassifier]:
+    global _model, _model_loaded
+    with _model_lock:
+        if not _model_loaded:
+            _model = LocalTextClassifier.load()
+            _model_loaded = True
+        return _model
+
+
+def classify_locally(text: str, threshold: float = CONFIDENCE_THRESHOLD) -> Optional[List[str]]:
+    """로컬 분류기가 충분히 확신하면 태그를 반환하고, 아니면 None (LLM으로 넘김)."""
+    model = get_model()
+    if model is None:
+        return None
+    pred = model.predict(text)
+    if pred and pred.tags and pred.confidence >= threshold:
+        record_outcome(local=True)
+        logger.info(f"Local classifier hit ({pred.confidence:.2f}): {pred.tags}")
+        return pred.tags
+    return None
+
+
+def record_outcome(local: bool):
+    """로컬 분류로 대체한 호출 수 / LLM까지 간 호출 수를 누적합니다."""
+    key = "local_hits" if local else "llm_calls"
+    with _stats_lock:
+        store.put(STATS_NS, key, store.get(STATS_NS, key, 0) + 1)
+
+
+def stats() -> Dict:
+    local_hits = store.get(STATS_NS, "local_hits", 0)
+    llm_calls = store.get(STATS_NS, "llm_calls", 0)
+    total = local_hits + llm_calls
+    return {
+        "local_hits": local_hits,
+        "llm_calls": llm_calls,
+        "llm_calls_avoided_ratio": round(local_hits / total, 3) if total else 0.0
+    }
+
+
+def _decision_metrics() -> Dict:
+    current = stats()
+    return {(("source", "local"),): current["local_hits"], (("source", "llm"),): current["llm_calls"]}
+
+
+metrics.callback("local_classifier_decisions_total", "Text classifications answered locally vs sent to the LLM",
+                 _decision_metrics, metric_type="counter")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "train":
+        print(f"Trained on {train()} posts -> {MODEL_FILE}")
+    elif command == "report":
+        threshold = float(sys.argv[2]) if len(sys.argv) > 2 else CONFIDENCE_THRESHOLD
+        print(json.dumps(evaluate(threshold), ensure_ascii=False, indent=2))
+    elif command == "stats":
+        print(json.dumps(stats(), ensure_ascii=False, indent=2))
+    else:
+        print("Usage: python local_classifier.py [train | report [threshold] | stats]")
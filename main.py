@@ -13,16 +13,22 @@ logger = logging.getLogger("mcp_vision_server")
 # FastMCP 서버 인스턴스 생성
 mcp = FastMCP("AutoVisionServer")
 
-from file_manager import DirectoryMonitor, scan_directory_once
+from file_manager import DirectoryMonitor, scan_directory_once, ingest_pipeline, warm_models
 from instagram_scraper import scrape_saved_posts
 from db_manager import db
+from cache_store import store
+from processing_ledger import ledger
+from metrics import metrics, start_http_server, METRICS_PORT
 
 @mcp.tool()
 async def scan_local_directory(path: str) -> str:
     """수동으로 지정된 디렉토리의 이미지 및 PDF 파일을 스캔하고 분석합니다."""
     logger.info(f"디렉토리 스캔을 시작합니다: {path}")
     results = scan_directory_once(path)
-    return f"스캔이 완료되었습니다: {path} (PDF: {results['pdfs']}건, 이미지: {results['images']}건 처리됨)"
+    return (
+        f"스캔이 완료되었습니다: {path} (PDF: {results['pdfs']}건, 이미지: {results['images']}건 처리됨)\n"
+        f"신규: {results['new']}건, 변경: {results['changed']}건, 변경 없음(건너뜀): {results['skipped']}건"
+    )
 
 from instagram_scraper import scrape_saved_posts
 
@@ -48,7 +54,9 @@ async def search_references(query: str) -> str:
     for r in results:
         path = r['metadata'].get('filepath', 'Unknown')
         tags = r['metadata'].get('tags', '')
-        response.append(f"- 파일: {path} (태그: {tags}, 유사도 거리: {r['distance']:.4f})")
+        # 어휘 검색에서만 찾은 결과는 벡터 거리가 없음
+        distance = f"{r['distance']:.4f}" if r.get('distance') is not None else "-"
+        response.append(f"- 파일: {path} (태그: {tags}, 유사도 거리: {distance})")
         
     return "\n".join(response)
 
@@ -69,6 +77,12 @@ async def get_file_network(file_id: str) -> str:
         
     return "\n".join(response)
 
+@mcp.tool()
+async def get_ingest_metrics() -> str:
+    """수집 파이프라인 지표(스테이지별 처리 시간, 큐 깊이, 캐시 적중률, 오류 수)를 반환합니다."""
+    logger.info("수집 파이프라인 지표를 요청했습니다.")
+    return f"수집 파이프라인 지표 (Prometheus: http://localhost:{METRICS_PORT}/metrics):\n{metrics.report()}"
+
 from visualize_network import generate_graph_html
 
 @mcp.tool()
@@ -93,6 +107,21 @@ def main():
     if not os.path.exists("./watched_files"):
         os.makedirs("./watched_files")
 
+    # Prometheus 형식 지표 엔드포인트 (/metrics)
+    start_http_server(METRICS_PORT)
+
+    # 이전 실행이 처리 도중 종료되었다면 해당 파일을 다시 처리할 수 있도록 임대를 회수
+    ledger.recover()
+
+    # 버전이 바뀌었거나 컬렉션과 어긋난 보조 색인(태그 등)은 수집을 시작하기 전에 다시 만듦
+    db.ensure_indexes()
+
+    # 분류/비전 모델을 미리 올려 두고 keep_alive 설정 (첫 파일이 cold load를 기다리지 않도록)
+    warm_models()
+
+    # 백로그 스캔과 실시간 감시 모두 동일한 다단계 수집 파이프라인으로 파일을 투입
+    ingest_pipeline.start()
+
     # Retroactively scan existing backlog files that were downloaded while the server was down/restarting
     from file_manager import scan_directory_once
     import threading
@@ -111,6 +140,9 @@ def main():
         mcp.run()
     finally:
         monitor.stop()
+        # DB flush가 매니페스트/장부 완료 기록을 남기므로 캐시 저장소보다 먼저
+        db.flush()
+        store.flush()
 
 if __name__ == "__main__":
     main()
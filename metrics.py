@@ -0,0 +1,239 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import http.server
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mcp_vision_server.metrics")
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+
+# 초 단위 지연 시간 히스토그램 버킷 (phash 수 ms ~ LLaVA 호출 수십 초)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    pairs = list(key)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.type = "counter"
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.type = "histogram"
+        self.buckets = tuple(sorted(buckets))
+        # label -> [버킷별 개수..., +Inf 개수], 합계
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        out = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    out.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+                cumulative += counts[-1]
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), cumulative))
+                out.append((f"{self.name}_count", key, cumulative))
+                out.append((f"{self.name}_sum", key, self._sums[key]))
+        return out
+
+    def summary(self) -> Dict[LabelKey, Dict]:
+        """label별 호출 수, 평균, 버킷 기준 p50/p95 (상한값)."""
+        result = {}
+        with self._lock:
+            for key, counts in self._counts.items():
+                total = sum(counts)
+                result[key] = {
+                    "count": total,
+                    "avg": self._sums[key] / total if total else 0.0,
+                    "p50": self._quantile(counts, total, 0.5),
+                    "p95": self._quantile(counts, total, 0.95)
+                }
+        return result
+
+    def _quantile(self, counts: List[int], total: int, q: float) -> float:
+        target, cumulative = q * total, 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class CallbackMetric:
+    """수집 시점에 fn()을 호출해 값을 읽는 지표 (큐 깊이, 캐시 통계 등 다른 모듈이 이미 들고 있는 값)."""
+
+    def __init__(self, name: str, help_text: str, metric_type: str, fn: Callable[[], Dict]):
+        self.name = name
+        self.help = help_text
+        self.type = metric_type
+        self.fn = fn
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        values = self.fn()
+        if not isinstance(values, dict):
+            return [(self.name, (), float(values))]
+        return [(self.name, tuple(labels), float(v)) for labels, v in values.items() if v is not None]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def callback(self, name: str, help_text: str, fn: Callable[[], Dict], metric_type: str = "gauge"):
+        """fn은 {(("label", "값"), ...): 값} 또는 단일 값을 반환합니다. 같은 이름으로 다시 등록하면 교체됩니다."""
+        with self._lock:
+            self._metrics[name] = CallbackMetric(name, help_text, metric_type, fn)
+
+    def metrics(self) -> List:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self.metrics():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.warning(f"Metric collection failed {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, value in samples:
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> str:
+        """MCP 도구용 요약: 히스토그램은 label별 호출 수/평균/p50/p95, 나머지는 현재 값."""
+        lines = []
+        for metric in self.metrics():
+            try:
+                if isinstance(metric, Histogram):
+                    for key, s in sorted(metric.summary().items()):
+                        lines.append(
+                            f"{metric.name}{_format_labels(key)} count={s['count']} avg={s['avg']:.3f}s "
+                            f"p50<={s['p50']}s p95<={s['p95']}s"
+                        )
+                else:
+                    for name, key, value in sorted(metric.samples()):
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+            except Exception as e:
+                lines.append(f"{metric.name} unavailable: {e}")
+        return "\n".join(lines)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry: MetricsRegistry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int = METRICS_PORT, registry: MetricsRegistry = None) -> Optional[http.server.ThreadingHTTPServer]:
+    """/metrics 엔드포인트를 백그라운드 스레드에서 제공합니다. 포트를 열 수 없으면 None (서버 기동은 계속)."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or metrics})
+    try:
+        server = http.server.ThreadingHTTPServer(("0.0.0.0", port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint could not bind port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Prometheus metrics available at http://localhost:{port}/metrics")
+    return server
+
+
+# 싱글톤 인스턴스 생성
+metrics = MetricsRegistry()
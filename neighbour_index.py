@@ -0,0 +1,186 @@
+import time
+import logging
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+from cache_store import CacheStore
+from graph_builder import load_embeddings, topk_cosine
+
+logger = logging.getLogger("mcp_vision_server.neighbour_index")
+
+# 문서당 저장하는 최근접 이웃 수 (get_file_network, 그래프 빌더가 이 안에서 읽음)
+NEIGHBOUR_K = 10
+# 새/변경 문서의 후보 수 = K * 이 값. 자기 행(top-K)을 채우고, 남는 후보는 "그 후보의 top-K에 새 문서가 들어가야 하는지"
+# (역방향 갱신)에 씀. 후보 밖에 있는 행은 갱신되지 않으므로 근사치이며, rebuild()로 전체를 다시 계산할 수 있음
+CANDIDATE_FACTOR = 3
+REFRESH_BATCH = 128
+# 이 수 이상의 행을 한꺼번에 채울 때(rebuild, 첫 그래프 생성)는 HNSW 질의 대신
+# 저장된 임베딩 전체를 행렬로 읽어 정확한 top-K를 블록 단위로 계산
+BULK_ROWS = 256
+
+Neighbours = List[Tuple[str, float]]
+
+
+def _batches(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class NeighbourIndex:
+    """
+    ChromaDB 컬렉션의 문서별 top-K 이웃(id -> 이웃 id, 코사인 유사도)을 SQLite에 저장해 둔 표.
+    문서가 추가/변경되면 저장된 임베딩으로 그 문서의 행과 영향을 받는 행만 다시 계산하므로
+    조회할 때 임베딩이나 벡터 검색이 필요 없습니다. 아직 계산되지 않은 행은 처음 조회할 때 채웁니다.
+    """
+
+    def __init__(self, collection, index_store: CacheStore, k: int = NEIGHBOUR_K):
+        self.collection = collection
+        self.store = index_store
+        self.k = k
+        with self.store.transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS neighbours ("
+                "id TEXT NOT NULL, neighbour TEXT NOT NULL, similarity REAL NOT NULL, "
+                "PRIMARY KEY (id, neighbour)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS neighbours_reverse ON neighbours (neighbour)")
+            # 계산이 끝난 행 (이웃이 K개보다 적은 문서도 구분하기 위해 따로 기록)
+            conn.execute("CREATE TABLE IF NOT EXISTS neighbour_rows (id TEXT PRIMARY KEY, updated REAL) WITHOUT ROWID")
+
+    def _candidates(self, ids: List[str], n_results: int) -> Dict[str, Neighbours]:
+        """저장된 임베딩으로 검색합니다 (문서를 다시 임베딩하지 않음). 자기 자신은 제외합니다."""
+        total = self.collection.count()
+        if total <= 1 or not ids:
+            return {i: [] for i in ids}
+        stored = self.collection.get(ids=ids, include=["embeddings"])
+        if not stored["ids"]:
+            return {}
+        results = self.collection.query(query_embeddings=list(stored["embeddings"]), n_results=min(total, n_results + 1),
+                                        include=["distances"])
+        found = {}
+        for query_id, neighbour_ids, distances in zip(stored["ids"], results["ids"], results["distances"]):
+            found[query_id] = [(n, 1.0 - d) for n, d in zip(neighbour_ids, distances) if n != query_id]
+        return found
+
+    def _write_rows(self, conn, rows: Dict[str, Neighbours]):
+        now = time.time()
+        for doc_id, neighbours in rows.items():
+            conn.execute("DELETE FROM neighbours WHERE id=?", (doc_id,))
+            conn.executemany("INSERT OR REPLACE INTO neighbours (id, neighbour, similarity) VALUES (?, ?, ?)",
+                             [(doc_id, n, s) for n, s in neighbours[:self.k]])
+            conn.execute("INSERT OR REPLACE INTO neighbour_rows (id, updated) VALUES (?, ?)", (doc_id, now))
+
+    def _compute_rows(self, ids: List[str]):
+        """행 자체만 다시 계산합니다 (다른 행은 건드리지 않음)."""
+        if len(ids) >= BULK_ROWS:
+            self._compute_rows_bulk(ids)
+            return
+        for batch in _batches(ids, REFRESH_BATCH):
+            rows = self._candidates(batch, self.k)
+            with self.store.transaction() as conn:
+                self._write_rows(conn, rows)
+
+    def _compute_rows_bulk(self, ids: List[str]):
+        all_ids, matrix = load_embeddings(self.collection)
+        position = {doc_id: i for i, doc_id in enumerate(all_ids)}
+        targets = np.array([position[i] for i in ids if i in position], dtype=np.int64)
+        indices, sims = topk_cosine(matrix[targets], matrix, self.k, self_index=targets)
+        rows = {all_ids[t]: [(all_ids[j], float(s)) for j, s in zip(indices[row], sims[row])]
+                for row, t in enumerate(targets)}
+        for batch in _batches(list(rows), REFRESH_BATCH * 8):
+            with self.store.transaction() as conn:
+                self._write_rows(conn, {doc_id: rows[doc_id] for doc_id in batch})
+
+    def _short_rows(self, conn, ids: Iterable[str]) -> List[str]:
+        """이웃이 K개(문서 수가 적으면 전체 - 1)보다 적어진 행."""
+        full = min(self.k, max(0, self.collection.count() - 1))
+        short = []
+        for doc_id in ids:
+            count = conn.execute("SELECT COUNT(*) FROM neighbours WHERE id=?", (doc_id,)).fetchone()[0]
+            if count < full:
+                short.append(doc_id)
+        return short
+
+    def refresh(self, ids: List[str]):
+        """
+        추가/재임베딩된 문서의 행을 다시 계산합니다. 다른 행에 남아 있던 이 문서의 예전 유사도는 지우고,
+        후보 행 중 이 문서가 top-K에 들어가는 행에는 넣습니다. 그 결과 K개보다 적어진 행만 다시 계산합니다.
+        """
+        ids = list(dict.fromkeys(ids))
+        for batch in _batches(ids, REFRESH_BATCH):
+            rows = self._candidates(batch, self.k * CANDIDATE_FACTOR)
+            batch_set = set(batch)
+            with self.store.transaction() as conn:
+                marks = ",".join("?" * len(batch))
+                affected = {r[0] for r in conn.execute(f"SELECT id FROM neighbours WHERE neighbour IN ({marks})", batch)}
+                conn.execute(f"DELETE FROM neighbours WHERE neighbour IN ({marks})", batch)
+                self._write_rows(conn, rows)
+
+                for doc_id, candidates in rows.items():
+                    for other, similarity in candidates:
+                        if other in batch_set:
+                            continue
+                        if conn.execute("SELECT 1 FROM neighbour_rows WHERE id=?", (other,)).fetchone() is None:
+                            continue
+                        row = conn.execute(
+                            "SELECT COUNT(*), MIN(similarity) FROM neighbours WHERE id=?", (other,)
+                        ).fetchone()
+                        if row[0] >= self.k and similarity <= row[1]:
+                            continue
+                        conn.execute("INSERT OR REPLACE INTO neighbours (id, neighbour, similarity) VALUES (?, ?, ?)",
+                                     (other, doc_id, similarity))
+                        conn.execute(
+                            "DELETE FROM neighbours WHERE id=? AND neighbour NOT IN "
+                            "(SELECT neighbour FROM neighbours WHERE id=? ORDER BY similarity DESC LIMIT ?)",
+                            (other, other, self.k)
+                        )
+                short = self._short_rows(conn, affected - batch_set)
+            if short:
+                self._compute_rows(short)
+
+    def delete(self, ids: List[str]):
+        """삭제된 문서의 행을 지우고, 이 문서를 이웃으로 갖던 행을 다시 계산합니다."""
+        ids = list(dict.fromkeys(ids))
+        affected = set()
+        for batch in _batches(ids, REFRESH_BATCH):
+            marks = ",".join("?" * len(batch))
+            with self.store.transaction() as conn:
+                affected.update(r[0] for r in conn.execute(f"SELECT id FROM neighbours WHERE neighbour IN ({marks})", batch))
+                conn.execute(f"DELETE FROM neighbours WHERE neighbour IN ({marks}) OR id IN ({marks})", batch + batch)
+                conn.execute(f"DELETE FROM neighbour_rows WHERE id IN ({marks})", batch)
+        self._compute_rows(sorted(affected - set(ids)))
+
+    def neighbours_many(self, ids: List[str], limit: int = None) -> Dict[str, Neighbours]:
+        """{id: [(이웃 id, 유사도), ...]} 유사도 내림차순. 계산된 적 없는 행은 이번에 계산해 저장합니다."""
+        limit = min(limit or self.k, self.k)
+        ids = list(dict.fromkeys(ids))
+        with self.store.transaction(commit=False) as conn:
+            missing = [i for i in ids if conn.execute("SELECT 1 FROM neighbour_rows WHERE id=?", (i,)).fetchone() is None]
+        if missing:
+            logger.info(f"Computing {len(missing)} missing neighbour rows")
+            self._compute_rows(missing)
+        result = {}
+        with self.store.transaction(commit=False) as conn:
+            for doc_id in ids:
+                result[doc_id] = [(n, s) for n, s in conn.execute(
+                    "SELECT neighbour, similarity FROM neighbours WHERE id=? ORDER BY similarity DESC LIMIT ?",
+                    (doc_id, limit)
+                )]
+        return result
+
+    def neighbours(self, doc_id: str, limit: int = None) -> Neighbours:
+        return self.neighbours_many([doc_id], limit)[doc_id]
+
+    def rebuild(self):
+        """모든 행을 다시 계산합니다 (역방향 갱신으로 생긴 근사 오차 정리용). 비우기와 채우기는 한 트랜잭션."""
+        ids = self.collection.get(include=[])["ids"]
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM neighbours")
+            conn.execute("DELETE FROM neighbour_rows")
+            self._compute_rows(ids)
+        logger.info(f"Neighbour table rebuilt: {len(ids)} rows")
+
+    def stats(self) -> Dict:
+        with self.store.transaction(commit=False) as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM neighbour_rows").fetchone()[0]
+            edges = conn.execute("SELECT COUNT(*) FROM neighbours").fetchone()[0]
+        return {"rows": rows, "edges": edges, "k": self.k}
@@ -0,0 +1,157 @@
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pytesseract
+from PIL import Image
+
+try:
+    # Tesseract C API 바인딩. 설치되어 있으면 워커 스레드마다 엔진을 한 번만 띄워 재사용 (파일마다 프로세스를 만들지 않음)
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger("mcp_vision_server.ocr_engine")
+
+OCR_LANG = "kor+eng"
+# 이보다 픽셀 수가 많은 이미지(긴 스크린샷 등)는 OCR 전에 축소
+OCR_MAX_PIXELS = 6_000_000
+
+# 텍스트 검출기: 축소 이미지를 셀로 나눠 강한 가로 방향 경계 밀도가 글자 범위에 들고
+# 픽셀 대부분이 글자색/배경색 양 끝에 몰린(이봉 분포) 셀을 찾은 뒤,
+# 그런 셀이 가로로 이어진 덩어리(글자 줄)가 충분히 있을 때만 OCR을 실행
+DETECT_WIDTH = 640
+# 긴 스크린샷은 가로 기준으로 축소하되 검출기 입력 픽셀 수는 이 값으로 제한
+DETECT_MAX_PIXELS = 2_000_000
+DETECT_CELL = 16
+EDGE_THRESHOLD = 40
+CELL_DENSITY_RANGE = (0.06, 0.45)
+# 셀 밝기 범위의 양 끝 25% 안에 드는 픽셀 비율 (나뭇결/노이즈 같은 질감은 이 값이 낮음)
+MIN_CELL_BIMODALITY = 0.8
+MIN_RUN_CELLS = 3
+MIN_TEXT_RUNS = 1
+
+# 실측 OCR 시간이 아직 없을 때 쓰는 추정치. 이 값으로 계산한 절약 시간은 estimated_seconds_saved에만 누적
+DEFAULT_OCR_SECONDS = 2.0
+
+
+def cap_pixels(image: Image.Image, max_pixels: int = OCR_MAX_PIXELS) -> Image.Image:
+    width, height = image.size
+    if width * height <= max_pixels:
+        return image
+    scale = (max_pixels / float(width * height)) ** 0.5
+    return image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.BILINEAR)
+
+
+def detect_text(image: Image.Image) -> Tuple[bool, int]:
+    """
+    글자가 있을 법한 이미지인지 빠르게 판정합니다. (판정, 글자 줄 후보 수)를 반환합니다.
+    오탐(글자 없는 이미지에 OCR 실행)은 비용만 들지만 미탐은 텍스트를 잃으므로 기준을 느슨하게 둡니다.
+    """
+    gray = image.convert("L")
+    width, height = gray.size
+    scale = min(1.0, DETECT_WIDTH / float(width), (DETECT_MAX_PIXELS / float(width * height)) ** 0.5)
+    if scale < 1.0:
+        gray = gray.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    if pixels.shape[0] < DETECT_CELL or pixels.shape[1] < DETECT_CELL + 1:
+        return True, 0
+    edges = np.abs(np.diff(pixels, axis=1)) > EDGE_THRESHOLD
+    rows, cols = edges.shape[0] // DETECT_CELL, edges.shape[1] // DETECT_CELL
+    density = edges[:rows * DETECT_CELL, :cols * DETECT_CELL].reshape(rows, DETECT_CELL, cols, DETECT_CELL).mean(axis=(1, 3))
+
+    blocks = pixels[:rows * DETECT_CELL, :cols * DETECT_CELL].reshape(rows, DETECT_CELL, cols, DETECT_CELL)
+    low = blocks.min(axis=(1, 3), keepdims=True)
+    high = blocks.max(axis=(1, 3), keepdims=True)
+    margin = (high - low) / 4.0
+    extremes = ((blocks <= low + margin) | (blocks >= high - margin)).mean(axis=(1, 3))
+
+    text_like = (density >= CELL_DENSITY_RANGE[0]) & (density <= CELL_DENSITY_RANGE[1]) & (extremes >= MIN_CELL_BIMODALITY)
+
+    # 가로로 MIN_RUN_CELLS개 이상 이어진 셀 덩어리 = 글자 줄 후보
+    runs = 0
+    for row in text_like:
+        length = 0
+        for flag in row:
+            if flag:
+                length += 1
+                continue
+            runs += length >= MIN_RUN_CELLS
+            length = 0
+        runs += length >= MIN_RUN_CELLS
+    return runs >= MIN_TEXT_RUNS, runs
+
+
+class OcrEngine:
+    """
+    OCR 실행기. OCR 스테이지 워커 스레드마다 Tesseract 엔진(tesserocr)을 하나씩 유지해 재사용하고,
+    tesserocr가 없으면 pytesseract(호출마다 tesseract 프로세스 실행)로 동작합니다.
+    실제 OCR 시간의 평균을 기록해 검출기로 건너뛰거나 캐시로 대체한 파일의 절약 시간을 계산합니다.
+    """
+
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ocr_seconds: Optional[float] = None
+        self._counters = {"ocr_runs": 0, "skipped_no_text": 0, "cache_hits": 0, "downscaled": 0, "seconds_saved": 0.0,
+                          "unmeasured_skips": 0, "estimated_seconds_saved": 0.0}
+
+    @property
+    def backend(self) -> str:
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self._local.api = api
+        return api
+
+    def recognize(self, image: Image.Image) -> str:
+        """크기 제한을 적용해 OCR을 실행하고, 걸린 시간을 평균에 반영합니다."""
+        capped = cap_pixels(image)
+        if capped is not image:
+            with self._lock:
+                self._counters["downscaled"] += 1
+        started = time.monotonic()
+        if tesserocr is not None:
+            api = self._api()
+            api.SetImage(capped)
+            text = api.GetUTF8Text()
+        else:
+            text = pytesseract.image_to_string(capped, lang=self.lang)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._counters["ocr_runs"] += 1
+            self._ocr_seconds = elapsed if self._ocr_seconds is None else 0.9 * self._ocr_seconds + 0.1 * elapsed
+        return text.strip()
+
+    def record_saved(self, reason: str, overhead: float = 0.0) -> Optional[float]:
+        """
+        OCR을 건너뛴 파일의 절약 시간(평균 OCR 시간 - 검출/조회 비용)을 누적하고 반환합니다.
+        실제 OCR을 한 번도 측정하지 못했다면 seconds_saved에 넣지 않고 None을 반환합니다.
+        (DEFAULT_OCR_SECONDS 기준 값은 unmeasured_skips/estimated_seconds_saved에 따로 집계)
+        """
+        with self._lock:
+            self._counters[reason] += 1
+            if self._ocr_seconds is None:
+                self._counters["unmeasured_skips"] += 1
+                self._counters["estimated_seconds_saved"] += max(0.0, DEFAULT_OCR_SECONDS - overhead)
+                return None
+            saved = max(0.0, self._ocr_seconds - overhead)
+            self._counters["seconds_saved"] += saved
+        return saved
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "avg_ocr_seconds": round(self._ocr_seconds, 3) if self._ocr_seconds is not None else None,
+                **{k: round(v, 1) if isinstance(v, float) else v for k, v in self._counters.items()}
+            }
+
+
+# 싱글톤 인스턴스 생성
+ocr_engine = OcrEngine()
@@ -0,0 +1,386 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from metrics import metrics
+from llm_ledger import llm_ledger, COLD_LOAD_MS
+
+logger = logging.getLogger("mcp_vision_server.ollama_client")
+
+# 로컬 스텁 서버 등으로 바꿔 끼울 수 있도록 환경 변수 OLLAMA_HOST를 따름
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+if not OLLAMA_HOST.startswith("http"):
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+
+DEFAULT_TIMEOUT = 90
+DEFAULT_RETRIES = 2
+# 동시에 Ollama로 보낼 수 있는 요청 수 (관측된 지연 시간에 따라 1 ~ MAX_IN_FLIGHT 사이에서 자동 조절)
+MAX_IN_FLIGHT = 4
+# 기준선 대비 이 값(초) 이상 느려졌을 때만 한도를 줄임 (짧은 요청의 측정 노이즈 무시)
+LATENCY_SLACK = 1.0
+# 기준선이 관측마다 최근 지연(EWMA) 쪽으로 다가가는 비율 (한 번 본 가장 빠른 응답에 고정되지 않도록)
+BASELINE_DECAY = 0.02
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 15.0
+# 연속 실패가 이 횟수를 넘으면 일정 시간 동안 요청을 즉시 거절 (Ollama가 꺼져 있을 때 90초씩 기다리지 않도록)
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+REQUESTS = metrics.counter("ollama_requests_total", "Ollama HTTP attempts by model and outcome (ok, retryable_error, rejected, circuit_open)")
+REQUEST_SECONDS = metrics.histogram("ollama_request_seconds", "Latency of successful Ollama requests")
+TOKENS = metrics.counter("ollama_tokens_total", "Tokens reported by Ollama, by model and kind (prompt, output)")
+COLD_LOADS = metrics.counter("ollama_cold_loads_total", "Calls where Ollama had to load the model into memory first")
+
+
+class OllamaError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        # HTTP 상태 코드 (404 = 모델이 설치되어 있지 않음)
+        self.status = status
+
+
+class CircuitOpenError(OllamaError):
+    pass
+
+
+def _caller_site() -> str:
+    """call_site를 지정하지 않은 호출의 위치 (이 모듈 밖의 첫 호출자 module.function)."""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+class _LatencyTrack:
+    def __init__(self, latency: float):
+        self.ewma = latency
+        self.baseline = latency
+
+
+class AdaptiveLimiter:
+    """
+    전역 동시 요청 한도. 요청 지연이 그 모델의 기준선의 2배를 넘으면 한도를 줄이고,
+    기준선 근처로 돌아오면 다시 늘립니다 (AIMD 방식).
+    텍스트 분류와 비전 모델은 지연 규모가 다르므로 기준선과 EWMA는 모델별로 따로 유지합니다.
+    """
+
+    def __init__(self, max_limit: int = MAX_IN_FLIGHT, min_limit: int = 1):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self._tracks: Dict[str, _LatencyTrack] = {}
+        self._since_adjust = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < self.limit, timeout=timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float] = None, model: str = ""):
+        with self._cond:
+            self.in_flight -= 1
+            if latency is not None:
+                self._observe(latency, model)
+            self._cond.notify_all()
+
+    def _observe(self, latency: float, model: str):
+        track = self._tracks.get(model)
+        if track is None:
+            track = self._tracks[model] = _LatencyTrack(latency)
+        track.ewma = 0.8 * track.ewma + 0.2 * latency
+        # 기준선은 더 빠른 응답이 오면 내려가고, 그 외에는 최근 지연 쪽으로 천천히 따라감
+        # (모델 교체, 프롬프트 길이 변화, 한 번의 우연히 빠른 응답에 적응)
+        if latency < track.baseline:
+            track.baseline = latency
+        else:
+            track.baseline += (track.ewma - track.baseline) * BASELINE_DECAY
+        # 현재 한도만큼 요청이 끝난 뒤에만 다시 조절 (한 번의 느린 요청으로 급락하지 않도록)
+        self._since_adjust += 1
+        if self._since_adjust < self.limit:
+            return
+        self._since_adjust = 0
+        if track.ewma > track.baseline * 2 + LATENCY_SLACK and self.limit > self.min_limit:
+            self.limit -= 1
+            logger.info(f"Ollama in-flight limit decreased to {self.limit} ({model} latency {track.ewma:.1f}s)")
+        elif track.ewma < track.baseline * 1.3 + LATENCY_SLACK and self.limit < self.max_limit:
+            self.limit += 1
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self.in_flight,
+                    "latency_ewma": {model: round(t.ewma, 3) for model, t in self._tracks.items()}}
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        # half-open 상태에서 시험 요청 하나가 진행 중인지. 결과가 기록될 때까지 다른 요청은 막음
+        self.half_open_probe = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.cooldown:
+                return False
+            # 쿨다운이 지나면 half-open: 요청 하나만 흘려보내 상태를 확인
+            # (결과를 기록하지 못하고 끝난 시험 요청은 쿨다운이 한 번 더 지나면 다시 시도)
+            if self.half_open_probe and now - self._probe_started < self.cooldown:
+                return False
+            self.half_open_probe = True
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.half_open_probe = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.half_open_probe = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Ollama circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+
+class OllamaClient:
+    """
+    모든 Ollama 호출이 공유하는 클라이언트.
+    커넥션 재사용(requests.Session), 전역 동시 요청 한도, jitter 지수 백오프 재시도, 서킷 브레이커,
+    스트리밍 응답을 제공하며, 동기 메서드와 asyncio 메서드를 모두 지원합니다.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_HOST, max_in_flight: int = MAX_IN_FLIGHT,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = AdaptiveLimiter(max_in_flight)
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(2, max_in_flight * 2))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, model: str, prompt: str, images: Optional[List[str]], stream: bool, options: Dict) -> Dict:
+        payload = {"model": model, "prompt": prompt, "stream": stream}
+        if images:
+            payload["images"] = images
+        payload.update(options)
+        return payload
+
+    @staticmethod
+    def _backoff(attempt: int):
+        time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))))
+
+    def _check_breaker(self, model: str):
+        if not self.breaker.allow():
+            REQUESTS.inc(model=model, outcome="circuit_open")
+            raise CircuitOpenError(f"Ollama circuit is open ({self.base_url}); skipping request")
+
+    def _post(self, path: str, payload: Dict, timeout: float, stream: bool = False) -> requests.Response:
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=timeout, stream=stream)
+        if response.status_code >= 400:
+            body = response.text[:200]
+            response.close()
+            if response.status_code in RETRYABLE_STATUS:
+                raise requests.HTTPError(f"HTTP {response.status_code} from Ollama: {body}")
+            raise OllamaError(f"HTTP {response.status_code} from Ollama: {body}", response.status_code)
+        return response
+
+    def _record(self, site: str, model: str, response: Optional[Dict], started: float,
+                images: Optional[List[str]], error: Optional[Exception] = None):
+        """호출 단위(재시도 포함) 기록을 LLM ledger와 토큰 지표에 남깁니다."""
+        llm_ledger.record(site, model, response, time.monotonic() - started, len(images or []),
+                          str(error) if error else None)
+        if response:
+            TOKENS.inc(response.get("prompt_eval_count", 0), model=model, kind="prompt")
+            TOKENS.inc(response.get("eval_count", 0), model=model, kind="output")
+            if response.get("load_duration", 0) / 1_000_000 >= COLD_LOAD_MS:
+                COLD_LOADS.inc(model=model)
+
+    def generate(self, model: str, prompt: str, images: Optional[List[str]] = None,
+                 timeout: Optional[float] = None, retries: Optional[int] = None,
+                 call_site: Optional[str] = None, **options) -> Dict:
+        """
+        /api/generate (stream=False) 호출. 응답 JSON 전체(토큰 수/소요 시간 필드 포함)를 반환합니다.
+        call_site는 LLM ledger에 남는 호출 위치 이름입니다 (생략하면 호출한 함수 이름).
+        """
+        site = call_site or _caller_site()
+        started = time.monotonic()
+        try:
+            result = self._generate(model, prompt, images, timeout, retries, options)
+        except OllamaError as e:
+            self._record(site, model, None, started, images, e)
+            raise
+        self._record(site, model, result, started, images)
+        return result
+
+    def _generate(self, model: str, prompt: str, images: Optional[List[str]],
+                  timeout: Optional[float], retries: Optional[int], options: Dict) -> Dict:
+        timeout = timeout or self.timeout
+        attempts = max(1, retries if retries is not None else self.retries)
+        payload = self._payload(model, prompt, images, False, options)
+        last_error = None
+        for attempt in range(attempts):
+            self._check_breaker(model)
+            self.limiter.acquire()
+            started = time.monotonic()
+            latency = None
+            try:
+                response = self._post("/api/generate", payload, timeout)
+                result = response.json()
+                latency = time.monotonic() - started
+                self.breaker.record_success()
+                REQUESTS.inc(model=model, outcome="ok")
+                REQUEST_SECONDS.observe(latency, model=model)
+                return result
+            except OllamaError:
+                # 4xx 등 재시도해도 같은 결과인 오류
+                self.breaker.record_success()
+                REQUESTS.inc(model=model, outcome="rejected")
+                raise
+            except (requests.RequestException, ValueError) as e:
+                last_error = e
+                self.breaker.record_failure()
+                REQUESTS.inc(model=model, outcome="retryable_error")
+                logger.warning(f"Ollama request failed (attempt {attempt + 1}/{attempts}, model {model}): {e}")
+            finally:
+                self.limiter.release(latency, model)
+            if attempt < attempts - 1:
+                self._backoff(attempt)
+        raise OllamaError(f"Ollama request failed after {attempts} attempts: {last_error}")
+
+    def stream_generate(self, model: str, prompt: str, images: Optional[List[str]] = None,
+                        timeout: Optional[float] = None, retries: Optional[int] = None,
+                        call_site: Optional[str] = None, **options) -> Iterator[Dict]:
+        """/api/generate (stream=True) 호출. Ollama가 보내는 NDJSON 청크를 하나씩 yield 합니다 (마지막 청크에 done=True)."""
+        site = call_site or _caller_site()
+        started = time.monotonic()
+        final = None
+        try:
+            for chunk in self._stream_generate(model, prompt, images, timeout, retries, options):
+                if chunk.get("done"):
+                    # 토큰 수/소요 시간 필드는 마지막 청크에만 들어 있음
+                    final = chunk
+                yield chunk
+        except OllamaError as e:
+            self._record(site, model, None, started, images, e)
+            raise
+        self._record(site, model, final, started, images)
+
+    def _stream_generate(self, model: str, prompt: str, images: Optional[List[str]],
+                         timeout: Optional[float], retries: Optional[int], options: Dict) -> Iterator[Dict]:
+        timeout = timeout or self.timeout
+        attempts = max(1, retries if retries is not None else self.retries)
+        payload = self._payload(model, prompt, images, True, options)
+        last_error = None
+        for attempt in range(attempts):
+            self._check_breaker(model)
+            self.limiter.acquire()
+            started = time.monotonic()
+            latency = None
+            yielded = False
+            try:
+                response = self._post("/api/generate", payload, timeout, stream=True)
+                with response:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        yielded = True
+                        yield chunk
+                        if chunk.get("done"):
+                            break
+                latency = time.monotonic() - started
+                self.breaker.record_success()
+                REQUESTS.inc(model=model, outcome="ok")
+                REQUEST_SECONDS.observe(latency, model=model)
+                return
+            except OllamaError:
+                self.breaker.record_success()
+                REQUESTS.inc(model=model, outcome="rejected")
+                raise
+            except (requests.RequestException, ValueError) as e:
+                last_error = e
+                self.breaker.record_failure()
+                REQUESTS.inc(model=model, outcome="retryable_error")
+                # 이미 일부를 내보낸 스트림은 재시도하면 중복되므로 그대로 실패 처리
+                if yielded:
+                    raise OllamaError(f"Ollama stream interrupted: {e}")
+                logger.warning(f"Ollama stream failed (attempt {attempt + 1}/{attempts}, model {model}): {e}")
+            finally:
+                self.limiter.release(latency, model)
+            if attempt < attempts - 1:
+                self._backoff(attempt)
+        raise OllamaError(f"Ollama stream failed after {attempts} attempts: {last_error}")
+
+    async def agenerate(self, model: str, prompt: str, images: Optional[List[str]] = None, **kwargs) -> Dict:
+        return await asyncio.to_thread(self.generate, model, prompt, images, **kwargs)
+
+    async def astream_generate(self, model: str, prompt: str, images: Optional[List[str]] = None, **kwargs) -> AsyncIterator[Dict]:
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def pump():
+            try:
+                for chunk in self.stream_generate(model, prompt, images, **kwargs):
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+        task = loop.run_in_executor(None, pump)
+        while True:
+            item = await chunks.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await task
+
+    def stats(self) -> Dict:
+        return {"breaker": self.breaker.state, **self.limiter.stats()}
+
+
+# 싱글톤 인스턴스 생성
+ollama = OllamaClient()
+
+metrics.callback("ollama_in_flight", "Ollama requests currently in flight", lambda: ollama.limiter.stats()["in_flight"])
+metrics.callback("ollama_in_flight_limit", "Current adaptive concurrency limit for Ollama", lambda: ollama.limiter.stats()["limit"])
+metrics.callback("ollama_circuit_open", "1 while the Ollama circuit breaker is open", lambda: int(ollama.breaker.state == "open"))
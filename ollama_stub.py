@@ -0,0 +1,213 @@
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import logging
+import threading
+import http.server
+from collections import Counter
+from typing import Dict, List, Optional
+from taxonomy import VALID_CATEGORIES
+
+logger = logging.getLogger("mcp_vision_server.ollama_stub")
+
+# 실제 Ollama 없이 수집 파이프라인을 측정하기 위한 /api/generate 스텁 서버.
+# 응답 내용은 프롬프트 해시로 결정되므로 같은 입력에는 항상 같은 태그가 나옵니다.
+DEFAULT_TEXT_LATENCY = 0.3
+DEFAULT_VISION_LATENCY = 1.5
+DEFAULT_JITTER = 0.2
+# 프롬프트 평가 속도와 이미지 한 장의 토큰 수 (LLaVA 1.5 기준 576)
+PROMPT_TOKENS_PER_SEC = 1000.0
+IMAGE_TOKENS = 576
+
+# 이 모듈은 ollama_client를 import하지 않아야 함 (벤치마크가 OLLAMA_HOST를 정한 뒤에 클라이언트를 import)
+def _estimate_tokens(text: str) -> int:
+    """prompt_builder.estimate_tokens와 같은 대략값: ASCII 4자당 1토큰, 비ASCII 1자당 1토큰."""
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return -(-ascii_chars // 4) + (len(text) - ascii_chars)
+
+
+_TAG_POOL = [c for c in VALID_CATEGORIES if c != "미분류"]
+
+
+def _pick_tags(prompt: str, count: int) -> list:
+    rng = random.Random(hashlib.md5(prompt.encode("utf-8")).hexdigest())
+    return rng.sample(_TAG_POOL, count)
+
+
+def parse_model_latency(items: List[str]) -> Dict[str, float]:
+    """['moondream=0.4', ...] -> {'moondream': 0.4}"""
+    result = {}
+    for item in items:
+        model, _, seconds = item.rpartition("=")
+        result[model] = float(seconds)
+    return result
+
+
+class StubState:
+    def __init__(self, text_latency: float, vision_latency: float, jitter: float, cold_load: float,
+                 model_latency: Optional[Dict[str, float]] = None):
+        self.text_latency = text_latency
+        self.vision_latency = vision_latency
+        # 모델별 기본 지연 (작은 triage 모델 등). 없으면 text/vision 기본값
+        self.model_latency = model_latency or {}
+        self.jitter = jitter
+        self.cold_load = cold_load
+        self.loaded_models = set()
+        self.last_system: Dict[str, str] = {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {"total": sum(self.calls.values()), "by_kind": dict(self.calls)}
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    state: StubState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.state.snapshot())
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": m} for m in sorted(self.state.loaded_models)]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "")
+        system = request.get("system", "")
+        prompt = request.get("prompt", "")
+        images = request.get("images") or []
+        state = self.state
+
+        kind = "vision" if images else "text"
+        with state.lock:
+            state.calls[f"{model}:{kind}"] += 1
+            cold = model not in state.loaded_models
+            state.loaded_models.add(model)
+            # Ollama처럼 직전 요청과 같은 system 접두부는 KV 캐시를 재사용해 다시 평가하지 않음
+            cached_prefix = state.last_system.get(model) == system and bool(system)
+            state.last_system[model] = system
+        prompt_tokens = _estimate_tokens(prompt) + IMAGE_TOKENS * len(images)
+        if not cached_prefix:
+            prompt_tokens += _estimate_tokens(system)
+        prompt_seconds = prompt_tokens / PROMPT_TOKENS_PER_SEC
+        load = state.cold_load if cold else 0.001
+        base = state.model_latency.get(model, state.vision_latency if images else state.text_latency)
+        latency = base + random.uniform(0, state.jitter)
+
+        if images:
+            tags = _pick_tags(prompt, 3)
+            text = f"DESCRIPTION: Synthetic benchmark description of a space with {tags[0]} character.\nTAGS: {', '.join(tags)}"
+        elif not prompt.strip():
+            text = ""
+        else:
+            text = ", ".join(_pick_tags(prompt, 2))
+        if "CONFIDENCE" in system + prompt:
+            # vision_cascade 앞 단계 형식: 신뢰도도 프롬프트 해시로 고정 (약 절반이 상향되도록 40~100)
+            tags = _pick_tags(prompt, 2)
+            confidence = 40 + int(hashlib.md5(prompt.encode("utf-8")).hexdigest()[:4], 16) % 61
+            text = f"DESCRIPTION: Synthetic triage description.\nTAGS: {', '.join(tags)}\nCONFIDENCE: {confidence}"
+        eval_count = max(1, len(text) // 4)
+        timings = {
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": eval_count,
+            "load_duration": int(load * 1e9),
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_duration": int(latency * 1e9),
+            "total_duration": int((load + prompt_seconds + latency) * 1e9),
+        }
+
+        # 첫 토큰까지: 모델 로드 + 프롬프트 평가, 이후 생성 시간
+        time.sleep(load + prompt_seconds)
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+            for piece in pieces:
+                self._write_chunk(json.dumps({"model": model, "response": piece, "done": False}, ensure_ascii=False) + "\n")
+                self.wfile.flush()
+                time.sleep(latency / len(pieces))
+            self._write_chunk(json.dumps({"model": model, "response": "", **timings}) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            time.sleep(latency)
+            self._send_json(200, {"model": model, "response": text, **timings})
+
+    def _write_chunk(self, data: str):
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):X}\r\n".encode("ascii") + raw + b"\r\n")
+
+
+class OllamaStub:
+    """백그라운드 스레드에서 동작하는 스텁 서버. port=0이면 빈 포트를 자동으로 고릅니다."""
+
+    def __init__(self, port: int = 0, text_latency: float = DEFAULT_TEXT_LATENCY,
+                 vision_latency: float = DEFAULT_VISION_LATENCY, jitter: float = DEFAULT_JITTER,
+                 cold_load: float = 0.0, model_latency: Optional[Dict[str, float]] = None):
+        self.state = StubState(text_latency, vision_latency, jitter, cold_load, model_latency)
+        handler = type("StubHandler", (_StubHandler,), {"state": self.state})
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "OllamaStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        logger.info(f"Ollama stub listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict:
+        return self.state.snapshot()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ollama /api/generate stub for ingestion benchmarks")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--text-latency", type=float, default=DEFAULT_TEXT_LATENCY)
+    parser.add_argument("--vision-latency", type=float, default=DEFAULT_VISION_LATENCY)
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER)
+    parser.add_argument("--cold-load", type=float, default=0.0, help="seconds added to the first call per model")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="base latency for one model (repeatable), e.g. moondream=0.4")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    stub = OllamaStub(args.port, args.text_latency, args.vision_latency, args.jitter, args.cold_load,
+                      parse_model_latency(args.model_latency)).start()
+    print(f"Ollama stub running at {stub.url} (set OLLAMA_HOST={stub.url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+        sys.exit(0)
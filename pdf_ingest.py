@@ -0,0 +1,122 @@
+import os
+import atexit
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+import fitz  # PyMuPDF
+
+logger = logging.getLogger("mcp_vision_server.pdf_ingest")
+
+# 페이지 텍스트 추출 프로세스 수 (fitz 문서 객체는 프로세스 간에 넘길 수 없으므로 각 워커가 파일을 직접 엶)
+PDF_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# 이보다 페이지가 적은 PDF는 프로세스 풀을 쓰지 않음 (프로세스 왕복 비용이 더 큼)
+PARALLEL_MIN_PAGES = 16
+MIN_PAGES_PER_TASK = 8
+
+# 청크 문서 최대 길이 (임베딩 모델이 잘라내지 않는 수준)
+CHUNK_CHARS = 1200
+# 분류에 보내는 대표 샘플 크기: 앞부분(제목/초록/목차) + 문서 전반에서 고르게 뽑은 구간
+CLASSIFY_SAMPLE_CHARS = 4000
+SAMPLE_HEAD_CHARS = 1500
+SAMPLE_SLICE_CHARS = 400
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+            atexit.register(_pool.shutdown, wait=False)
+        return _pool
+
+
+def _extract_page_range(args: Tuple[str, int, int]) -> List[Tuple[int, str]]:
+    """[워커 프로세스] start 이상 end 미만 페이지의 텍스트를 추출합니다."""
+    filepath, start, end = args
+    with fitz.open(filepath) as doc:
+        return [(n, doc[n].get_text()) for n in range(start, end)]
+
+
+def extract_pdf_pages(filepath: str) -> List[str]:
+    """페이지별 텍스트 목록을 반환합니다. 페이지가 많으면 구간을 나눠 프로세스 풀에서 병렬로 추출합니다."""
+    with fitz.open(filepath) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or PDF_WORKERS == 1:
+            return [page.get_text() for page in doc]
+
+    per_task = max(MIN_PAGES_PER_TASK, -(-page_count // (PDF_WORKERS * 2)))
+    ranges = [(filepath, start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+    pages = [""] * page_count
+    for chunk in _get_pool().map(_extract_page_range, ranges):
+        for n, text in chunk:
+            pages[n] = text
+    return pages
+
+
+def _split_long(text: str, limit: int) -> List[str]:
+    """문단 경계에서 limit 이하로 나눕니다. 한 문단이 limit보다 길면 강제로 자릅니다."""
+    pieces, current = [], ""
+    for para in text.split("\n"):
+        while len(para) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(para[:limit])
+            para = para[limit:]
+        if current and len(current) + len(para) + 1 > limit:
+            pieces.append(current)
+            current = para
+        else:
+            current = f"{current}\n{para}" if current else para
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def chunk_pages(pages: List[str], max_chars: int = CHUNK_CHARS) -> List[Dict]:
+    """
+    페이지 텍스트를 검색용 청크로 나눕니다. 짧은 연속 페이지는 한 구간으로 합치고 긴 페이지는 문단 단위로 나눕니다.
+    각 청크는 {"text", "page_start", "page_end"} (1부터 시작하는 페이지 번호)입니다.
+    """
+    chunks: List[Dict] = []
+    section, section_start = "", None
+    for n, raw in enumerate(pages, start=1):
+        text = raw.strip()
+        if not text:
+            continue
+        if len(text) > max_chars:
+            if section:
+                chunks.append({"text": section, "page_start": section_start, "page_end": n - 1})
+                section, section_start = "", None
+            chunks.extend({"text": piece, "page_start": n, "page_end": n} for piece in _split_long(text, max_chars))
+            continue
+        if section and len(section) + len(text) + 1 > max_chars:
+            chunks.append({"text": section, "page_start": section_start, "page_end": n - 1})
+            section, section_start = "", None
+        if not section:
+            section_start = n
+        section = f"{section}\n{text}" if section else text
+    if section:
+        chunks.append({"text": section, "page_start": section_start, "page_end": len(pages)})
+    return chunks
+
+
+def representative_sample(chunks: List[Dict], budget: int = CLASSIFY_SAMPLE_CHARS) -> str:
+    """
+    분류/대표 문서용 텍스트 샘플. 전체가 budget 이하이면 그대로, 아니면 앞부분과
+    나머지 청크에서 고르게 뽑은 구간을 이어 붙여 budget 이하로 만듭니다.
+    """
+    texts = [c["text"] for c in chunks if c["text"].strip()]
+    if sum(len(t) + 1 for t in texts) <= budget:
+        return "\n".join(texts)
+    parts = [texts[0][:SAMPLE_HEAD_CHARS]]
+    rest = texts[1:]
+    slots = min(len(rest), max(1, (budget - len(parts[0])) // (SAMPLE_SLICE_CHARS + 5)))
+    step = len(rest) / slots if slots else 0
+    for i in range(slots):
+        parts.append(rest[int(i * step)][:SAMPLE_SLICE_CHARS])
+    return "\n...\n".join(parts)[:budget]
@@ -0,0 +1,97 @@
+import logging
+import threading
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mcp_vision_server.phash_index")
+
+HASH_BITS = 64
+# 64비트 해시를 16비트 조각 4개로 나눠 조각별 해시 테이블을 둡니다 (Multi-Index Hashing)
+CHUNK_COUNT = 4
+CHUNK_BITS = HASH_BITS // CHUNK_COUNT
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNK_COUNT)]
+
+
+def _variants(chunk: int, radius: int) -> List[int]:
+    """chunk에서 radius 비트 이하로 다른 모든 값."""
+    out = [chunk]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            v = chunk
+            for b in bits:
+                v ^= 1 << b
+            out.append(v)
+    return out
+
+
+class PHashIndex:
+    """
+    64비트 perceptual hash에 대한 해밍 거리 인덱스.
+    거리 r 이내의 두 해시는 비둘기집 원리에 의해 적어도 한 조각이 r // CHUNK_COUNT 비트 이내로 같으므로,
+    각 조각 테이블에서 그 범위의 변형만 조회한 뒤 후보만 실제 거리로 검증합니다. (전수 비교 없음)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(CHUNK_COUNT)]
+        self._hashes = set()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    @staticmethod
+    def parse(hash_hex: str) -> Optional[int]:
+        if len(hash_hex) != HASH_BITS // 4:
+            return None
+        try:
+            return int(hash_hex, 16)
+        except ValueError:
+            return None
+
+    def add(self, hash_hex: str) -> bool:
+        value = self.parse(hash_hex)
+        if value is None:
+            return False
+        with self._lock:
+            if value in self._hashes:
+                return False
+            self._hashes.add(value)
+            for table, chunk in zip(self._tables, _chunks(value)):
+                table.setdefault(chunk, []).append(value)
+        return True
+
+    def add_many(self, hash_hexes) -> int:
+        return sum(1 for h in hash_hexes if self.add(h))
+
+    def search(self, hash_hex: str, radius: int) -> List[Tuple[int, str]]:
+        """radius 이내의 (거리, 해시) 목록을 가까운 순으로 반환합니다."""
+        value = self.parse(hash_hex)
+        if value is None:
+            return []
+        sub_radius = radius // CHUNK_COUNT
+        candidates = set()
+        with self._lock:
+            for table, chunk in zip(self._tables, _chunks(value)):
+                for v in _variants(chunk, sub_radius):
+                    bucket = table.get(v)
+                    if bucket:
+                        candidates.update(bucket)
+        matches = []
+        for c in candidates:
+            d = hamming(value, c)
+            if d <= radius:
+                matches.append((d, f"{c:0{HASH_BITS // 4}x}"))
+        matches.sort()
+        return matches
+
+    def nearest(self, hash_hex: str, radius: int) -> Optional[Tuple[int, str]]:
+        matches = self.search(hash_hex, radius)
+        return matches[0] if matches else None
@@ -0,0 +1,187 @@
+import os
+import re
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mcp_vision_server.post_scheduler")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+_SLIDE_RE = re.compile(r'_(\d+)\.(png|jpg|jpeg)$')
+
+
+def parse_shortcode(filename: str) -> Optional[str]:
+    """ig_<shortcode>_<timestamp>[_<slide>].<ext> 형식 파일명에서 인스타그램 shortcode를 추출합니다."""
+    if filename.startswith("ig_"):
+        parts = filename.split('_')
+        if len(parts) >= 2:
+            return parts[1]
+    return None
+
+
+def slide_index(filepath: str) -> int:
+    match = _SLIDE_RE.search(filepath.lower())
+    return int(match.group(1)) if match else 0
+
+
+class _PostGroup:
+    def __init__(self):
+        self.txt_pending = 0
+        self.representative: Optional[str] = None
+        self.representative_done = False
+        self.waiting: List[Tuple[str, Future]] = []
+        self.outstanding = 0
+
+
+class PostScheduler:
+    """
+    인스타그램 게시물(shortcode) 단위로 파일 투입 순서를 조정합니다.
+    본문 .txt를 먼저 처리해 태그/본문 캐시를 채운 뒤 대표 슬라이드 한 장만 비전 분석에 보내고,
+    나머지 슬라이드는 대표 슬라이드가 끝난 다음 투입해 그 결과(Carousel 상속)를 재사용하게 합니다.
+    """
+
+    def __init__(self, submit: Callable[[str], Future], resolved: Optional[Callable[[str], bool]] = None):
+        self._submit = submit
+        # 대표 슬라이드가 끝난 뒤 나머지 슬라이드가 상속할 분석 결과가 있는지 (없으면 파이프라인 결과만으로 판단)
+        self._resolved = resolved
+        self._groups: Dict[str, _PostGroup] = {}
+        self._lock = threading.Lock()
+        # 완료 콜백은 파이프라인 워커 스레드에서 불리므로, 대기 슬라이드 투입은 별도 스레드가 담당 (Backpressure로 인한 교착 방지)
+        self._releases: "queue.Queue[Tuple[str, str, Future, bool]]" = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="post-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, filepath: str) -> Future:
+        return self.submit_many([filepath])[0][1]
+
+    def submit_many(self, filepaths: List[str]) -> List[Tuple[str, Future]]:
+        """파일 목록을 투입합니다. 같은 게시물의 .txt가 목록에 있으면 이미지보다 먼저 처리되도록 대기시킵니다."""
+        texts = [p for p in filepaths if p.lower().endswith(".txt")]
+        others = [p for p in filepaths if not p.lower().endswith(".txt")]
+        with self._lock:
+            for filepath in texts:
+                shortcode = parse_shortcode(os.path.basename(filepath))
+                if shortcode:
+                    self._group(shortcode).txt_pending += 1
+        futures = [(p, self._route_text(p)) for p in texts]
+        futures += [(p, self._route_other(p)) for p in others]
+        return futures
+
+    def _group(self, shortcode: str) -> _PostGroup:
+        group = self._groups.get(shortcode)
+        if group is None:
+            group = self._groups[shortcode] = _PostGroup()
+        return group
+
+    def _route_text(self, filepath: str) -> Future:
+        shortcode = parse_shortcode(os.path.basename(filepath))
+        if not shortcode:
+            return self._submit(filepath)
+        with self._lock:
+            self._group(shortcode).outstanding += 1
+        future = self._submit(filepath)
+        future.add_done_callback(lambda f, s=shortcode: self._on_text_done(s))
+        return future
+
+    def _route_other(self, filepath: str) -> Future:
+        shortcode = parse_shortcode(os.path.basename(filepath))
+        if not shortcode or not filepath.lower().endswith(IMAGE_EXTENSIONS):
+            return self._submit(filepath)
+        with self._lock:
+            group = self._group(shortcode)
+            group.outstanding += 1
+            if group.representative_done:
+                is_representative = False
+                waiting = None
+            elif group.representative is None and group.txt_pending == 0:
+                group.representative = filepath
+                is_representative = True
+                waiting = None
+            else:
+                waiting = Future()
+                group.waiting.append((filepath, waiting))
+        if waiting is not None:
+            return waiting
+        return self._dispatch(shortcode, filepath, is_representative)
+
+    def _dispatch(self, shortcode: str, filepath: str, is_representative: bool) -> Future:
+        if is_representative:
+            logger.info(f"Carousel representative slide for {shortcode}: {os.path.basename(filepath)}")
+        future = self._submit(filepath)
+        future.add_done_callback(lambda f, s=shortcode, r=is_representative: self._on_image_done(s, r, f))
+        return future
+
+    def _promote_representative(self, shortcode: str, group: _PostGroup):
+        """대기 중인 슬라이드 중 번호가 가장 작은 이미지를 대표로 선정해 투입합니다."""
+        group.waiting.sort(key=lambda item: slide_index(item[0]))
+        filepath, proxy = group.waiting.pop(0)
+        group.representative = filepath
+        self._releases.put((shortcode, filepath, proxy, True))
+
+    def _on_text_done(self, shortcode: str):
+        with self._lock:
+            group = self._groups.get(shortcode)
+            if group is None:
+                return
+            group.txt_pending -= 1
+            if group.txt_pending == 0 and group.representative is None and group.waiting:
+                # 본문 캐시가 준비되었으므로 대표 슬라이드 선정
+                self._promote_representative(shortcode, group)
+            self._finish(shortcode, group)
+
+    def _on_image_done(self, shortcode: str, is_representative: bool, future: Future):
+        # 저장은 되었어도 비전 분석이 실패했거나 미분류이면 상속할 결과가 없으므로 실패로 봄
+        succeeded = is_representative and _succeeded(future) and (self._resolved is None or self._resolved(shortcode))
+        with self._lock:
+            group = self._groups.get(shortcode)
+            if group is None:
+                return
+            if is_representative:
+                if succeeded:
+                    group.representative_done = True
+                    for filepath, proxy in group.waiting:
+                        self._releases.put((shortcode, filepath, proxy, False))
+                    group.waiting = []
+                else:
+                    # 상속할 결과가 없으므로 나머지를 모두 비전 모델로 보내지 않고 다음 슬라이드 하나를 대표로 다시 시도
+                    logger.warning(f"Carousel representative slide left nothing to inherit for {shortcode}: {os.path.basename(group.representative or '')}")
+                    group.representative = None
+                    if group.waiting and group.txt_pending == 0:
+                        self._promote_representative(shortcode, group)
+            self._finish(shortcode, group)
+
+    def _finish(self, shortcode: str, group: _PostGroup):
+        group.outstanding -= 1
+        if group.outstanding <= 0 and not group.waiting:
+            # 게시물 단위 작업 완료. 이후 도착하는 슬라이드는 캐시된 대표 결과를 상속
+            del self._groups[shortcode]
+
+    def _dispatch_loop(self):
+        while True:
+            shortcode, filepath, proxy, is_representative = self._releases.get()
+            try:
+                inner = self._dispatch(shortcode, filepath, is_representative)
+                inner.add_done_callback(lambda f, p=proxy: _copy_future(f, p))
+            except Exception as e:
+                logger.error(f"Post scheduler dispatch fault {filepath}: {e}")
+                proxy.set_exception(e)
+
+    def active_posts(self) -> int:
+        with self._lock:
+            return len(self._groups)
+
+
+def _succeeded(future: Future) -> bool:
+    """파이프라인 결과가 False(중간 스테이지에서 중단)이거나 예외이면 실패."""
+    if future.cancelled() or future.exception() is not None:
+        return False
+    return bool(future.result())
+
+
+def _copy_future(source: Future, target: Future):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import uuid
+import logging
+from typing import Dict, Optional
+from cache_store import store, CacheStore
+
+logger = logging.getLogger("mcp_vision_server.processing_ledger")
+
+LEDGER_NS = "processing_ledger"
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+# 처리 중 상태가 이 시간보다 오래 유지되면 멈춘 작업으로 보고 다른 투입 경로가 가져갈 수 있음
+LEASE_SECONDS = 1800.0
+
+# 이 프로세스의 실행 식별자. 다른 실행이 남긴 처리 중 상태는 비정상 종료의 흔적
+RUN_ID = uuid.uuid4().hex
+
+
+def _path_key(filepath: str) -> str:
+    return os.path.normcase(os.path.abspath(filepath))
+
+
+class ProcessingLedger:
+    """
+    파일 내용 해시 단위의 처리 상태 장부 (pending -> in_progress -> done).
+    모든 투입 경로(전체 스캔, 감시 폴더)는 분석을 시작하기 전에 claim()으로 임대(lease)를 얻어야 하며,
+    같은 파일이 동시에 두 번 분석되거나 이미 끝난 파일이 다시 분석되지 않도록 합니다.
+    """
+
+    def __init__(self, cache_store: CacheStore = store, lease_seconds: float = LEASE_SECONDS):
+        self.store = cache_store
+        self.lease_seconds = lease_seconds
+
+    def _load(self, conn, key: str) -> Optional[Dict]:
+        row = conn.execute("SELECT value FROM kv WHERE ns=? AND key=?", (LEDGER_NS, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, conn, key: str, entry: Dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)",
+            (LEDGER_NS, key, json.dumps(entry, ensure_ascii=False))
+        )
+
+    def claim(self, key: str, filepath: str) -> bool:
+        """처리 권한을 얻으면 True. 다른 작업이 처리 중이거나 같은 경로에서 이미 처리가 끝났으면 False."""
+        now = time.time()
+        with self.store.transaction(commit=False) as conn:
+            entry = self._load(conn, key)
+            if entry:
+                if entry["state"] == IN_PROGRESS and entry.get("lease_until", 0) > now:
+                    logger.info(f"Already being processed ({entry.get('path')}), skipping: {filepath}")
+                    return False
+                if entry["state"] == DONE and entry.get("path") == _path_key(filepath):
+                    logger.info(f"Already processed, skipping: {filepath}")
+                    return False
+            self._save(conn, key, {
+                "state": IN_PROGRESS,
+                "path": _path_key(filepath),
+                "owner": RUN_ID,
+                "lease_until": now + self.lease_seconds,
+                "attempts": (entry or {}).get("attempts", 0) + 1,
+                "updated": now
+            })
+        return True
+
+    def complete(self, key: str, filepath: str):
+        """처리 완료. 태그 폴더로 이동된 경우 이동 후 경로를 기록합니다."""
+        with self.store.transaction(commit=False) as conn:
+            entry = self._load(conn, key) or {}
+            self._save(conn, key, {
+                "state": DONE,
+                "path": _path_key(filepath),
+                "attempts": entry.get("attempts", 1),
+                "updated": time.time()
+            })
+
+    def release(self, key: str, error: Optional[str] = None):
+        """처리 실패/중단. 다음 스캔이나 이벤트에서 다시 처리할 수 있도록 pending으로 되돌립니다."""
+        with self.store.transaction(commit=False) as conn:
+            entry = self._load(conn, key)
+            if entry is None or entry["state"] != IN_PROGRESS:
+                return
+            entry.update({"state": PENDING, "updated": time.time()})
+            entry.pop("lease_until", None)
+            entry.pop("owner", None)
+            if error:
+                entry["last_error"] = error[:500]
+            self._save(conn, key, entry)
+
+    def recover(self) -> int:
+        """
+        시작 시 호출. 이전 실행이 처리 중에 종료되어 남긴 in_progress 항목을 pending으로 되돌립니다.
+        (Vector DB 기록은 upsert이고 매니페스트는 완료 후에만 기록되므로 다시 처리해도 안전함)
+        """
+        recovered = 0
+        with self.store.transaction() as conn:
+            rows = conn.execute("SELECT key, value FROM kv WHERE ns=?", (LEDGER_NS,)).fetchall()
+            for key, value in rows:
+                entry = json.loads(value)
+                if entry["state"] == IN_PROGRESS and entry.get("owner") != RUN_ID:
+                    entry.update({"state": PENDING, "updated": time.time(), "last_error": "interrupted"})
+                    entry.pop("lease_until", None)
+                    entry.pop("owner", None)
+                    self._save(conn, key, entry)
+                    recovered += 1
+        if recovered:
+            logger.warning(f"Recovered {recovered} files interrupted by a previous shutdown; they will be reprocessed")
+        return recovered
+
+    def state(self, key: str) -> Optional[str]:
+        entry = self.store.get(LEDGER_NS, key)
+        return entry["state"] if entry else None
+
+    def stats(self) -> Dict:
+        counts = {PENDING: 0, IN_PROGRESS: 0, DONE: 0}
+        for _, entry in self.store.items(LEDGER_NS):
+            counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+        return counts
+
+
+# 싱글톤 인스턴스 생성
+ledger = ProcessingLedger()
@@ -0,0 +1,286 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from taxonomy import VALID_CATEGORIES
+from ollama_client import ollama, OllamaError
+
+logger = logging.getLogger("mcp_vision_server.prompt_builder")
+
+# Ollama가 모델을 메모리에 유지하는 시간 (기본 5분이 지나면 내려가서 다음 호출이 cold load가 됨)
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+# 호출별 가변 입력(본문/OCR) 토큰 예산. 고정 지시문(system)은 매 호출 동일하므로
+# Ollama가 이전 요청의 KV 캐시를 재사용하고, 실제로 새로 평가되는 것은 이 가변 부분뿐입니다.
+CLASSIFY_TEXT_BUDGET = 400
+VISION_OCR_BUDGET = 120
+VISION_POST_BUDGET = 160
+# 본문이 예산을 넘을 때 해시태그 줄에 남겨 두는 몫 (해시태그는 짧고 분류 신호가 강함)
+HASHTAG_SHARE = 0.25
+MAX_HASHTAGS = 15
+# OCR 줄 중 글자(영숫자/한글) 비율이 이보다 낮으면 인식 잡음으로 보고 제외
+MIN_OCR_LINE_LETTERS = 0.5
+
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_MENTION_RE = re.compile(r'@[A-Za-z0-9_.]+')
+_HASHTAG_RE = re.compile(r'#[^\s#]+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?。])\s+|\n+')
+_LETTER_RE = re.compile(r'[A-Za-z0-9가-힣]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 쓰는 대략적인 토큰 수: ASCII는 약 4자당 1토큰, 한글 등 비ASCII는 1자당 약 1토큰
+    (Llama/Qwen 계열 BPE 기준 대략값, 한글 음절은 모델에 따라 1~2토큰).
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return -(-ascii_chars // 4) + (len(text) - ascii_chars)
+
+
+def _char_cost(c: str) -> float:
+    return 0.25 if c < "\x80" else 1.0
+
+
+def _cut(text: str, budget: int) -> str:
+    """예산 안에 들어가는 앞부분. 가능하면 단어 경계에서 자릅니다."""
+    cost = 0.0
+    for i, c in enumerate(text):
+        cost += _char_cost(c)
+        if cost > budget:
+            head = text[:i]
+            space = head.rfind(" ")
+            return head[:space] if space > len(head) * 0.7 else head
+    return text
+
+
+def _dedupe_lines(lines: Iterable[str]) -> List[str]:
+    seen = set()
+    result = []
+    for line in lines:
+        key = line.lower()
+        if line and key not in seen:
+            seen.add(key)
+            result.append(line)
+    return result
+
+
+def fit_text(text: str, budget: int) -> str:
+    """
+    본문을 토큰 예산에 맞춥니다. URL/멘션/중복 줄을 지우고, 넘치면 앞쪽 문장(제목/요지)을 문장 단위로 남기고
+    해시태그는 따로 모아 끝에 붙입니다.
+    """
+    if not text:
+        return ""
+    text = _MENTION_RE.sub("", _URL_RE.sub("", text))
+    lines = _dedupe_lines(re.sub(r'[ \t]+', ' ', line).strip() for line in text.split("\n"))
+    text = "\n".join(lines)
+    if estimate_tokens(text) <= budget:
+        return text
+
+    hashtags = list(dict.fromkeys(_HASHTAG_RE.findall(text)))[:MAX_HASHTAGS]
+    tag_line = _cut(" ".join(hashtags), int(budget * HASHTAG_SHARE)) if hashtags else ""
+    remaining = budget - estimate_tokens(tag_line)
+    body = _HASHTAG_RE.sub("", text)
+
+    kept, used = [], 0
+    for sentence in (s.strip() for s in _SENTENCE_RE.split(body)):
+        if not sentence:
+            continue
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > remaining:
+            if not kept:
+                kept.append(_cut(sentence, remaining))
+            break
+        kept.append(sentence)
+        used += cost
+    return "\n".join(part for part in (" ".join(kept), tag_line) if part)
+
+
+def clean_ocr(text: str) -> str:
+    """Tesseract 출력에서 기호만 있는 줄, 한두 글자 줄, 중복 줄을 걸러냅니다."""
+    lines = []
+    for line in text.split("\n"):
+        line = re.sub(r'\s+', ' ', line).strip()
+        if len(line) < 3:
+            continue
+        if len(_LETTER_RE.findall(line)) / len(line.replace(" ", "")) < MIN_OCR_LINE_LETTERS:
+            continue
+        lines.append(line)
+    return "\n".join(_dedupe_lines(lines))
+
+
+class Prompt:
+    """고정 지시문(system)과 호출마다 바뀌는 입력(prompt). generate(**prompt.options())로 넘깁니다."""
+
+    def __init__(self, system: str, prompt: str):
+        self.system = system
+        self.prompt = prompt
+
+    def options(self) -> Dict:
+        return {"system": self.system, "keep_alive": KEEP_ALIVE}
+
+    def tokens(self) -> Dict[str, int]:
+        system, prompt = estimate_tokens(self.system), estimate_tokens(self.prompt)
+        return {"system": system, "prompt": prompt, "total": system + prompt}
+
+
+def _category_list(categories: List[str]) -> str:
+    return ", ".join(categories)
+
+
+def classify_system(categories: List[str] = VALID_CATEGORIES) -> str:
+    return (
+        "You are an architectural assistant. Read the text and categorize it into maximum 4 comma separated tags "
+        f"choosing ONLY from this list: [{_category_list(categories)}]. Only output the tags, nothing else."
+    )
+
+
+def vision_system() -> str:
+    return (
+        "### FORCE VISION PROTOCOL ###\n"
+        "You are an expert architectural vision-language AI. Your visual sensors ARE ACTIVE. "
+        "The image is PROVIDED in your CURRENT visual buffer. DO NOT claim you cannot see it. "
+        "DIRECTLY ANALYZE the image based on the contextual data and the following criteria.\n\n"
+        "[Analysis Criteria]\n"
+        "1. Spatial DNA (Interior/Exterior/Plan, Commercial/Residential etc)\n"
+        "2. Object Spec (Furniture, Lighting, Built-in etc)\n"
+        "3. Materiality (Wood, Concrete, Metal, Texture)\n"
+        "4. Representation (Photo, Render, Model)\n\n"
+        f"Strictly select 1 to 5 TAGS from this list: [{_category_list(VALID_CATEGORIES)}]\n\n"
+        "OUTPUT FORMAT:\n"
+        "DESCRIPTION: [3-4 sentences of deep visual architecture analysis]\n"
+        "TAGS: [tag1, tag2, tag3]"
+    )
+
+
+def triage_system(kind: str) -> str:
+    if kind == "text":
+        task = ("You tag saved architecture and design posts. You CANNOT see the image; "
+                "judge only from the OCR text and the post text.")
+        description = "[1 sentence describing what the image most likely shows]"
+    else:
+        task = "You tag saved architecture and design images. Look at the image and use the OCR text and post text."
+        description = "[2 sentences describing the space, objects and materials]"
+    return (
+        f"{task}\n\n"
+        f"Select 1 to 4 TAGS ONLY from this list: [{_category_list(VALID_CATEGORIES)}]\n"
+        "CONFIDENCE is how sure you are (0-100) that the tags describe the image. "
+        "If you are unsure, give a low CONFIDENCE instead of guessing.\n\n"
+        "OUTPUT FORMAT:\n"
+        f"DESCRIPTION: {description}\n"
+        "TAGS: [tag1, tag2]\n"
+        "CONFIDENCE: [0-100]"
+    )
+
+
+def classify_prompt(text: str, categories: List[str] = VALID_CATEGORIES, budget: int = CLASSIFY_TEXT_BUDGET) -> Prompt:
+    return Prompt(classify_system(categories), f"Text: {fit_text(text, budget)}")
+
+
+def _context(ocr_text: str, post_text: str) -> str:
+    ocr = fit_text(clean_ocr(ocr_text), VISION_OCR_BUDGET) if ocr_text else ""
+    post = fit_text(post_text, VISION_POST_BUDGET) if post_text else ""
+    return f"[Contextual Data]\nOCR Text: {ocr}\nInstagram Post Text: {post}"
+
+
+def vision_prompt(ocr_text: str, post_text: str) -> Prompt:
+    return Prompt(vision_system(), _context(ocr_text, post_text))
+
+
+def triage_prompt(kind: str, ocr_text: str, post_text: str) -> Prompt:
+    return Prompt(triage_system(kind), _context(ocr_text, post_text))
+
+
+def warm_up(targets: List[Tuple[str, str]]):
+    """
+    (모델, system) 목록을 순서대로 한 번씩 호출해 모델을 메모리에 올리고 keep_alive를 설정합니다.
+    같은 system으로 1토큰만 생성하므로 고정 지시문의 KV 캐시도 미리 채워집니다. 실패는 기록만 합니다.
+    """
+    for model, system in targets:
+        started = time.monotonic()
+        try:
+            ollama.generate(model, "OK", system=system, keep_alive=KEEP_ALIVE, options={"num_predict": 1},
+                            timeout=300, retries=1, call_site="prompt_builder.warm_up")
+            logger.info(f"Model warmed: {model} ({time.monotonic() - started:.1f}s, keep_alive={KEEP_ALIVE})")
+        except OllamaError as e:
+            logger.warning(f"Model warm-up failed {model}: {e}")
+
+
+def warm_up_async(targets: List[Tuple[str, str]]) -> threading.Thread:
+    thread = threading.Thread(target=warm_up, args=(targets,), name="ollama-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _legacy_prompts(text: str) -> Tuple[str, str]:
+    """이 모듈 도입 전 file_manager가 보내던 분류/비전 프롬프트 (비교용)."""
+    classify = (f"You are an architectural assistant. Read this text and categorize it into maximum 4 comma separated tags "
+                f"choosing ONLY from this list: [{', '.join(VALID_CATEGORIES)}]. Only output the tags, nothing else.\nText: {text}")
+    vision = vision_system() + f"\n\n[Contextual Data]\nOCR Text: \nInstagram Post Text: {text[:300]}"
+    return classify, vision
+
+
+def compare(texts: List[str], model: Optional[str] = None) -> Dict:
+    """
+    기존 프롬프트와 비교한 호출당 추정 토큰 수. 고정 지시문은 Ollama의 prefix 캐시로 재사용되므로
+    새 방식에서 매 호출 새로 평가되는 토큰은 가변 부분(prompt)뿐입니다.
+    model을 주면 실제 Ollama에 스트리밍 호출을 보내 time-to-first-token과 prompt_eval_count도 잽니다.
+    """
+    texts = [t for t in texts if t and len(t.strip()) >= 30]
+    report = {"samples": len(texts)}
+    for name, legacy_index, build in (("classify", 0, lambda t: classify_prompt(t)),
+                                      ("vision_context", 1, lambda t: vision_prompt("", t))):
+        legacy = [estimate_tokens(_legacy_prompts(t)[legacy_index]) for t in texts]
+        new = [build(t).tokens() for t in texts]
+        report[name] = {
+            "legacy_avg_tokens": round(sum(legacy) / len(legacy), 1) if legacy else 0,
+            "legacy_max_tokens": max(legacy, default=0),
+            "new_avg_total_tokens": round(sum(n["total"] for n in new) / len(new), 1) if new else 0,
+            "new_avg_uncached_tokens": round(sum(n["prompt"] for n in new) / len(new), 1) if new else 0,
+            "new_max_uncached_tokens": max((n["prompt"] for n in new), default=0),
+        }
+    if model:
+        report["live"] = _measure_ttft(model, texts[:20])
+    return report
+
+
+def _measure_ttft(model: str, texts: List[str]) -> Dict:
+    def run(prompt: str, **options) -> Tuple[float, int]:
+        started, first = time.monotonic(), None
+        final = {}
+        for chunk in ollama.stream_generate(model, prompt, call_site="prompt_builder.compare", options={"num_predict": 8}, **options):
+            if first is None:
+                first = time.monotonic() - started
+            if chunk.get("done"):
+                final = chunk
+        return first or 0.0, final.get("prompt_eval_count", 0)
+
+    legacy = [run(_legacy_prompts(t)[0]) for t in texts]
+    new = [run(p.prompt, **p.options()) for p in (classify_prompt(t) for t in texts)]
+    avg = lambda values: round(sum(values) / len(values), 3) if values else 0
+    return {
+        "legacy_avg_ttft_seconds": avg([v[0] for v in legacy]),
+        "new_avg_ttft_seconds": avg([v[0] for v in new]),
+        "legacy_avg_prompt_eval_count": avg([v[1] for v in legacy]),
+        "new_avg_prompt_eval_count": avg([v[1] for v in new]),
+    }
+
+
+if __name__ == "__main__":
+    # python prompt_builder.py compare [post_text_cache.json] [--live MODEL]
+    args = sys.argv[1:]
+    if not args or args[0] != "compare":
+        print("Usage: python prompt_builder.py compare [texts.json] [--live MODEL]")
+        sys.exit(1)
+    live_model = args[args.index("--live") + 1] if "--live" in args else None
+    source = next((a for a in args[1:] if a.endswith(".json")), "post_text_cache.json")
+    with open(source, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    samples = list(data.values()) if isinstance(data, dict) else list(data)
+    print(json.dumps(compare([s for s in samples if isinstance(s, str)], live_model), ensure_ascii=False, indent=2))
@@ -2,6 +2,7 @@ import sys
 import json
 import os
 from db_manager import db
+from lexical_index import RRF_K
 
 def main():
     import sys
@@ -9,8 +10,13 @@ def main():
     try:
         limit = 50
         offset = 0
-        tag_filter = None
+        tag_filter = []
+        match = "any"
+        cursor = None
         query_text = None
+        facet_names = None
+        facet_type = None
+        facet_limit = None
         
         for arg in sys.argv[1:]:
             if arg.startswith("limit="):
@@ -18,76 +24,84 @@ def main():
             elif arg.startswith("offset="):
                 offset = int(arg.split("=")[1])
             elif arg.startswith("tag="):
-                tag_filter = arg.split("=")[1]
+                # tag=a,b 또는 tag=를 여러 번: match=any(OR, 기본) / match=all(AND)
+                tag_filter.extend(t for t in arg.split("=", 1)[1].split(",") if t.strip())
+            elif arg.startswith("match="):
+                match = arg.split("=")[1]
+            elif arg.startswith("cursor="):
+                cursor = arg.split("=", 1)[1] or None
+            elif arg.startswith("facets="):
+                # facets=tag,primary_tag,type,month (all = 전부)
+                value = arg.split("=", 1)[1]
+                facet_names = [] if value in ("", "all", "1") else value.split(",")
+            elif arg.startswith("facet_limit="):
+                facet_limit = int(arg.split("=")[1])
+            elif arg.startswith("type="):
+                facet_type = arg.split("=", 1)[1] or None
             elif arg.startswith("q="):
                 query_text = arg.split("=")[1]
                 
-        # 1. Semantic Search Mode
+        # 0. Facet Counts Mode (미리 집계된 개수만 반환)
+        if facet_names is not None:
+            facets = db.get_facets(doc_type=facet_type, names=facet_names or None, limit=facet_limit)
+            total = db.tags.query(doc_type=facet_type, limit=0)["total"]
+            print(json.dumps({"success": True, "total": total, "facets": facets}, ensure_ascii=False))
+            return
+
+        # 1. Search Mode (벡터 + 어휘 BM25 하이브리드, SEARCH_MODE로 변경 가능)
         if query_text:
-            search_results = db.collection.query(
-                query_texts=[query_text],
-                n_results=limit,
-                where={"type": "image"}
-            )
-            
-            ids = search_results.get("ids", [[]])[0]
-            docs = search_results.get("documents", [[]])[0]
-            metas = search_results.get("metadatas", [[]])[0]
-            distances = search_results.get("distances", [[]])[0]
-            
             output = []
-            for i in range(len(ids)):
-                item_meta = metas[i] if metas else {}
+            for item in db.search_similar(query_text, n_results=limit, doc_type="image"):
+                item_meta = item.get("metadata") or {}
+                if "score" in item:
+                    # 두 순위 목록 모두에서 1위일 때 1.0이 되도록 RRF 점수를 정규화
+                    search_score = round(min(1.0, item["score"] * (RRF_K + 1) / 2), 3)
+                else:
+                    search_score = round(1.0 - item["distance"], 3)
                 output.append({
-                    "id": ids[i],
+                    "id": item["id"],
                     "filepath": item_meta.get("filepath", ""),
                     "url": item_meta.get("url", ""),
-                    "description": docs[i] if docs else "",
+                    "description": item.get("document") or "",
                     "tags": item_meta.get("tags", ""),
                     "type": item_meta.get("type", "unknown"),
                     "timestamp": item_meta.get("timestamp", 0),
-                    "search_score": round(1.0 - distances[i], 3) if distances else 0
+                    "search_score": search_score
                 })
         
-        # 2. Metadata Filter Mode
+        # 2. Metadata Filter Mode (태그 색인에서 필터/정렬/페이지네이션 후 해당 페이지만 ChromaDB에서 읽음)
         else:
-            where_clause = {"type": "image"}
-            results = db.collection.get(where=where_clause, limit=limit if not tag_filter else 2000, offset=offset)
-                
+            page = db.tags.query(tags=tag_filter, match=match, doc_type="image", limit=limit, offset=offset, cursor=cursor)
+            results = db.collection.get(ids=page["ids"], include=["documents", "metadatas"]) if page["ids"] else {"ids": []}
+            found = {doc_id: i for i, doc_id in enumerate(results["ids"])}
             docs = results.get("documents", [])
             metas = results.get("metadatas", [])
-            ids = results.get("ids", [])
             
             output = []
-            for i in range(len(ids)):
+            for doc_id in page["ids"]:
+                if doc_id not in found:
+                    continue
+                i = found[doc_id]
                 item_meta = metas[i] if metas else {}
-                item_tags = item_meta.get("tags", "")
-                
-                # Manual filtering for tags if tag_filter is present
-                if tag_filter:
-                    # Check if tag exists in the comma-separated string
-                    tags_list = [t.strip() for t in item_tags.split(',')]
-                    if tag_filter not in tags_list:
-                        continue
-                        
                 output.append({
-                    "id": ids[i],
+                    "id": doc_id,
                     "filepath": item_meta.get("filepath", ""),
                     "url": item_meta.get("url", ""),
                     "description": docs[i] if docs else "",
-                    "tags": item_tags,
+                    "tags": item_meta.get("tags", ""),
                     "type": item_meta.get("type", "unknown"),
                     "timestamp": item_meta.get("timestamp", 0)
                 })
-            
-            # Apply limit if we filtered in python
-            if tag_filter:
-                output = output[offset:offset+limit]
+            total = page["total"]
+            next_cursor = page["next_cursor"]
         
         import random
         random.shuffle(output)
             
-        print(json.dumps({"success": True, "count": len(output), "data": output}, ensure_ascii=False))
+        response = {"success": True, "count": len(output), "data": output}
+        if not query_text:
+            response.update({"total": total, "offset": offset, "next_cursor": next_cursor})
+        print(json.dumps(response, ensure_ascii=False))
         
     except Exception as e:
         print(json.dumps({"success": False, "error": str(e)}, ensure_ascii=False))
@@ -5,6 +5,7 @@ import io
 import base64
 from PIL import Image
 from db_manager import db
+from graph_builder import similarity_edges
 
 def main():
     import sys
@@ -57,8 +58,10 @@ def main():
                 "description": clean_desc
             })
 
-        # 2. Generate Category Hubs
-        categories = sorted(list(set(node["primaryTag"] for node in output_nodes)))
+        # 2. Generate Category Hubs (가져온 노드의 대표 태그만, limit으로 잘린 경우에도 빈 허브가 생기지 않도록)
+        # count는 미리 집계된 전체 문서 수 (표시용 주석)
+        categories = sorted(set(node["primaryTag"] for node in output_nodes))
+        category_counts = db.get_facets(names=["primary_tag"])["primary_tag"]
         for cat in categories:
             cat_id = f"CAT_{cat}"
             output_nodes.append({
@@ -66,7 +69,8 @@ def main():
                 "name": cat,
                 "group": "category",
                 "isCategory": True,
-                "tags": cat
+                "tags": cat,
+                "count": category_counts.get(cat, 0)
             })
             
         # 3. Connect Files to Category Hubs
@@ -80,24 +84,8 @@ def main():
                 })
 
         # 4. Semantic Similarity Edges (Optional/Limited)
-        if docs:
-            results = db.collection.query(
-                query_texts=docs,
-                n_results=3 # Reduce further to 3 for extreme performance
-            )
-            for i, query_id in enumerate(ids):
-                retrieved_ids = results["ids"][i]
-                distances = results["distances"][i]
-                for j, target_id in enumerate(retrieved_ids):
-                    dist = distances[j]
-                    if target_id != query_id and dist < distance_threshold:
-                        if query_id < target_id:
-                            src, dst = query_id, target_id
-                        else:
-                            src, dst = target_id, query_id
-                        edge = {"source": src, "target": dst, "value": round(1.0 - dist, 3)}
-                        if edge not in output_edges:
-                            output_edges.append(edge)
+        neighbours = db.neighbours.neighbours_many(ids, limit=2) # Keep only the 2 closest for extreme performance
+        output_edges.extend(similarity_edges(ids, neighbours, distance_threshold))
 
         import random
         random.shuffle(output_nodes)
@@ -0,0 +1,85 @@
+import os
+import time
+import hashlib
+import logging
+from cache_store import store, CacheStore
+
+logger = logging.getLogger("mcp_vision_server.scan_manifest")
+
+MANIFEST_NS = "scan_manifest"
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def file_content_hash(filepath: str, chunk_size: int = 1 << 20) -> str:
+    """파일 내용의 SHA-1 해시 (파일 이동/이름 변경과 무관한 식별자)."""
+    h = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _manifest_key(filepath: str) -> str:
+    return os.path.normcase(os.path.abspath(filepath))
+
+
+class ScanManifest:
+    """
+    수집이 끝난 파일의 (경로, 크기, mtime, 내용 해시)를 기록하는 영구 매니페스트.
+    크기와 mtime이 같으면 stat 한 번으로 건너뛰고, 달라졌을 때만 내용 해시로 실제 변경 여부를 확인합니다.
+    """
+
+    def __init__(self, cache_store: CacheStore = store):
+        self.store = cache_store
+
+    def check(self, filepath: str) -> str:
+        """NEW / CHANGED / UNCHANGED 중 하나를 반환합니다."""
+        key = _manifest_key(filepath)
+        entry = self.store.get(MANIFEST_NS, key)
+        if entry is None:
+            return NEW
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return NEW
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return UNCHANGED
+        try:
+            content_hash = file_content_hash(filepath)
+        except OSError:
+            return CHANGED
+        if content_hash == entry.get("hash"):
+            # 내용은 같고 mtime만 바뀐 경우 (복사/touch) -> stat 정보만 갱신
+            entry.update({"size": stat.st_size, "mtime": stat.st_mtime})
+            self.store.put(MANIFEST_NS, key, entry)
+            return UNCHANGED
+        return CHANGED
+
+    def record(self, filepath: str, content_hash: str = None):
+        """수집이 완료된 파일을 기록합니다. 태그 폴더로 이동된 경우 이동 후 경로로 호출해야 합니다."""
+        try:
+            stat = os.stat(filepath)
+            if content_hash is None:
+                content_hash = file_content_hash(filepath)
+        except OSError as e:
+            logger.warning(f"매니페스트 기록 실패 {filepath}: {e}")
+            return
+        self.store.put(MANIFEST_NS, _manifest_key(filepath), {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": content_hash,
+            "ingested_at": time.time()
+        })
+
+    def forget(self, filepath: str):
+        self.store.delete(MANIFEST_NS, _manifest_key(filepath))
+
+
+# 싱글톤 인스턴스 생성
+manifest = ScanManifest()
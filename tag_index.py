@@ -0,0 +1,223 @@
+import json
+import time
+import base64
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from cache_store import CacheStore
+
+logger = logging.getLogger("mcp_vision_server.tag_index")
+
+# 컬렉션 메타데이터를 다시 읽어 색인을 재구성할 때의 배치 크기
+REBUILD_BATCH = 5000
+# 태그 필터 방식: any = 태그 중 하나라도 (OR), all = 모두 포함 (AND)
+MATCH_MODES = ("any", "all")
+# 집계하는 facet: 태그, 대표 태그(첫 번째 태그), 문서 종류, 월(timestamp 기준 YYYY-MM)
+FACETS = ("tag", "primary_tag", "type", "month")
+UNCLASSIFIED = "미분류"
+# analyze_file이 항상 앞에 붙이는 문서 종류 태그. type/primary_tag facet으로 이미 집계되므로 tag facet에서는 뺌
+# (모든 문서에 붙어 있어 대시보드의 상위 태그 칩을 차지함). 태그 필터(doc_tags)에는 그대로 남음
+STRUCTURAL_TAGS = frozenset({"image", "text", "pdf", "document", "instagram_post"})
+# 색인 구조/facet 규칙 버전. 저장된 값과 다르면 쓰기 프로세스가 시작할 때(ensure_indexes) 한 번 다시 만듦
+INDEX_VERSION = 2
+VERSION_KEY = "index_version:tag_index"
+
+
+def split_tags(tags: str) -> List[str]:
+    """메타데이터의 쉼표 구분 태그 문자열 -> 중복 없는 태그 목록."""
+    return list(dict.fromkeys(t.strip() for t in (tags or "").split(",") if t.strip()))
+
+
+def _facet_values(doc_type: str, tags: List[str], primary_tag: Optional[str], timestamp: float) -> List[Tuple[str, str]]:
+    values = [("tag", t) for t in tags if t not in STRUCTURAL_TAGS]
+    values.append(("primary_tag", primary_tag or UNCLASSIFIED))
+    values.append(("type", doc_type or "unknown"))
+    if timestamp:
+        values.append(("month", time.strftime("%Y-%m", time.localtime(timestamp))))
+    return values
+
+
+def encode_cursor(timestamp: float, doc_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([timestamp, doc_id], ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    timestamp, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    return float(timestamp), doc_id
+
+
+class TagIndex:
+    """
+    레퍼런스별 태그를 (tag, id) 행으로 정규화한 SQLite 색인. 태그 필터(AND/OR), 정확한 전체 개수,
+    offset/커서 페이지네이션을 저장소 안에서 처리합니다. 정렬은 최신순(timestamp, id 내림차순).
+    facet 개수(태그, 대표 태그, 종류, 월)는 같은 트랜잭션에서 증감으로 유지하므로 조회 시 집계하지 않습니다.
+    VectorDBManager가 upsert, update_tags, 삭제 시 함께 갱신합니다.
+    """
+
+    def __init__(self, collection, index_store: CacheStore):
+        self.collection = collection
+        self.store = index_store
+        # 여기서는 다시 만들지 않음 (대시보드 요청마다 새 프로세스로 열리므로). ensure_indexes()/rebuild()에서만
+        with self.store.transaction() as conn:
+            self._create(conn)
+            # 새로 만든 빈 색인은 그대로 현재 버전
+            if self.store.get("_meta", VERSION_KEY) is None and self.collection.count() == 0:
+                self.store.put("_meta", VERSION_KEY, INDEX_VERSION)
+
+    @staticmethod
+    def _create(conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tag_docs ("
+            "id TEXT PRIMARY KEY, type TEXT, timestamp REAL NOT NULL DEFAULT 0, primary_tag TEXT) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tag_docs_order ON tag_docs (type, timestamp DESC, id DESC)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS doc_tags ("
+            "tag TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (tag, id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS doc_tags_by_id ON doc_tags (id)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS facet_counts ("
+            "facet TEXT NOT NULL, value TEXT NOT NULL, type TEXT NOT NULL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (facet, value, type)) WITHOUT ROWID"
+        )
+
+    def is_current(self) -> bool:
+        """현재 INDEX_VERSION으로 만들어진 색인인지."""
+        return self.store.get("_meta", VERSION_KEY) == INDEX_VERSION
+
+    def count(self) -> int:
+        with self.store.transaction(commit=False) as conn:
+            return conn.execute("SELECT COUNT(*) FROM tag_docs").fetchone()[0]
+
+    def _bump(self, conn, doc_type: str, values: List[Tuple[str, str]], delta: int):
+        doc_type = doc_type or "unknown"
+        conn.executemany(
+            "INSERT INTO facet_counts (facet, value, type, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (facet, value, type) DO UPDATE SET count = count + excluded.count",
+            [(facet, value, doc_type, delta) for facet, value in values]
+        )
+        if delta < 0:
+            conn.execute("DELETE FROM facet_counts WHERE count <= 0")
+
+    def _remove(self, conn, doc_id: str) -> Optional[Tuple[str, float]]:
+        """문서의 태그 행을 지우고 facet 개수에서 뺍니다. 색인에 있던 (type, timestamp)를 반환합니다."""
+        row = conn.execute("SELECT type, timestamp, primary_tag FROM tag_docs WHERE id=?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        # doc_tags에는 순서가 없으므로 대표 태그는 tag_docs에 저장된 값을 사용
+        old_tags = [r[0] for r in conn.execute("SELECT tag FROM doc_tags WHERE id=?", (doc_id,))]
+        self._bump(conn, row[0], _facet_values(row[0], old_tags, row[2], row[1]), -1)
+        conn.execute("DELETE FROM doc_tags WHERE id=?", (doc_id,))
+        conn.execute("DELETE FROM tag_docs WHERE id=?", (doc_id,))
+        return row[0], row[1]
+
+    def _insert(self, conn, doc_id: str, doc_type: Optional[str], timestamp: float, tags: List[str]):
+        conn.execute("INSERT INTO tag_docs (id, type, timestamp, primary_tag) VALUES (?, ?, ?, ?)",
+                     (doc_id, doc_type, timestamp, tags[0] if tags else None))
+        conn.executemany("INSERT OR IGNORE INTO doc_tags (tag, id) VALUES (?, ?)", [(tag, doc_id) for tag in tags])
+        self._bump(conn, doc_type, _facet_values(doc_type, tags, tags[0] if tags else None, timestamp), 1)
+
+    def _write(self, conn, items: Iterable[Tuple[str, Dict]]):
+        for doc_id, metadata in items:
+            metadata = metadata or {}
+            self._remove(conn, doc_id)
+            self._insert(conn, doc_id, metadata.get("type"), float(metadata.get("timestamp") or 0),
+                         split_tags(metadata.get("tags", "")))
+
+    def add(self, items: List[Tuple[str, Dict]]):
+        """(id, 메타데이터) 목록을 색인합니다. 이미 있는 id는 태그를 교체합니다."""
+        with self.store.transaction() as conn:
+            self._write(conn, items)
+
+    def set_tags(self, doc_id: str, tags: str):
+        with self.store.transaction() as conn:
+            previous = self._remove(conn, doc_id)
+            if previous is not None:
+                self._insert(conn, doc_id, previous[0], previous[1], split_tags(tags))
+
+    def delete(self, ids: List[str]):
+        with self.store.transaction() as conn:
+            for doc_id in ids:
+                self._remove(conn, doc_id)
+
+    def rebuild(self):
+        """
+        컬렉션 메타데이터로 색인 전체를 다시 만듭니다. 비우기와 채우기를 한 트랜잭션에서 하므로
+        다른 프로세스는 끝날 때까지 이전 색인을 읽습니다. (이전 구조의 테이블도 여기서 다시 만듦)
+        """
+        total = self.collection.count()
+        with self.store.transaction() as conn:
+            for table in ("doc_tags", "tag_docs", "facet_counts"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._create(conn)
+            for offset in range(0, total, REBUILD_BATCH):
+                got = self.collection.get(include=["metadatas"], limit=REBUILD_BATCH, offset=offset)
+                self._write(conn, zip(got["ids"], got["metadatas"]))
+            self.store.put("_meta", VERSION_KEY, INDEX_VERSION)
+        logger.info(f"Tag index rebuilt: {total} references")
+
+    def _filter(self, tags: Optional[List[str]], match: str, doc_type: Optional[str]) -> Tuple[str, List]:
+        clauses, params = [], []
+        if doc_type:
+            clauses.append("d.type = ?")
+            params.append(doc_type)
+        if tags:
+            if match not in MATCH_MODES:
+                raise ValueError(f"match must be one of {MATCH_MODES}")
+            marks = ",".join("?" * len(tags))
+            if match == "all":
+                clauses.append(f"d.id IN (SELECT id FROM doc_tags WHERE tag IN ({marks}) GROUP BY id HAVING COUNT(*) = ?)")
+                params.extend(tags + [len(tags)])
+            else:
+                clauses.append(f"d.id IN (SELECT id FROM doc_tags WHERE tag IN ({marks}))")
+                params.extend(tags)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, tags: Optional[List[str]] = None, match: str = "any", doc_type: Optional[str] = None,
+              limit: int = 50, offset: int = 0, cursor: Optional[str] = None) -> Dict:
+        """
+        필터에 맞는 id를 최신순으로 한 페이지 반환합니다.
+        {"ids", "total", "next_cursor"}. cursor를 주면 offset 대신 그 뒤부터 이어서 가져옵니다.
+        """
+        tags = list(dict.fromkeys(t.strip() for t in (tags or []) if t.strip()))
+        where, params = self._filter(tags, match, doc_type)
+        page_where, page_params = where, list(params)
+        if cursor:
+            timestamp, doc_id = decode_cursor(cursor)
+            page_where += (" AND " if where else " WHERE ") + "(d.timestamp, d.id) < (?, ?)"
+            page_params.extend([timestamp, doc_id])
+            offset = 0
+        with self.store.transaction(commit=False) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM tag_docs d{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT d.id, d.timestamp FROM tag_docs d{page_where} "
+                "ORDER BY d.timestamp DESC, d.id DESC LIMIT ? OFFSET ?",
+                page_params + [limit + 1, offset]
+            ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "ids": [r[0] for r in rows],
+            "total": total,
+            "next_cursor": encode_cursor(rows[-1][1], rows[-1][0]) if more and rows else None
+        }
+
+    def facets(self, doc_type: Optional[str] = None, names: Optional[List[str]] = None,
+               limit: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """
+        {facet: {값: 문서 수}}. doc_type을 주면 그 종류의 문서만 셉니다.
+        태그/대표 태그/종류는 개수 내림차순, 월은 시간순이며 limit은 facet마다 적용됩니다.
+        """
+        names = [n for n in (names or FACETS) if n in FACETS]
+        result = {}
+        with self.store.transaction(commit=False) as conn:
+            for name in names:
+                type_clause = " AND type = ?" if doc_type else ""
+                order = "value" if name == "month" else "SUM(count) DESC, value"
+                rows = conn.execute(
+                    f"SELECT value, SUM(count) FROM facet_counts WHERE facet = ?{type_clause} "
+                    f"GROUP BY value ORDER BY {order}" + (" LIMIT ?" if limit else ""),
+                    [name] + ([doc_type] if doc_type else []) + ([limit] if limit else [])
+                ).fetchall()
+                result[name] = {value: count for value, count in rows}
+        return result
@@ -0,0 +1,56 @@
+import re
+import hashlib
+
+# 전략 4: 계층형 태깅 시스템 (Hierarchy Tagging)
+HIERARCHY_MAP = {
+    "의자": ["가구"],
+    "소파": ["가구"],
+    "테이블": ["가구"],
+    "책상": ["가구"],
+    "수납장": ["가구"],
+    "선반": ["가구"],
+    "침대": ["가구"],
+    "조명": ["소품"],
+    "평면도": ["도면"],
+    "투시도": ["도면", "표현"],
+    "조감도": ["도면", "표현"],
+    "건축모형": ["모형"],
+    "실내건축": ["공간디자인"],
+    "파사드": ["외부건축", "건축"],
+    "인물사진": ["사진", "포토그래피"]
+}
+
+VALID_CATEGORIES = [c.strip() for c in "건축, 공간디자인, 실내건축, 주거공간, 상업공간, 공공건축, 전시공간, 파사드, 외부건축, 도면, 평면도, 투시도, 조감도, 건축모형, 모형, 건축가, 가구, 의자, 소파, 테이블, 책상, 수납장, 선반, 조명, 침대, 소품, 오브제, 하드웨어, 부속품, 목공, 금속공예, 가구제작, 디자인, 시각디자인, 영상디자인, 제품디자인, 타이포그래피, 브랜딩, 로고, UX, UI, 패키지디자인, 패션, 드로잉, 사진, 포토그래피, 인물사진, 스튜디오, 영화, 영상, 음악, 전시, 미술품, 표현, 책, 매거진, 인터뷰, 에세이, 리뷰, 비평, 논설, 칼럼, 기획, 전략, 사업공고, 조언, 작업, 그리드, 색감, 다이어그램, 질감, 텍스처, 타이포배치, 미니멀리즘, 음식, 플레이팅, ai, 미분류, 복합".split(',')]
+
+def apply_hierarchy(tags: list[str]) -> list[str]:
+    extended = set(tags)
+    for t in tags:
+        if t in HIERARCHY_MAP:
+            extended.update(HIERARCHY_MAP[t])
+    return list(extended)
+
+def clean_spam_text(text: str) -> str:
+    lines = text.split('\n')
+    clean_lines = []
+    
+    for line in lines:
+        words = line.split()
+        if not words:
+            continue
+            
+        hashtags = [w for w in words if w.startswith('#')]
+        
+        if len(hashtags) > 3 and len(hashtags) > len(words) * 0.5:
+            continue
+            
+        cleaned_line = re.sub(r'@[a-zA-Z0-9_.]+', '', line).strip()
+        
+        if cleaned_line and not (len(cleaned_line) < 15 and "view" in cleaned_line.lower()):
+            clean_lines.append(cleaned_line)
+            
+    return '\n'.join(clean_lines)
+
+
+def taxonomy_version(categories: list[str]) -> str:
+    """분류 체계 목록의 짧은 해시. 카테고리를 추가/삭제하면 값이 바뀌어 분류 캐시가 자동으로 무효화됩니다."""
+    return hashlib.sha1(",".join(categories).encode("utf-8")).hexdigest()[:10]
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from ollama_client import ollama, OllamaError
+from taxonomy import VALID_CATEGORIES
+from prompt_builder import Prompt, vision_prompt, triage_prompt, vision_system, triage_system
+from metrics import metrics
+
+logger = logging.getLogger("mcp_vision_server.vision_cascade")
+
+# 이미지 태깅 모델 단계 (앞에서부터 시도, 마지막 단계는 항상 결과를 채택)
+#   text=<모델>   : 이미지 없이 OCR + 게시물 본문만으로 태깅 (가장 저렴)
+#   vision=<모델> : 이미지 포함 태깅
+# 예) VISION_CASCADE="vision=llava:7b" 로 두면 기존처럼 모든 이미지를 LLaVA로 보냄
+VISION_CASCADE = os.environ.get("VISION_CASCADE", "text=qwen2.5:3b,vision=moondream,vision=llava:7b")
+CASCADE_PROMPT_VERSION = "v2"
+
+# 앞 단계 결과를 채택하는 조건: 자체 신뢰도, 출력 태그 중 분류 체계에 있는 태그 비율, 태그 수 상한
+MIN_CONFIDENCE = 70
+MIN_VALID_RATIO = 0.75
+MAX_TRIAGE_TAGS = 5
+# 텍스트 단계는 OCR + 본문이 이 길이 이상일 때만 시도 (본문 없는 이미지는 바로 다음 단계로)
+MIN_TEXT_CONTEXT_CHARS = 80
+# 설치되지 않은 모델(HTTP 404)은 이 시간 동안 건너뜀
+UNAVAILABLE_RETRY_SECONDS = 600.0
+
+UNCLASSIFIED = "미분류"
+
+TIER_RESULTS = metrics.counter("vision_cascade_results_total", "Vision cascade attempts by tier and outcome (accepted, escalated, error, unavailable, skipped)")
+TIER_SECONDS = metrics.histogram("vision_cascade_tier_seconds", "Latency of each vision cascade tier")
+
+_TAGS_RE = re.compile(r'TAGS:\s*(.*)', re.IGNORECASE)
+_CONFIDENCE_RE = re.compile(r'CONFIDENCE:\s*\[?\s*(\d{1,3})', re.IGNORECASE)
+
+
+class Tier:
+    def __init__(self, kind: str, model: str, final: bool = False):
+        if kind not in ("text", "vision"):
+            raise ValueError(f"Unknown cascade tier kind: {kind}")
+        self.kind = kind
+        self.model = model
+        self.final = final
+        self.name = f"{kind}:{model}"
+
+    def __repr__(self):
+        return f"Tier({self.name}{', final' if self.final else ''})"
+
+
+def parse_cascade(spec: str) -> List[Tier]:
+    """'text=qwen2.5:3b,vision=llava:7b' 형식. 종류를 생략하면 vision으로 봅니다."""
+    tiers = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        kind, sep, model = item.partition("=")
+        tiers.append(Tier(kind.strip(), model.strip()) if sep else Tier("vision", item))
+    if not tiers:
+        raise ValueError("VISION_CASCADE must name at least one model")
+    if tiers[-1].kind != "vision":
+        raise ValueError("The last VISION_CASCADE tier must be a vision model")
+    tiers[-1].final = True
+    return tiers
+
+
+def parse_heavy_output(result_text: str) -> Tuple[str, List[str]]:
+    """DESCRIPTION/TAGS 형식 응답. TAGS 줄이 없으면 본문에 등장한 분류명을 태그로 사용합니다."""
+    if "TAGS:" in result_text.upper():
+        parts = re.split(r'TAGS:', result_text, flags=re.IGNORECASE)
+        description = parts[0].replace("DESCRIPTION:", "").strip()
+        tags = [t.strip() for t in parts[1].strip().split(',') if t.strip() in VALID_CATEGORIES]
+    else:
+        description = result_text.replace("DESCRIPTION:", "").strip()
+        tags = [c for c in VALID_CATEGORIES if c in result_text]
+    return description, tags
+
+
+def parse_triage_output(result_text: str) -> Tuple[str, List[str], List[str], Optional[int]]:
+    """(묘사, 출력된 태그 전체, 그중 분류 체계에 있는 태그, 신뢰도 또는 None)."""
+    tags_match = _TAGS_RE.search(result_text)
+    if not tags_match:
+        return "", [], [], None
+    description = result_text[:tags_match.start()].replace("DESCRIPTION:", "").strip()
+    raw = [t.strip(" []\"'.") for t in tags_match.group(1).split(",")]
+    raw = [t for t in raw if t]
+    valid = list(dict.fromkeys(t for t in raw if t in VALID_CATEGORIES))
+    confidence_match = _CONFIDENCE_RE.search(result_text, tags_match.end())
+    confidence = min(100, int(confidence_match.group(1))) if confidence_match else None
+    return description, raw, valid, confidence
+
+
+def check_triage(raw: List[str], valid: List[str], confidence: Optional[int]) -> Optional[str]:
+    """앞 단계 결과를 채택할 수 없는 이유를 반환합니다 (채택 가능하면 None)."""
+    if not valid or UNCLASSIFIED in valid:
+        return "no_tags"
+    if len(raw) > MAX_TRIAGE_TAGS:
+        return "too_many_tags"
+    if len(valid) / len(raw) < MIN_VALID_RATIO:
+        return "invalid_tags"
+    if confidence is None:
+        return "no_confidence"
+    if confidence < MIN_CONFIDENCE:
+        return "low_confidence"
+    return None
+
+
+class VisionCascade:
+    """
+    이미지 태깅을 저렴한 모델부터 시도하고, 태그 출력이 형식/분류 체계/신뢰도 검사를 통과하지 못하거나
+    미분류인 경우에만 다음(더 무거운) 모델로 넘깁니다. 단계별 채택/상향 횟수와 지연 시간을 기록합니다.
+    """
+
+    def __init__(self, tiers: List[Tier]):
+        self.tiers = tiers
+        self._unavailable: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {t.name: {} for t in tiers}
+        self._seconds: Dict[str, float] = {t.name: 0.0 for t in tiers}
+
+    @property
+    def version(self) -> str:
+        """캐시 버전용. 단계 구성이나 앞 단계 프롬프트가 바뀌면 값이 바뀝니다."""
+        if len(self.tiers) == 1:
+            return self.tiers[0].model
+        return f"{'>'.join(t.name for t in self.tiers)}:{CASCADE_PROMPT_VERSION}"
+
+    @staticmethod
+    def prompt(tier: Tier, ocr_text: str, post_text: str) -> Prompt:
+        if tier.final:
+            return vision_prompt(ocr_text, post_text)
+        return triage_prompt(tier.kind, ocr_text, post_text)
+
+    def warm_up_targets(self) -> List[Tuple[str, str]]:
+        """(모델, 고정 지시문) 목록 (prompt_builder.warm_up용)."""
+        return [(t.model, vision_system() if t.final else triage_system(t.kind)) for t in self.tiers]
+
+    def _count(self, tier: Tier, outcome: str, seconds: Optional[float] = None):
+        TIER_RESULTS.inc(tier=tier.name, outcome=outcome)
+        if seconds is not None:
+            TIER_SECONDS.observe(seconds, tier=tier.name)
+        with self._lock:
+            counts = self._counts[tier.name]
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if seconds is not None:
+                self._seconds[tier.name] += seconds
+
+    def _available(self, tier: Tier) -> bool:
+        with self._lock:
+            until = self._unavailable.get(tier.name)
+            if until is None:
+                return True
+            if time.monotonic() >= until:
+                del self._unavailable[tier.name]
+                return True
+            return False
+
+    def analyze(self, image_b64: Callable[[], str], ocr_text: str = "", post_text: str = "",
+                retries: int = 2, timeout: float = 90) -> Tuple[str, List[str], Optional[str]]:
+        """
+        (묘사, 태그, 결과를 낸 단계 이름)을 반환합니다. image_b64는 이미지가 필요한 단계에서만 호출됩니다.
+        마지막 단계까지 실패하면 ("", [], None).
+        """
+        context_chars = len(ocr_text.strip()) + len(post_text.strip())
+        for tier in self.tiers:
+            if tier.kind == "text" and context_chars < MIN_TEXT_CONTEXT_CHARS:
+                self._count(tier, "skipped")
+                continue
+            if not tier.final and not self._available(tier):
+                self._count(tier, "unavailable")
+                continue
+
+            prompt = self.prompt(tier, ocr_text, post_text)
+            images = [image_b64()] if tier.kind == "vision" else None
+            started = time.monotonic()
+            try:
+                result_text = ollama.generate(tier.model, prompt.prompt, images=images, timeout=timeout,
+                                              retries=retries if tier.final else 1,
+                                              call_site=f"vision_cascade.{tier.kind}",
+                                              **prompt.options()).get("response", "").strip()
+            except OllamaError as e:
+                if tier.final:
+                    self._count(tier, "error", time.monotonic() - started)
+                    raise
+                if e.status == 404:
+                    with self._lock:
+                        self._unavailable[tier.name] = time.monotonic() + UNAVAILABLE_RETRY_SECONDS
+                    logger.warning(f"Cascade tier {tier.name} unavailable (model not pulled?), skipping it for {UNAVAILABLE_RETRY_SECONDS:.0f}s")
+                    self._count(tier, "unavailable")
+                else:
+                    logger.warning(f"Cascade tier {tier.name} failed, escalating: {e}")
+                    self._count(tier, "error", time.monotonic() - started)
+                continue
+            elapsed = time.monotonic() - started
+
+            if tier.final:
+                description, tags = parse_heavy_output(result_text)
+                self._count(tier, "accepted", elapsed)
+                return description, tags, tier.name
+
+            description, raw, valid, confidence = parse_triage_output(result_text)
+            reason = check_triage(raw, valid, confidence)
+            if reason is None:
+                self._count(tier, "accepted", elapsed)
+                logger.info(f"Cascade tier {tier.name} accepted ({valid}, confidence {confidence}, {elapsed:.1f}s)")
+                return description, valid, tier.name
+            self._count(tier, "escalated", elapsed)
+            logger.info(f"Cascade tier {tier.name} escalating ({reason}: {raw}, confidence {confidence})")
+        return "", [], None
+
+    def stats(self) -> Dict:
+        """단계별 결과 수, 상향 비율(시도 중 다음 단계로 넘긴 비율), 평균 지연 시간."""
+        report = {}
+        with self._lock:
+            for tier in self.tiers:
+                counts = dict(self._counts[tier.name])
+                attempted = sum(v for k, v in counts.items() if k != "skipped")
+                timed = sum(v for k, v in counts.items() if k not in ("skipped", "unavailable"))
+                passed_on = attempted - counts.get("accepted", 0)
+                report[tier.name] = {
+                    **counts,
+                    "escalation_rate": round(passed_on / attempted, 3) if attempted and not tier.final else None,
+                    "avg_seconds": round(self._seconds[tier.name] / timed, 3) if timed else None
+                }
+        return report
+
+
+# 싱글톤 인스턴스 생성
+vision_cascade = VisionCascade(parse_cascade(VISION_CASCADE))
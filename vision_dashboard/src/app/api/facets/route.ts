@@ -0,0 +1,51 @@
+import { NextRequest, NextResponse } from "next/server";
+import { exec } from "child_process";
+import path from "path";
+import util from "util";
+
+const execPromise = util.promisify(exec);
+
+const FACET_NAMES = ["tag", "primary_tag", "type", "month"];
+
+export async function GET(req: NextRequest) {
+    const url = new URL(req.url);
+    // facets=tag,primary_tag (default: all), type=image, limit=<per facet>
+    const facets = (url.searchParams.get("facets") || "").split(",").filter(f => FACET_NAMES.includes(f));
+    const type = url.searchParams.get("type") || "";
+    const limit = url.searchParams.get("limit") || "";
+
+    try {
+        const parentDir = path.resolve(process.cwd(), "..");
+        const pythonScript = path.join(parentDir, "query_api.py");
+        const pythonExe = path.join(parentDir, "venv", "Scripts", "python.exe");
+
+        let cmd = `"${pythonExe}" "${pythonScript}" facets=${facets.length ? facets.join(",") : "all"}`;
+        if (/^[a-z_]+$/.test(type)) {
+            cmd += ` type=${type}`;
+        }
+        if (/^\d+$/.test(limit)) {
+            cmd += ` facet_limit=${limit}`;
+        }
+
+        const { stdout, stderr } = await execPromise(cmd, { cwd: parentDir });
+
+        if (stderr) {
+            console.warn("Python stderr:", stderr);
+        }
+
+        const lines = stdout.trim().split("\n");
+        let jsonStr = "";
+        for (let i = lines.length - 1; i >= 0; i--) {
+            if (lines[i].startsWith("{")) {
+                jsonStr = lines[i];
+                break;
+            }
+        }
+
+        const parsed = JSON.parse(jsonStr);
+        return NextResponse.json(parsed);
+    } catch (error: any) {
+        console.error("API error:", error);
+        return NextResponse.json({ success: false, error: error.message }, { status: 500 });
+    }
+}
@@ -11,6 +11,8 @@ export async function GET(req: NextRequest) {
     const offset = url.searchParams.get("offset") || "0";
     const tag = url.searchParams.get("tag") || "";
     const q = url.searchParams.get("q") || "";
+    const match = url.searchParams.get("match") || "";
+    const cursor = url.searchParams.get("cursor") || "";
 
     try {
         const parentDir = path.resolve(process.cwd(), "..");
@@ -22,6 +24,12 @@ export async function GET(req: NextRequest) {
         if (tag) {
             cmd += ` tag=${tag}`;
         }
+        if (match === "any" || match === "all") {
+            cmd += ` match=${match}`;
+        }
+        if (cursor && /^[A-Za-z0-9_=-]+$/.test(cursor)) {
+            cmd += ` cursor=${cursor}`;
+        }
         if (q) {
             cmd += ` q="${q}"`;
         }
@@ -22,13 +22,25 @@ export default function Home() {
   const [viewMode, setViewMode] = useState<"grid" | "list">("grid");
   const [offset, setOffset] = useState(0);
   const [hasMore, setHasMore] = useState(true);
+  const [tagCounts, setTagCounts] = useState<Record<string, number>>({});
 
   const LIMIT = 24;
 
-  const coreTags = [
+  const defaultTags = [
     "공간디자인", "실내건축", "가구", "조명",
     "상업공간", "주거공간", "건축모형", "도면"
   ];
+  // Most frequent image tags from the precomputed facet counts (falls back to the fixed list)
+  const coreTags = Object.keys(tagCounts).length ? Object.keys(tagCounts) : defaultTags;
+
+  useEffect(() => {
+    fetch("/api/facets?facets=tag&type=image&limit=8")
+      .then(res => res.json())
+      .then(json => {
+        if (json.success) setTagCounts(json.facets.tag || {});
+      })
+      .catch(e => console.error("Facet fetch failed:", e));
+  }, []);
 
   const fetchItems = useCallback(async (isLoadMore = false) => {
     if (isLoadMore) setLoadingMore(true);
@@ -56,7 +68,7 @@ export default function Home() {
           setItems(newItems);
           setOffset(0);
         }
-        setHasMore(newItems.length === LIMIT);
+        setHasMore(typeof json.total === "number" ? currentOffset + newItems.length < json.total : newItems.length === LIMIT);
       }
     } catch (e) {
       console.error("Fetch failed:", e);
@@ -135,7 +147,7 @@ export default function Home() {
               className={`filter-btn ${activeTag === tag ? 'active' : ''}`}
               onClick={() => { setActiveTag(tag); setSearchQuery(""); }}
             >
-              {tag}
+              {tag}{tagCounts[tag] !== undefined ? ` (${tagCounts[tag]})` : ""}
             </button>
           ))}
         </div>
@@ -2,9 +2,11 @@ import os
 import io
 import json
 import base64
+import itertools
 import logging
 from PIL import Image
 from db_manager import db
+from graph_builder import similarity_edges
 
 logger = logging.getLogger("mcp_vision_server.visualize_network")
 
@@ -65,38 +67,11 @@ def generate_graph_html(output_path: str = "network_graph.html", distance_thresh
 
         edges = []
         
-        # Calculate edges based on mutual semantic queries
-        # Note: In a dense graph with thousands of items, we'd query by document embeddings
-        # Since we use ChromaDB's native collection.query, we iterate using the document vectors
-        
-        docs = all_data["documents"]
-        if not docs:
-            return None
-        
-        # We query the DB for each document to find its nearest neighbors
-        results = db.collection.query(
-            query_texts=docs,
-            n_results=min(len(docs), 10) # limit to top 10 closest per node to avoid visual clutter
-        )
-        
-        for i, query_id in enumerate(ids):
-            retrieved_ids = results["ids"][i]
-            distances = results["distances"][i]
-            
-            for j, target_id in enumerate(retrieved_ids):
-                dist = distances[j]
-                
-                # Exclude self and far vectors
-                if target_id != query_id and dist < distance_threshold:
-                    # Deduplicate undirected edges
-                    if query_id < target_id:
-                        src, dst = query_id, target_id
-                    else:
-                        src, dst = target_id, query_id
-                        
-                    edge = {"source": src, "target": dst, "value": round(1.0 - dist, 3)}
-                    if edge not in edges:
-                        edges.append(edge)
+        # Edges come from the materialized neighbour table (top 10 per node, no re-embedding).
+        # Rows missing on first use are filled in bulk by graph_builder's blockwise top-k over stored embeddings
+        neighbours = db.neighbours.neighbours_many(ids, limit=10)
+
+        edges.extend(similarity_edges(ids, neighbours, distance_threshold))
 
         # Inject user-defined manual links
         try:
@@ -674,7 +649,7 @@ class GraphRequestHandler(http.server.SimpleHTTPRequestHandler):
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             from db_manager import db
-            import requests
+            from ollama_client import ollama
             try:
                 data = json.loads(post_data)
                 query = data.get("query", "")
@@ -692,15 +667,31 @@ class GraphRequestHandler(http.server.SimpleHTTPRequestHandler):
                 else:
                     prompt = f"사용자 질문: {query}\n현재 연관된 파일이 부족합니다. 있는 지식 한도 내에서 대답하되 정보가 부족함을 알리세요."
                 
-                url = "http://localhost:11434/api/generate"
-                payload = {
-                    "model": "llava:7b",
-                    "prompt": prompt,
-                    "stream": False
-                }
-                response = requests.post(url, json=payload, timeout=60)
-                response.raise_for_status()
-                ans = response.json().get("response", "")
+                if data.get("stream"):
+                    # 토큰이 생성되는 대로 NDJSON 줄 단위로 전달
+                    # 첫 청크를 받은 뒤에 헤더를 보내므로 연결/서킷 오류는 아래 except에서 500으로 응답됨
+                    chunks = ollama.stream_generate("llava:7b", prompt, timeout=60, call_site="visualize_network.chat_stream")
+                    first = next(chunks, None)
+                    self.send_response(200)
+                    self.send_header("Content-type", "application/x-ndjson; charset=utf-8")
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    try:
+                        for chunk in itertools.chain([first] if first else [], chunks):
+                            line = {"response": chunk.get("response", ""), "done": chunk.get("done", False)}
+                            self.wfile.write((json.dumps(line, ensure_ascii=False) + "\n").encode('utf-8'))
+                            self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        chunks.close()
+                    except Exception as e:
+                        # 헤더를 이미 보냈으므로 상태 코드 대신 마지막 줄로 오류를 알리고 응답을 끝냄
+                        logger.error(f"POST Chat Stream Error: {e}")
+                        self.wfile.write((json.dumps({"error": str(e), "done": True}, ensure_ascii=False) + "\n").encode('utf-8'))
+                        self.wfile.flush()
+                    self.close_connection = True
+                    return
+                
+                ans = ollama.generate("llava:7b", prompt, timeout=60, call_site="visualize_network.chat").get("response", "")
                 
                 self.send_response(200)
                 self.send_header("Content-type", "application/json")